@@ -1,5 +1,6 @@
 import os
 import logging
+import multiprocessing
 from pathlib import Path
 from flask import Flask, send_file
 from flask_cors import CORS
@@ -74,6 +75,7 @@ from routes.dashboard_routes import dashboard_bp
 from routes.integration_routes import integration_bp
 from routes.settings_routes import settings_bp
 from routes.scanner_routes import scanner_bp
+from routes.export_routes import export_bp
 
 
 app.register_blueprint(webhook_bp)
@@ -81,5 +83,20 @@ app.register_blueprint(dashboard_bp)
 app.register_blueprint(integration_bp)
 app.register_blueprint(settings_bp)
 app.register_blueprint(scanner_bp)
+app.register_blueprint(export_bp)
+
+# Export and scan pool workers import the app too, but leave the background workers to the server
+if multiprocessing.current_process().name == 'MainProcess':
+    # Start the background workers that drain the webhook ingest queue
+    from services import ingest_queue
+    ingest_queue.init_app(app)
+
+    # Start the background worker that replicates saved webhooks to external storage
+    from services import replication_service
+    replication_service.init_app(app)
+
+    # Start the workers that send notification emails in the background
+    from services import notification_dispatcher
+    notification_dispatcher.init_app(app)
 
 logger.info("Application initialized")
\ No newline at end of file
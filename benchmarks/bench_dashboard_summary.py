@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Dashboard Summary Benchmark
+
+Grows a scratch SQLite database through a series of table sizes and times
+/api/dashboard/summary at each size, to check that summary latency stays flat
+as webhook_data grows. Up to --legacy-max rows the old chart path (load every
+row with get_webhook_data() and count in transform_for_charts) is timed too,
+and its Chart.js output is checked against the rollup-backed chart.
+
+Rows are inserted in bulk together with their rollup counts, the same way the
+write batcher maintains them. The summary cache is disabled so every timed
+request computes the summary, and its total is checked against the row count.
+
+Usage:
+    python benchmarks/bench_dashboard_summary.py [--sizes 10000,100000,1000000,10000000]
+        [--repeat N] [--legacy-max N] [--db PATH]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SOURCES = ['stripe', 'paypal', 'form', 'crm', 'cart', 'google', 'whatsapp', 'facebook', 'newsletter', 'other']
+STATUSES = ['processed'] * 19 + ['error']
+INSERT_CHUNK = 10000
+
+
+def parse_sizes(value):
+    return sorted(int(size.replace('_', '')) for size in value.split(',') if size.strip())
+
+
+def make_rows(count, now):
+    """Synthetic webhook rows spread over the last 30 days"""
+    rows = []
+    for _ in range(count):
+        source = random.choice(SOURCES)
+        rows.append({
+            'id': str(uuid.uuid4()),
+            'timestamp': now - timedelta(seconds=random.randint(0, 30 * 86400)),
+            'source': source,
+            'source_subtype': random.choice([None, 'generic', 'contact_form']),
+            'status': random.choice(STATUSES),
+            'payload': {'source': source, 'processed': True, 'amount': random.randint(1, 500)},
+            'raw_data': None,
+        })
+    return rows
+
+
+def grow_table(db, target, current, now):
+    """Insert rows and their rollup counts until the table holds `target` rows"""
+    from sqlalchemy import insert
+    from models import WebhookData
+    from services.rollup_service import count_rows, upsert_counts, prune_rollups
+
+    while current < target:
+        rows = make_rows(min(INSERT_CHUNK, target - current), now)
+        db.session.execute(insert(WebhookData), rows)
+        upsert_counts(count_rows(rows))
+        db.session.commit()
+        current += len(rows)
+    prune_rollups()
+    db.session.commit()
+    return current
+
+
+def best_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dashboard summary latency against table size')
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes('10000,100000,1000000'),
+                        help='Comma-separated table sizes (default 10000,100000,1000000; add 10000000 for the full run)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (best is reported)')
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help='Largest table size at which the full-table chart path is also timed')
+    parser.add_argument('--db', help='SQLite file to use (default: a temporary file)')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='bench_dashboard_'), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ.setdefault('INGEST_QUEUE_PATH', os.path.join(os.path.dirname(db_path), 'ingest_queue.db'))
+    # Time the summary computation, not cache hits
+    os.environ['SUMMARY_CACHE_TTL'] = '0'
+    os.environ.pop('SUMMARY_CACHE_REDIS_URL', None)
+    os.chdir(ROOT)
+
+    import logging
+    from app import app, db
+    from services.data_service import get_webhook_data, get_webhook_chart_data
+    from utils.data_transformers import transform_for_charts
+    logging.disable(logging.INFO)
+
+    random.seed(42)
+    client = app.test_client()
+    now = datetime.now()
+    current = 0
+    failures = 0
+
+    print(f"Database: {db_path}")
+    print(f"{'rows':>10} {'summary ms':>11} {'chart ms':>9} {'legacy chart ms':>16}  match")
+    with app.app_context():
+        for size in args.sizes:
+            current = grow_table(db, size, current, now)
+
+            def summary():
+                response = client.get('/api/dashboard/summary')
+                assert response.status_code == 200, response.status_code
+                total = response.get_json()['data']['total_webhooks']
+                assert total == current, f"summary total {total} != {current} rows"
+
+            summary_ms = best_ms(summary, args.repeat)
+            chart_ms = best_ms(lambda: get_webhook_chart_data(days=7), args.repeat)
+
+            legacy_ms, match = '-', '-'
+            if size <= args.legacy_max:
+                legacy_ms = f"{best_ms(lambda: transform_for_charts(get_webhook_data()), 1):.1f}"
+                legacy = transform_for_charts(get_webhook_data())
+                rollup = get_webhook_chart_data(days=7)
+                by_label = lambda chart: {d['label']: d for d in chart['datasets']}
+                ok = legacy['labels'] == rollup['labels'] and by_label(legacy) == by_label(rollup)
+                match = 'yes' if ok else 'NO'
+                failures += 0 if ok else 1
+
+            print(f"{current:>10} {summary_ms:>11.2f} {chart_ms:>9.2f} {legacy_ms:>16}  {match}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
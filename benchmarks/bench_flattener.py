@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Payload Flattener Benchmark
+
+Compares CSV export through the compiled, schema-driven PayloadFlattener with
+the original path: flatten_webhook_data() on every row, a second pass over the
+flattened rows to collect the key union for the header, then the CSV write.
+The compiled path takes its header from the payload shapes (as recorded at
+ingest) and writes each row in the same pass it is flattened. Both paths are
+checked to produce byte-identical CSV.
+
+Usage:
+    python benchmarks/bench_flattener.py [--rows N] [--repeat N] [--depth N]
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.payload_flattener import PayloadFlattener, payload_shape, shape_columns, shape_hash  # noqa: E402
+
+
+# Reference implementation: flatten_webhook_item as it was before the compiled flattener
+
+def legacy_flatten_item(item):
+    flat_item = {
+        "id": item.get("id", ""),
+        "timestamp": item.get("timestamp", ""),
+        "source": item.get("source", "")
+    }
+    payload = item.get("data", {})
+    if isinstance(payload, dict):
+        for key, value in payload.items():
+            if key != 'original_data' and not isinstance(value, (dict, list)):
+                flat_item[f"data_{key}"] = str(value) if value is not None else ""
+        if "contact_info" in payload and isinstance(payload["contact_info"], dict):
+            for key, value in payload["contact_info"].items():
+                flat_item[f"contact_{key}"] = str(value) if value is not None else ""
+        if "entity_data" in payload and isinstance(payload["entity_data"], dict):
+            for key, value in payload["entity_data"].items():
+                if not isinstance(value, (dict, list)):
+                    flat_item[f"entity_{key}"] = str(value) if value is not None else ""
+        if "submission_data" in payload and isinstance(payload["submission_data"], dict):
+            for key, value in payload["submission_data"].items():
+                if not isinstance(value, (dict, list)):
+                    flat_item[f"submission_{key}"] = str(value) if value is not None else ""
+    return flat_item
+
+
+def legacy_csv(items):
+    """Flatten everything, collect the key union, then write"""
+    flat = [legacy_flatten_item(item) for item in items]
+    columns = set()
+    for row in flat:
+        columns.update(row.keys())
+    columns = sorted(columns)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    for row in flat:
+        writer.writerow([row.get(key, "") for key in columns])
+    return output.getvalue()
+
+
+def compiled_csv(items, shapes, depth):
+    """Header from the learned shapes; flatten and write in one pass"""
+    columns = shape_columns(shapes, depth)
+    flattener = PayloadFlattener(columns, shapes, depth)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    for item in items:
+        writer.writerow(flattener.row(item))
+    return output.getvalue()
+
+
+def make_payload(i):
+    """A payload shaped like the output of one of the webhook processors"""
+    kind = i % 4
+    if kind == 0:
+        return 'stripe', {
+            'source': 'stripe', 'event_type': 'charge_succeeded', 'payment_status': 'succeeded',
+            'amount': random.randint(100, 50000), 'customer_email': f'c{i}@example.com',
+            'customer_name': f'Customer {i}',
+            'original_data': {'type': 'charge.succeeded', 'data': {'object': {'object': 'charge', 'amount': i}}},
+        }
+    if kind == 1:
+        fields = {'message': f'Message {i}', 'company': 'Acme', 'budget': str(i % 9 * 1000)}
+        if i % 3 == 0:
+            fields['address'] = {'city': 'Springfield', 'zip': '12345'}
+        return 'form', {
+            'source': 'form', 'form_type': 'contact', 'source_subtype': 'generic',
+            'contact_info': {'name': f'Person {i}', 'email': f'p{i}@example.com', 'phone': None},
+            'submission_data': fields,
+            'metadata': {'ip': '10.0.0.1', 'user_agent': 'Mozilla/5.0'},
+            'original_data': {'name': f'Person {i}', 'email': f'p{i}@example.com'},
+        }
+    if kind == 2:
+        return 'crm', {
+            'source': 'crm', 'crm_type': 'hubspot', 'event_type': 'update', 'entity_type': 'contact',
+            'entity_data': {'id': i, 'name': f'Lead {i}', 'stage': 'qualified', 'owner': {'id': 7},
+                            'tags': ['a', 'b']},
+            'original_data': {'lead': {'name': f'Lead {i}'}},
+        }
+    return 'newsletter', {
+        'source': 'newsletter', 'source_subtype': 'newsletter', 'email': f'n{i}@example.com',
+        'list': 'main', 'subscribed': True, 'original_data': {'email': f'n{i}@example.com'},
+    }
+
+
+def make_items(count):
+    now = datetime.now()
+    items = []
+    for i in range(count):
+        source, payload = make_payload(i)
+        items.append({
+            'id': str(uuid.uuid4()),
+            'timestamp': (now - timedelta(seconds=i)).isoformat(),
+            'source': source,
+            'source_subtype': payload.get('source_subtype'),
+            'status': 'processed',
+            'data': payload,
+        })
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the compiled payload flattener')
+    parser.add_argument('--rows', type=int, default=50000, help='Rows to export')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions (best is reported)')
+    parser.add_argument('--depth', type=int, default=2, help='Depth for the nested-columns case')
+    args = parser.parse_args()
+
+    random.seed(42)
+    items = make_items(args.rows)
+
+    # The shapes the insert hook would have recorded for these rows
+    shapes = list({shape_hash(shape): shape for shape in (payload_shape(item['data']) for item in items)}.values())
+
+    identical = legacy_csv(items) == compiled_csv(items, shapes, 1)
+    print(f"Rows: {args.rows}, distinct shapes: {len(shapes)}, output identical: {'yes' if identical else 'NO'}")
+    print()
+
+    cases = [
+        ('CSV, depth 1', lambda: legacy_csv(items), lambda: compiled_csv(items, shapes, 1)),
+        ('flatten only, depth 1',
+         lambda: [legacy_flatten_item(item) for item in items],
+         lambda: [flattener.row(item) for item in items]),
+        (f'CSV, depth {args.depth} (compiled only)', None, lambda: compiled_csv(items, shapes, args.depth)),
+    ]
+    flattener = PayloadFlattener(shape_columns(shapes, 1), shapes, 1)
+
+    print(f"{'case':<32} {'legacy ms':>10} {'compiled ms':>12} {'speedup':>8}")
+    for name, legacy, compiled in cases:
+        compiled_time = min(timeit.repeat(compiled, number=1, repeat=args.repeat)) * 1000
+        if legacy is None:
+            print(f"{name:<32} {'-':>10} {compiled_time:>12.1f} {'-':>8}")
+            continue
+        legacy_time = min(timeit.repeat(legacy, number=1, repeat=args.repeat)) * 1000
+        print(f"{name:<32} {legacy_time:>10.1f} {compiled_time:>12.1f} {legacy_time / compiled_time:>7.1f}x")
+
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == "__main__":
+    main()
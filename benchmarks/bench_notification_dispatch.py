@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Notification Dispatch Benchmark
+
+Runs a local stand-in SMTP server that answers every message after a
+configurable delay, configures it as the email provider of a scratch
+application, and compares:
+
+- legacy: send_smtp_email() without a session, called inline as the notify
+  stage used to do, which connects and logs in for every email
+- dispatcher: webhooks posted to /api/webhook with emails queued to the
+  background notification dispatcher and its persistent SMTP sessions
+
+For the dispatcher, /api/webhook latency and the notify stage latency are
+reported along with SMTP connections per email and the delivery status
+recorded on each notification. With --drop-every the server also hangs up
+on the dispatcher every N messages, to exercise reconnecting.
+
+Usage:
+    python benchmarks/bench_notification_dispatch.py [--emails N] [--delay SECONDS]
+        [--workers N] [--drop-every N]
+"""
+import argparse
+import os
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    """Minimal SMTP server accepting AUTH PLAIN/LOGIN and any message, in the spirit of aiosmtpd's Debugging handler"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay=0.0, drop_every=0):
+        super().__init__(('127.0.0.1', 0), StandInSMTPHandler)
+        self.delay = delay
+        self.drop_every = drop_every
+        self.lock = threading.Lock()
+        self.stats = {'connections': 0, 'logins': 0, 'messages': 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+            return self.stats[name]
+
+
+class StandInSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        server.count('connections')
+        self.reply('220 stand-in ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.reply('250-stand-in')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif verb == 'HELO':
+                self.reply('250 stand-in')
+            elif verb == 'AUTH':
+                if command.upper().startswith('AUTH LOGIN'):
+                    self.reply('334 VXNlcm5hbWU6')
+                    self.rfile.readline()
+                    self.reply('334 UGFzc3dvcmQ6')
+                    self.rfile.readline()
+                elif len(command.split()) < 3:
+                    self.reply('334 ')
+                    self.rfile.readline()
+                server.count('logins')
+                self.reply('235 Authentication successful')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                time.sleep(server.delay)
+                count = server.count('messages')
+                self.reply('250 OK')
+                if server.drop_every and count % server.drop_every == 0:
+                    # Hang up without warning, like a server closing idle sessions
+                    return
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # MAIL, RCPT, RSET and NOOP
+                self.reply('250 OK')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark background notification dispatch against a slow SMTP server')
+    parser.add_argument('--emails', type=int, default=50, help='Webhooks (and emails) per run (default 50)')
+    parser.add_argument('--delay', type=float, default=0.2, help='Seconds the SMTP server takes per message (default 0.2)')
+    parser.add_argument('--workers', type=int, default=2, help='Dispatcher worker threads (default 2)')
+    parser.add_argument('--drop-every', type=int, default=0,
+                        help='Disconnect the SMTP session after every N messages (default: never)')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_notify_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    os.environ.setdefault('INGEST_QUEUE_PATH', os.path.join(work_dir, 'ingest_queue.db'))
+    os.environ.setdefault('CONFIG_VERSION_PATH', os.path.join(work_dir, 'config_version'))
+    os.environ['NOTIFY_WORKERS'] = str(args.workers)
+    os.environ.setdefault('REPLICATION_ENABLED', 'false')
+    os.chdir(ROOT)
+
+    smtp_server = StandInSMTPServer(delay=args.delay)
+    threading.Thread(target=smtp_server.serve_forever, daemon=True).start()
+    port = smtp_server.server_address[1]
+
+    import logging
+    from app import app
+    from models import Notification
+    from services.ingest_queue import get_queue_stats
+    from services.notification_dispatcher import get_dispatcher_stats, wait_for_dispatch
+    from services.notification_service import get_email_settings, send_smtp_email
+    logging.disable(logging.WARNING)
+
+    client = app.test_client()
+    response = client.post('/api/settings/email', json={
+        'email_provider': 'smtp', 'smtp_host': '127.0.0.1', 'smtp_port': port,
+        'smtp_username': 'bench', 'smtp_password': 'bench', 'smtp_use_tls': False,
+        'from_email': 'bench@example.com', 'notify_on_webhook': True
+    })
+    assert response.status_code == 200, response.status_code
+
+    print(f"SMTP stand-in on port {port}, {args.delay * 1000:.0f} ms per message, {args.emails} emails")
+    print(f"{'path':<12} {'webhook p50 ms':>15} {'webhook p99 ms':>15} {'notify avg ms':>14} "
+          f"{'total s':>8} {'connections':>12} {'logins':>7}")
+
+    # Legacy: a fresh connection and login per email, inline
+    with app.app_context():
+        settings = get_email_settings()
+    before = dict(smtp_server.stats)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(args.emails):
+        t = time.perf_counter()
+        assert send_smtp_email(settings, 'bench@example.com', f'legacy {i}', 'body')
+        latencies.append((time.perf_counter() - t) * 1000)
+    total = time.perf_counter() - start
+    print(f"{'legacy':<12} {'-':>15} {'-':>15} {statistics.mean(latencies):>14.1f} {total:>8.2f} "
+          f"{smtp_server.stats['connections'] - before['connections']:>12} "
+          f"{smtp_server.stats['logins'] - before['logins']:>7}")
+
+    # Dispatcher: emails queued from the notify stage and sent by background workers
+    smtp_server.drop_every = args.drop_every
+    before = dict(smtp_server.stats)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(args.emails):
+        t = time.perf_counter()
+        response = client.post('/api/webhook', json={'name': f'bench {i}', 'email': 'bench@example.com'})
+        latencies.append((time.perf_counter() - t) * 1000)
+        assert response.status_code in (200, 202), response.status_code
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        depth = get_queue_stats()['depth']
+        if not depth['pending'] and not depth['processing']:
+            break
+        time.sleep(0.01)
+    wait_for_dispatch(timeout=600)
+    total = time.perf_counter() - start
+    notify = get_queue_stats()['stages'].get('notify', {})
+    print(f"{'dispatcher':<12} {statistics.median(latencies):>15.2f} {percentile(latencies, 99):>15.2f} "
+          f"{notify.get('avg_ms', 0):>14.1f} {total:>8.2f} "
+          f"{smtp_server.stats['connections'] - before['connections']:>12} "
+          f"{smtp_server.stats['logins'] - before['logins']:>7}")
+
+    time.sleep(0.2)
+    with app.app_context():
+        statuses = {}
+        for (status,) in Notification.query.with_entities(Notification.delivery_status):
+            statuses[status] = statuses.get(status, 0) + 1
+    print(f"Delivery status: {statuses}")
+    print(f"Dispatcher: {get_dispatcher_stats()}")
+    sys.exit(0 if statuses.get('sent') == args.emails else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+OCR Preprocessing Benchmark
+
+Compares the adaptive OCR preprocessing pipeline against the original
+always-full pipeline (denoise, Otsu, morphology and contrast enhance at the
+input resolution) on a corpus of sample scans. The corpus is rendered
+synthetically at several resolutions and qualities (clean, noisy, faded and
+blurred), and can be extended with real scans: a directory of images, each
+with a .txt file of the same name holding its expected text.
+
+For every pipeline (legacy, and the new pipeline forced to fast, forced to
+full, and in auto mode) the per-stage preprocessing latency is reported, and
+when the Tesseract binary is installed, the OCR latency and character
+accuracy against the expected text as well.
+
+Usage:
+    python benchmarks/bench_ocr_preprocessing.py [--dpis 150,300,600] [--corpus DIR] [--repeat N] [--no-ocr]
+"""
+import argparse
+import difflib
+import glob
+import os
+import sys
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scanner.preprocessing import preprocess_image  # noqa: E402
+
+try:
+    import pytesseract
+    pytesseract.get_tesseract_version()
+    TESSERACT_AVAILABLE = True
+except Exception:
+    TESSERACT_AVAILABLE = False
+
+OCR_CONFIG = r'--oem 3 --psm 6 -l eng --dpi 300'
+
+SAMPLE_LINES = [
+    'INVOICE 2024-0117',
+    'Acme Supplies Ltd, 42 Market Street',
+    'Date: 16/01/2024  Due: 15/02/2024',
+    'Widgets x 12 @ 4.50 = 54.00',
+    'Gaskets x 3 @ 11.25 = 33.75',
+    'Subtotal 87.75  VAT 17.55',
+    'TOTAL DUE 105.30',
+    'Contact: billing@acme.example.com',
+]
+
+
+# Reference implementation: the preprocessing ocr_image() ran before the
+# adaptive pipeline was introduced.
+
+def legacy_preprocess(image):
+    timings = {}
+    started = time.perf_counter()
+    gray = cv2.cvtColor(cv2.cvtColor(np.array(image.convert('RGB')), cv2.COLOR_RGB2BGR), cv2.COLOR_BGR2GRAY)
+    timings['convert'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    denoised = cv2.fastNlMeansDenoising(gray)
+    timings['denoise'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    thresh = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    timings['threshold'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+    processed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+    timings['morphology'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    enhanced = ImageEnhance.Contrast(Image.fromarray(processed)).enhance(1.5)
+    timings['enhance'] = (time.perf_counter() - started) * 1000
+    return enhanced, {'path': 'legacy', 'timings_ms': timings}
+
+
+PIPELINES = {
+    'legacy': legacy_preprocess,
+    'fast': lambda image: preprocess_image(image, mode='fast'),
+    'full': lambda image: preprocess_image(image, mode='full'),
+    'auto': lambda image: preprocess_image(image, mode='auto'),
+}
+
+
+def render_page(dpi):
+    """Render the sample text as a half-page scan at the given resolution"""
+    width, height = int(8.27 * dpi), int(4 * dpi)
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    # 12 pt text
+    font = ImageFont.load_default(size=max(8, dpi // 6))
+    y = dpi // 2
+    for line in SAMPLE_LINES:
+        draw.text((dpi // 2, y), line, fill=0, font=font)
+        y += int(dpi / 6 * 1.6)
+    return image
+
+
+def degrade(image, variant, seed):
+    """Apply a scan defect to a clean rendered page"""
+    if variant == 'clean':
+        return image
+    pixels = np.array(image, dtype=np.float32)
+    if variant == 'noisy':
+        pixels += np.random.default_rng(seed).normal(0, 25, pixels.shape)
+    elif variant == 'faded':
+        pixels = 180 + pixels * (60 / 255)
+    elif variant == 'blurred':
+        return image.filter(ImageFilter.GaussianBlur(radius=image.width / 1600))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def load_corpus(dpis, corpus_dir):
+    """Build the list of (name, image, expected text) samples"""
+    corpus = []
+    expected = '\n'.join(SAMPLE_LINES)
+    for dpi in dpis:
+        page = render_page(dpi)
+        for seed, variant in enumerate(['clean', 'noisy', 'faded', 'blurred']):
+            image = degrade(page, variant, seed).convert('RGB')
+            image.info['dpi'] = (dpi, dpi)
+            corpus.append((f"synthetic {variant} @{dpi}dpi", image, expected))
+
+    if corpus_dir:
+        for text_path in sorted(glob.glob(os.path.join(corpus_dir, '*.txt'))):
+            base = os.path.splitext(text_path)[0]
+            image_paths = [path for path in glob.glob(base + '.*') if not path.endswith('.txt')]
+            if not image_paths:
+                continue
+            with Image.open(image_paths[0]) as image:
+                loaded = image.convert('RGB')
+                loaded.info['dpi'] = image.info.get('dpi')
+            with open(text_path) as f:
+                corpus.append((os.path.basename(image_paths[0]), loaded, f.read()))
+    return corpus
+
+
+def char_accuracy(expected, actual):
+    """Share of the expected characters recognized, ignoring whitespace differences"""
+    expected, actual = ' '.join(expected.split()), ' '.join(actual.split())
+    if not expected:
+        return 1.0
+    matcher = difflib.SequenceMatcher(None, expected, actual, autojunk=False)
+    return sum(block.size for block in matcher.get_matching_blocks()) / len(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the adaptive OCR preprocessing pipeline')
+    parser.add_argument('--dpis', default='150,300,600', help='Resolutions of the synthetic scans')
+    parser.add_argument('--corpus', help='Directory of real scans, each with a .txt file of its expected text')
+    parser.add_argument('--repeat', type=int, default=1, help='Timing repetitions (best is reported)')
+    parser.add_argument('--no-ocr', action='store_true', help='Only time preprocessing, even if Tesseract is installed')
+    args = parser.parse_args()
+
+    corpus = load_corpus([int(dpi) for dpi in args.dpis.split(',') if dpi.strip()], args.corpus)
+    run_ocr = TESSERACT_AVAILABLE and not args.no_ocr
+    print(f"Corpus: {len(corpus)} scans")
+    if not run_ocr:
+        print("Tesseract not run (not installed or --no-ocr): OCR latency and accuracy are skipped")
+    print()
+
+    header = f"{'scan':<28} {'pipeline':<8} {'path':<6} {'preproc ms':>10}"
+    if run_ocr:
+        header += f" {'ocr ms':>8} {'accuracy':>9}"
+    print(header)
+
+    totals = defaultdict(lambda: defaultdict(float))
+    for name, image, expected in corpus:
+        for pipeline, preprocess in PIPELINES.items():
+            best = None
+            for _ in range(args.repeat):
+                processed, report = preprocess(image)
+                elapsed = sum(report['timings_ms'].values())
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, report)
+            elapsed, report = best
+            for stage, ms in report['timings_ms'].items():
+                totals[pipeline][stage] += ms
+
+            line = f"{name:<28} {pipeline:<8} {report['path']:<6} {elapsed:>10.1f}"
+            if run_ocr:
+                started = time.perf_counter()
+                text = pytesseract.image_to_string(processed, config=OCR_CONFIG)
+                ocr_ms = (time.perf_counter() - started) * 1000
+                accuracy = char_accuracy(expected, text)
+                totals[pipeline]['ocr'] += ocr_ms
+                totals[pipeline]['accuracy'] += accuracy
+                line += f" {ocr_ms:>8.1f} {accuracy:>8.1%}"
+            print(line)
+
+    print()
+    print("Per-stage totals over the corpus (ms):")
+    stages = ['convert', 'resize', 'measure', 'denoise', 'threshold', 'morphology', 'enhance']
+    print(f"{'pipeline':<8} " + ' '.join(f"{stage:>10}" for stage in stages) + f" {'total':>10}"
+          + (f" {'ocr':>10} {'mean acc':>9}" if run_ocr else ''))
+    for pipeline, stage_totals in totals.items():
+        preprocessing = sum(stage_totals.get(stage, 0) for stage in stages)
+        line = f"{pipeline:<8} " + ' '.join(f"{stage_totals.get(stage, 0):>10.1f}" for stage in stages)
+        line += f" {preprocessing:>10.1f}"
+        if run_ocr:
+            line += f" {stage_totals['ocr']:>10.1f} {stage_totals['accuracy'] / len(corpus):>8.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
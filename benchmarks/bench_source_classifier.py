@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Source Classifier Benchmark
+
+Compares the compiled source classifier against the original determine_source
+implementation on a corpus of webhook payloads. Both the bare source detection
+and the full keyword work done per webhook (determine_source plus the
+newsletter/collection/CRM keyword checks in the form and CRM processors) are
+timed, and the two implementations are checked to agree on every payload.
+
+Usage:
+    python benchmarks/bench_source_classifier.py [--repeat N] [--batch-size N]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services.source_classifier import SourceClassifier, CRM_SYSTEMS  # noqa: E402
+
+
+# Reference implementation: determine_source and the processor keyword checks
+# as they were before the classifier was introduced.
+
+def legacy_determine_source(data):
+    if 'source' in data:
+        return data['source']
+    if 'type' in data and data.get('object') == 'event' and 'api_version' in data:
+        return 'stripe'
+    if 'event_type' in data and 'resource_type' in data and data.get('resource_type') == 'sale':
+        return 'paypal'
+    if any(field in data for field in ['tracking_id', 'client_id', 'page_view', 'event_action']):
+        return 'google'
+    if 'entry' in data and 'changes' in data.get('entry', [{}])[0] and 'messaging_product' in data.get('entry', [{}])[0].get('changes', [{}])[0]:
+        return 'whatsapp'
+    if 'entry' in data and 'changes' in data.get('entry', [{}])[0] and 'id' in data.get('entry', [{}])[0]:
+        return 'facebook'
+    if any(keyword in str(data).lower() for keyword in ['newsletter', 'subscribe', 'mailing list']):
+        return 'newsletter'
+    if any(field in data for field in ['name', 'email', 'message', 'phone']):
+        return 'form'
+    if any(field in data for field in ['customer', 'lead', 'opportunity', 'contact']):
+        return 'crm'
+    if any(field in data for field in ['cart', 'product', 'order', 'checkout']):
+        return 'cart'
+    if any(field in data for field in ['scan_id', 'extracted_text', 'scan_type', 'scan_data']):
+        return 'scanner'
+    return 'other'
+
+
+LEGACY_CRM_SYSTEMS = {
+    'salesforce': ['salesforce', 'sf_', 'sfdc'],
+    'hubspot': ['hubspot', 'hs_'],
+    'zoho': ['zoho', 'zcrm'],
+    'pipedrive': ['pipedrive', 'pd_deal'],
+    'dynamics': ['dynamics', 'ms_crm', 'mscrm']
+}
+
+
+def legacy_full(data):
+    """Source detection plus every keyword check the processors used to repeat"""
+    source = legacy_determine_source(data)
+    newsletter = any(keyword in str(data).lower() for keyword in ['newsletter', 'subscribe', 'mailing list'])
+    collection = any(keyword in str(data).lower() for keyword in ['collection', 'product_id', 'category', 'product collection'])
+    data_str = str(data).lower()
+    crm_system = None
+    for system, keywords in LEGACY_CRM_SYSTEMS.items():
+        if any(keyword in data_str for keyword in keywords):
+            crm_system = system
+            break
+    return source, newsletter, collection, crm_system
+
+
+def compiled_full(classifier, data):
+    classification = classifier.classify(data)
+    return (
+        classification.source,
+        classification.has_keyword('newsletter'),
+        classification.has_keyword('collection'),
+        classification.first_group(CRM_SYSTEMS)
+    )
+
+
+def facebook_batch(size):
+    """A Facebook leadgen batch of roughly `size` entries"""
+    return {
+        'object': 'page',
+        'entry': [
+            {
+                'id': f'page_{i}',
+                'time': 1742637000 + i,
+                'changes': [{
+                    'field': 'leadgen',
+                    'value': {
+                        'ad_id': f'ad_{i}',
+                        'form_id': f'form_{i % 7}',
+                        'leadgen_id': f'lead_{i}',
+                        'created_time': 1742637000 + i,
+                        'page_id': f'page_{i}',
+                        'field_data': [
+                            {'name': 'full_name', 'values': [f'Person {i}']},
+                            {'name': 'email', 'values': [f'person{i}@example.com']},
+                            {'name': 'city', 'values': ['Springfield']},
+                        ]
+                    }
+                }]
+            }
+            for i in range(size)
+        ]
+    }
+
+
+def load_corpus(batch_size):
+    """Build the payload corpus from the repository sample data plus synthetic payloads"""
+    corpus = []
+
+    for path in ['newsletter_sample_data.json', 'scanner_sample_data.json']:
+        with open(os.path.join(ROOT, path)) as f:
+            corpus.append(json.load(f))
+
+    # Previously mirrored webhooks keep their raw payload under original_data
+    for path in sorted(glob.glob(os.path.join(ROOT, 'data', 'external_storage', '*.json'))):
+        with open(path) as f:
+            record = json.load(f)
+        original = record.get('data', {}).get('original_data')
+        if isinstance(original, dict):
+            corpus.append(original)
+            stripped = {k: v for k, v in original.items() if k != 'source'}
+            corpus.append(stripped)
+
+    corpus.extend([
+        {'type': 'charge.succeeded', 'object': 'event', 'api_version': '2023-10-16', 'data': {'object': {'object': 'charge', 'amount': 2000}}},
+        {'event_type': 'PAYMENT.SALE.COMPLETED', 'resource_type': 'sale', 'resource': {'id': 'PAY-1', 'state': 'completed'}},
+        {'client_id': '555.1234', 'event_action': 'purchase', 'page_view': '/checkout'},
+        {'entry': [{'id': 'wa', 'changes': [{'messaging_product': 'whatsapp', 'value': {}}]}]},
+        {'name': 'Jane', 'email': 'jane@example.com', 'message': 'Please add me to the mailing list'},
+        {'name': 'Sam', 'email': 'sam@example.com', 'product_id': 'P-1', 'category': 'shoes'},
+        {'lead': {'name': 'Acme', 'hs_object_id': '42'}},
+        {'customer': {'name': 'Contoso', 'sf_account': '001'}},
+        {'order': {'id': 1, 'items': []}, 'cart': 'abc'},
+        {'scan_id': 's-1', 'extracted_text': 'INVOICE'},
+        {'unknown': True},
+        facebook_batch(batch_size),
+    ])
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the compiled source classifier')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions (best is reported)')
+    parser.add_argument('--batch-size', type=int, default=600,
+                        help='Entries in the synthetic Facebook batch (600 is roughly 200 KB)')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.batch_size)
+    classifier = SourceClassifier()
+
+    mismatches = 0
+    for payload in corpus:
+        if legacy_full(payload) != compiled_full(classifier, payload):
+            mismatches += 1
+            print(f"Mismatch: legacy={legacy_full(payload)} compiled={compiled_full(classifier, payload)}")
+
+    largest = max(corpus, key=lambda p: len(str(p)))
+    print(f"Corpus: {len(corpus)} payloads, largest {len(str(largest)) / 1024:.0f} KB, {mismatches} mismatches")
+    print()
+
+    cases = [
+        ('determine_source, corpus',
+         lambda: [legacy_determine_source(p) for p in corpus],
+         lambda: [classifier.classify(p).source for p in corpus]),
+        ('source + processor keywords, corpus',
+         lambda: [legacy_full(p) for p in corpus],
+         lambda: [compiled_full(classifier, p) for p in corpus]),
+        ('source + processor keywords, largest payload',
+         lambda: legacy_full(largest),
+         lambda: compiled_full(classifier, largest)),
+    ]
+
+    print(f"{'case':<46} {'legacy ms':>10} {'compiled ms':>12} {'speedup':>8}")
+    for name, legacy, compiled in cases:
+        legacy_time = min(timeit.repeat(legacy, number=20, repeat=args.repeat)) / 20 * 1000
+        compiled_time = min(timeit.repeat(compiled, number=20, repeat=args.repeat)) / 20 * 1000
+        print(f"{name:<46} {legacy_time:>10.3f} {compiled_time:>12.3f} {legacy_time / compiled_time:>7.1f}x")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
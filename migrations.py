@@ -5,6 +5,9 @@ from models import WebhookData, DataSource, Notification, Integration, ExternalS
 
 logger = logging.getLogger(__name__)
 
+# PRAGMA user_version once the one-off data migrations below have run
+CASE_NORMALIZED_VERSION = 1
+
 def run_migrations():
     """
     Run database migrations to update schema
@@ -50,6 +53,66 @@ def run_migrations():
                 cursor.execute("ALTER TABLE webhook_data ADD COLUMN raw_data TEXT")
                 connection.commit()
             
+            # Index backing keyset pagination on (timestamp, id)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_webhook_data_timestamp_id ON webhook_data (timestamp, id)")
+            connection.commit()
+            
+            # Sources and subtypes are matched with plain equality, so normalize
+            # rows saved before they were lower-cased on write. Rows are saved
+            # lower-cased since, so this only has to run once per database.
+            cursor.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] < CASE_NORMALIZED_VERSION:
+                normalized = 0
+                cursor.execute("UPDATE webhook_data SET source = lower(source) WHERE source <> lower(source)")
+                normalized += max(cursor.rowcount, 0)
+                cursor.execute("UPDATE webhook_data SET source_subtype = lower(source_subtype) WHERE source_subtype <> lower(source_subtype)")
+                normalized += max(cursor.rowcount, 0)
+                cursor.execute(f"PRAGMA user_version = {CASE_NORMALIZED_VERSION}")
+                if normalized:
+                    logger.info(f"Normalized webhook_data source/subtype case ({normalized} updates)")
+                connection.commit()
+            
+            # Composite indexes for source/status filters over a date range
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_webhook_data_source_timestamp ON webhook_data (source, timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_webhook_data_status_timestamp ON webhook_data (status, timestamp)")
+            connection.commit()
+            
+            # Covering index for the rollup statistics queries
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_webhook_rollups_covering
+                ON webhook_rollups (granularity, bucket_start, source, source_subtype, status, event_count)
+            """)
+            connection.commit()
+            
+            # Email delivery status columns on notifications
+            cursor.execute("PRAGMA table_info(notifications)")
+            notification_columns = {row[1] for row in cursor.fetchall()}
+            for column, column_type in (('delivery_status', 'VARCHAR(20)'), ('delivery_attempts', 'INTEGER'),
+                                        ('delivered_at', 'DATETIME'), ('delivery_error', 'TEXT')):
+                if column not in notification_columns:
+                    logger.info(f"Adding {column} column to notifications table")
+                    cursor.execute(f"ALTER TABLE notifications ADD COLUMN {column} {column_type}")
+            connection.commit()
+            
+            # Out-of-order commit tracking on replication cursors
+            cursor.execute("PRAGMA table_info(replication_cursors)")
+            cursor_columns = {row[1] for row in cursor.fetchall()}
+            if cursor_columns:
+                for column, column_type in (('max_seq', 'INTEGER'), ('gaps', 'JSON')):
+                    if column not in cursor_columns:
+                        logger.info(f"Adding {column} column to replication_cursors table")
+                        cursor.execute(f"ALTER TABLE replication_cursors ADD COLUMN {column} {column_type}")
+                connection.commit()
+            
+            # Seen range on payload shapes; shapes recorded without one are rebuilt below
+            cursor.execute("PRAGMA table_info(webhook_shapes)")
+            shape_columns = {row[1] for row in cursor.fetchall()}
+            rebuild_shapes = bool(shape_columns) and 'last_seen' not in shape_columns
+            if rebuild_shapes:
+                logger.info("Adding last_seen column to webhook_shapes table")
+                cursor.execute("ALTER TABLE webhook_shapes ADD COLUMN last_seen DATETIME")
+                connection.commit()
+            
             # Check if external_storage table exists (SQLite approach)
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='external_storage'")
             has_external_storage = cursor.fetchone() is not None
@@ -74,7 +137,6 @@ def run_migrations():
                 
             logger.info("Database migrations completed successfully")
             cursor.close()
-            return True
             
         except Exception as e:
             logger.error(f"Error during database migrations: {str(e)}")
@@ -83,6 +145,97 @@ def run_migrations():
             return False
         finally:
             connection.close()
+        
+        # Populate the rollup table once for databases that predate it
+        try:
+            from services.rollup_service import rollups_empty, backfill_rollups
+            if rollups_empty() and db.session.query(WebhookData.id).first() is not None:
+                logger.info("Backfilling webhook rollups from existing data")
+                backfill_rollups()
+        except Exception as e:
+            logger.error(f"Error backfilling webhook rollups: {str(e)}")
+            db.session.rollback()
+        
+        # Learn the payload shapes of existing data for the export columns
+        try:
+            from services.shape_service import shapes_empty, backfill_shapes
+            if (shapes_empty() or rebuild_shapes) and db.session.query(WebhookData.id).first() is not None:
+                logger.info("Backfilling payload shapes from existing data")
+                backfill_shapes()
+        except Exception as e:
+            logger.error(f"Error backfilling payload shapes: {str(e)}")
+            db.session.rollback()
+        
+        # Index scans processed before the scan_records table existed
+        try:
+            from services.scan_service import scan_records_empty, backfill_scan_records
+            if scan_records_empty():
+                backfill_scan_records()
+        except Exception as e:
+            logger.error(f"Error backfilling scan records: {str(e)}")
+            db.session.rollback()
+        
+        return True
+
+def check_index_usage():
+    """
+    Verify with EXPLAIN QUERY PLAN that the filtered webhook queries use their indexes
+    
+    The queries are compiled from the same query builder that serves
+    /api/webhook/data, so a change that makes a filter non-sargable (for example
+    wrapping the column in a function) shows up here.
+    
+    Returns:
+        dict: Query name -> (expected index, whether it is used, plan text)
+    """
+    from services.data_service import _build_webhook_query
+    
+    checks = {
+        'source': ('idx_webhook_data_source_timestamp',
+                   dict(source_filter='stripe', date_from='2025-01-01T00:00:00')),
+        'status': ('idx_webhook_data_status_timestamp',
+                   dict(status_filter='error', date_from='2025-01-01T00:00:00')),
+        'date_range': ('idx_webhook_data_timestamp_id',
+                       dict(date_from='2025-01-01T00:00:00', date_to='2025-01-31T23:59:59')),
+    }
+    
+    results = {}
+    with app.app_context():
+        for name, (index_name, filters) in checks.items():
+            query = _build_webhook_query(**filters).order_by(WebhookData.timestamp.desc())
+            compiled = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+            plan = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {compiled}")).fetchall()
+            plan_text = ' | '.join(str(row[-1]) for row in plan)
+            used = index_name in plan_text
+            if not used:
+                logger.warning(f"Query '{name}' does not use {index_name}: {plan_text}")
+            results[name] = (index_name, used, plan_text)
+    
+    return results
 
 if __name__ == "__main__":
-    run_migrations()
\ No newline at end of file
+    import sys
+    
+    run_migrations()
+    
+    if '--backfill-rollups' in sys.argv:
+        from services.rollup_service import backfill_rollups
+        with app.app_context():
+            print(f"Rebuilt webhook rollups from {backfill_rollups()} rows")
+    
+    if '--backfill-shapes' in sys.argv:
+        from services.shape_service import backfill_shapes
+        with app.app_context():
+            print(f"Rebuilt payload shapes from {backfill_shapes()} rows")
+    
+    if '--backfill-scans' in sys.argv:
+        from services.scan_service import backfill_scan_records
+        with app.app_context():
+            print(f"Indexed {backfill_scan_records()} processed scans")
+    
+    if '--explain' in sys.argv:
+        ok = True
+        for name, (index_name, used, plan_text) in check_index_usage().items():
+            print(f"{name:<12} {'OK ' if used else 'MISSING'} {index_name}: {plan_text}")
+            ok = ok and used
+        sys.exit(0 if ok else 1)
\ No newline at end of file
@@ -5,6 +5,13 @@ from db_config import db
 class WebhookData(db.Model):
     """Model for storing webhook data"""
     __tablename__ = 'webhook_data'
+    __table_args__ = (
+        # Keyset pagination orders by (timestamp, id)
+        db.Index('idx_webhook_data_timestamp_id', 'timestamp', 'id'),
+        # Source and status filters combined with a date range
+        db.Index('idx_webhook_data_source_timestamp', 'source', 'timestamp'),
+        db.Index('idx_webhook_data_status_timestamp', 'status', 'timestamp'),
+    )
     
     id = db.Column(db.String(36), primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -35,6 +42,90 @@ class WebhookData(db.Model):
             'data': self.payload
         }
 
+class WebhookRollup(db.Model):
+    """Model for pre-aggregated webhook counts per time bucket"""
+    __tablename__ = 'webhook_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'bucket_start', 'source', 'source_subtype', 'status',
+                            name='uq_webhook_rollups_bucket'),
+        # Covers the statistics queries so they never touch the table rows
+        db.Index('idx_webhook_rollups_covering', 'granularity', 'bucket_start', 'source',
+                 'source_subtype', 'status', 'event_count'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # 'minute', 'hour' or 'day'
+    granularity = db.Column(db.String(10), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    source = db.Column(db.String(50), nullable=False)
+    # Empty string rather than NULL so the unique constraint matches missing values
+    source_subtype = db.Column(db.String(50), nullable=False, default='')
+    status = db.Column(db.String(20), nullable=False, default='')
+    event_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'granularity': self.granularity,
+            'bucket_start': self.bucket_start.isoformat(),
+            'source': self.source,
+            'source_subtype': self.source_subtype or None,
+            'status': self.status or None,
+            'count': self.event_count
+        }
+
+class WebhookShape(db.Model):
+    """Model for the distinct payload key structures seen per source and subtype"""
+    __tablename__ = 'webhook_shapes'
+    __table_args__ = (
+        db.UniqueConstraint('source', 'source_subtype', 'shape_hash', name='uq_webhook_shapes_shape'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(50), nullable=False)
+    # Empty string rather than NULL so the unique constraint matches missing values
+    source_subtype = db.Column(db.String(50), nullable=False, default='')
+    shape_hash = db.Column(db.String(40), nullable=False)
+    shape = db.Column(db.JSON, nullable=False)
+    # Earliest and latest webhook timestamps with this shape, so exports can skip shapes outside their date range
+    first_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'source': self.source,
+            'source_subtype': self.source_subtype or None,
+            'shape': self.shape,
+            'first_seen': self.first_seen.isoformat() if self.first_seen else None,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None
+        }
+
+class ScanRecord(db.Model):
+    """Model indexing processed scans; the full results stay in their JSON files"""
+    __tablename__ = 'scan_records'
+    __table_args__ = (
+        # Scan history lists the newest scans first
+        db.Index('idx_scan_records_timestamp_scan_id', 'timestamp', 'scan_id'),
+    )
+
+    scan_id = db.Column(db.String(36), primary_key=True)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    type = db.Column(db.String(20), nullable=False)
+    file_name = db.Column(db.String(255), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    page_count = db.Column(db.Integer, nullable=True)
+    # Path of the processed scan JSON file
+    result_path = db.Column(db.String(500), nullable=False)
+
+    def to_dict(self):
+        return {
+            'scan_id': self.scan_id,
+            'timestamp': self.timestamp.isoformat(),
+            'type': self.type,
+            'file_name': self.file_name,
+            'file_size': self.file_size,
+            'page_count': self.page_count
+        }
+
 class DataSource(db.Model):
     """Model for webhook data sources"""
     __tablename__ = 'data_sources'
@@ -66,6 +157,11 @@ class Notification(db.Model):
     source = db.Column(db.String(50), nullable=False)
     message = db.Column(db.String(255), nullable=False)
     read = db.Column(db.Boolean, default=False)
+    # Email delivery: 'queued', 'sent', 'failed', 'skipped' or 'dropped'; NULL when no email was due
+    delivery_status = db.Column(db.String(20), nullable=True)
+    delivery_attempts = db.Column(db.Integer, nullable=True)
+    delivered_at = db.Column(db.DateTime, nullable=True)
+    delivery_error = db.Column(db.Text, nullable=True)
     
     def __init__(self, webhook_id, type, source, message, read=False):
         self.webhook_id = webhook_id
@@ -83,7 +179,11 @@ class Notification(db.Model):
             'type': self.type,
             'source': self.source,
             'message': self.message,
-            'read': self.read
+            'read': self.read,
+            'delivery_status': self.delivery_status,
+            'delivery_attempts': self.delivery_attempts,
+            'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None,
+            'delivery_error': self.delivery_error
         }
 
 class Integration(db.Model):
@@ -151,4 +251,52 @@ class ExternalStorage(db.Model):
         elif not mask_connection:
             result['connection_string'] = self.connection_string
             
-        return result
\ No newline at end of file
+        return result
+
+class ReplicationOutbox(db.Model):
+    """Model queueing saved webhooks for replication to external storage"""
+    __tablename__ = 'replication_outbox'
+    # Sequence numbers are high-water marks, so SQLite must never reuse them
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    webhook_id = db.Column(db.String(36), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class ReplicationCursor(db.Model):
+    """Model tracking how far each external storage has been replicated"""
+    __tablename__ = 'replication_cursors'
+    
+    storage_id = db.Column(db.Integer, primary_key=True)
+    # Every outbox row up to this sequence number has been shipped (or abandoned)
+    last_seq = db.Column(db.Integer, nullable=False, default=0)
+    # Highest sequence number shipped; rows between last_seq and max_seq may still be missing
+    max_seq = db.Column(db.Integer, nullable=True)
+    # Sequence numbers below max_seq that were not committed yet when read, mapped to when
+    # they were first seen missing (concurrent writers can commit out of sequence order)
+    gaps = db.Column(db.JSON, nullable=True)
+    shipped_count = db.Column(db.Integer, nullable=False, default=0)
+    last_shipped_at = db.Column(db.DateTime, nullable=True)
+    # Seconds between the last shipped webhook being saved and being shipped
+    last_lag_seconds = db.Column(db.Float, nullable=True)
+    # Consecutive failed flushes, driving the retry backoff
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    # Replication worker currently shipping to the storage
+    lease_owner = db.Column(db.String(100), nullable=True)
+    lease_until = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'storage_id': self.storage_id,
+            'last_seq': self.last_seq,
+            'max_seq': self.max_seq,
+            'gaps': len(self.gaps or {}),
+            'shipped_count': self.shipped_count,
+            'last_shipped_at': self.last_shipped_at.isoformat() if self.last_shipped_at else None,
+            'last_lag_seconds': self.last_lag_seconds,
+            'failures': self.failures,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error
+        }
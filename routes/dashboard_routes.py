@@ -1,8 +1,9 @@
 import logging
-from flask import Blueprint, render_template, jsonify
-from services.data_service import get_webhook_data, get_data_sources, get_webhook_stats
-from utils.data_transformers import transform_for_charts
+from flask import Blueprint, render_template, jsonify, request, Response
+from services.data_service import get_webhook_data, get_data_sources, get_webhook_stats, get_webhook_chart_data
 from services.notification_service import get_notifications
+from services.summary_cache import get_cached, record_not_modified, get_summary_cache_stats
+from services.event_broker import subscribe, get_broker_stats, TooManySubscribers
 
 logger = logging.getLogger(__name__)
 dashboard_bp = Blueprint('dashboard', __name__)
@@ -44,11 +45,8 @@ def get_dashboard_data():
         # Get recent notifications
         recent_notifications = get_notifications(limit=5)
 
-        # Get all webhook data for chart transformation
-        all_webhooks = get_webhook_data()
-
-        # Transform data for charts using chart-specific function
-        chart_data = transform_for_charts(all_webhooks)
+        # Per-source daily counts for the last 7 days, from the rollups
+        chart_data = get_webhook_chart_data(days=7)
 
         # Source distribution for pie/doughnut chart
         source_counts = stats.get('by_source', {})
@@ -66,32 +64,142 @@ def get_dashboard_data():
         return None
 
 
+def build_summary_payload():
+    """
+    Assemble the dashboard summary response
+
+    Returns:
+        tuple: (payload, cacheable) - the fallback payload served after an
+            error is not cached
+    """
+    dashboard_data = get_dashboard_data()
+    if not dashboard_data:
+        return {
+            "status": "success",
+            "data": {
+                "total_webhooks": 0,
+                "source_counts": {},
+                "chart_data": {"labels": [], "datasets": []},
+                "latest_records": [],
+                "notifications": [],
+                "sources": get_data_sources() # Use existing function
+            }
+        }, False
+    return {
+        "status": "success",
+        "data": dashboard_data
+    }, True
+
+
 @dashboard_bp.route('/api/dashboard/summary')
 def dashboard_summary():
     """
     API endpoint to provide summary data for the dashboard
+
+    The assembled response is cached until the TTL expires or new webhook data
+    is ingested. Clients that send If-None-Match with the current ETag get a
+    304 Not Modified.
+    """
+    try:
+        body, etag = get_cached('dashboard_summary', build_summary_payload)
+
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # Browsers may keep the response but must revalidate it on every poll
+        response.headers['Cache-Control'] = 'no-cache'
+        response.make_conditional(request)
+        if response.status_code == 304:
+            record_not_modified()
+        return response
+    except Exception as e:
+        logger.error(f"Error getting dashboard summary: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": "Failed to fetch dashboard data"
+        }), 500
+
+
+@dashboard_bp.route('/api/dashboard/stats')
+def dashboard_stats():
+    """
+    API endpoint for dashboard totals and chart data under the dashboard filters
+
+    Query parameters:
+    - source: filter by source; repeat or comma-separate for several
+    - from: start date in ISO format
+    - to: end date in ISO format
+
+    Counts come from the day rollups, so filtered totals cost the same at any
+    table size.
     """
     try:
-        dashboard_data = get_dashboard_data()
-        if not dashboard_data:
-            return jsonify({
-                "status": "success",
-                "data": {
-                    "total_webhooks": 0,
-                    "source_counts": {},
-                    "chart_data": {"labels": [], "datasets": []},
-                    "latest_records": [],
-                    "notifications": [],
-                    "sources": get_data_sources() # Use existing function
-                }
-            })
+        source_filter = request.args.getlist('source')
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+
+        stats = get_webhook_stats(source_filter, date_from, date_to)
+        chart_data = get_webhook_chart_data(days=7, source_filter=source_filter,
+                                            date_from=date_from, date_to=date_to)
         return jsonify({
             "status": "success",
-            "data": dashboard_data
+            "data": {
+                "total_webhooks": stats.get('total', 0),
+                "source_counts": stats.get('by_source', {}),
+                "chart_data": chart_data
+            }
         })
     except Exception as e:
-        logger.error(f"Error getting dashboard summary: {str(e)}")
+        logger.error(f"Error getting dashboard stats: {str(e)}")
         return jsonify({
             "status": "error",
-            "message": "Failed to fetch dashboard data"
-        }), 500
\ No newline at end of file
+            "message": "Failed to fetch dashboard stats"
+        }), 500
+
+
+@dashboard_bp.route('/api/dashboard/cache/stats')
+def dashboard_cache_stats():
+    """
+    API endpoint for the dashboard summary cache hit/miss counters
+    """
+    return jsonify({
+        "status": "success",
+        "data": get_summary_cache_stats()
+    })
+
+
+@dashboard_bp.route('/api/stream/events')
+def stream_events():
+    """
+    Server-Sent Events stream of live dashboard deltas
+
+    Each 'webhook' event carries the new record summary, per-source counter
+    increments and the new notification. A 'resync' event tells the client to
+    refetch the full summary because events were missed. Reconnecting clients
+    resume from the Last-Event-ID header.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        events = subscribe(last_event_id)
+    except TooManySubscribers as e:
+        logger.warning(f"Rejected event stream subscriber: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": "Too many live dashboard connections"
+        }), 503
+
+    response = Response(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies such as nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@dashboard_bp.route('/api/stream/stats')
+def stream_stats():
+    """
+    API endpoint for live event stream subscriber and event counters
+    """
+    return jsonify({
+        "status": "success",
+        "data": get_broker_stats()
+    })
@@ -0,0 +1,94 @@
+import logging
+from flask import Blueprint, request, jsonify, send_file
+
+from services.export_jobs import (create_export_job, get_export_job, get_export_file,
+                                  get_export_mimetype, public_job)
+
+logger = logging.getLogger(__name__)
+export_bp = Blueprint('export', __name__)
+
+
+def _export_params():
+    """Collect export parameters from a JSON body or the query string"""
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        return body
+    return {
+        'format': request.args.get('format'),
+        'source': request.args.getlist('source'),
+        'subtype': request.args.getlist('subtype'),
+        'status': request.args.getlist('status'),
+        'from': request.args.get('from'),
+        'to': request.args.get('to'),
+        'pretty': request.args.get('pretty', 'false'),
+        'gzip': request.args.get('gzip', 'false'),
+        'columns': request.args.get('columns', ''),
+        'depth': request.args.get('depth'),
+    }
+
+
+@export_bp.route('/api/exports', methods=['POST'])
+def create_export():
+    """
+    Start a background export job
+
+    Accepts the same parameters as /api/webhook/export (format, source, subtype,
+    status, from, to, pretty, gzip, columns, depth) as a JSON body or query string.
+    An identical request made while a job is still queued or running returns
+    that job instead of starting another one.
+    """
+    try:
+        job, created = create_export_job(_export_params())
+
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    except Exception as e:
+        logger.error(f"Error creating export job: {str(e)}")
+        return jsonify({"status": "error", "message": f"Error creating export job: {str(e)}"}), 500
+
+    response = jsonify({
+        "status": "success",
+        "deduplicated": not created,
+        "job": public_job(job)
+    })
+    response.status_code = 202
+    response.headers['Location'] = f"/api/exports/{job['id']}"
+    return response
+
+
+@export_bp.route('/api/exports/<job_id>', methods=['GET'])
+def get_export(job_id):
+    """Get the status and progress of an export job"""
+    job = get_export_job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Export job not found"}), 404
+
+    return jsonify({"status": "success", "job": public_job(job)})
+
+
+@export_bp.route('/api/exports/<job_id>/download', methods=['GET'])
+def download_export(job_id):
+    """
+    Download the result of a completed export job
+
+    Supports Range and conditional requests, so interrupted downloads of large
+    exports can be resumed.
+    """
+    job, path = get_export_file(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Export job not found"}), 404
+    if path is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Export is not ready (status: {job['status']})",
+            "job": public_job(job)
+        }), 409
+
+    return send_file(
+        path,
+        mimetype=get_export_mimetype(job),
+        as_attachment=True,
+        download_name=job['filename'],
+        conditional=True
+    )
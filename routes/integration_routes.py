@@ -8,6 +8,7 @@ from services.integration_service import (
     save_integration,
     delete_integration
 )
+from services.config_cache import invalidate_config_cache
 
 logger = logging.getLogger(__name__)
 integration_bp = Blueprint('integration', __name__)
@@ -155,6 +156,7 @@ def create_integration():
         integration = save_integration(data)
         
         if integration:
+            invalidate_config_cache()
             return jsonify({
                 "status": "success",
                 "message": "Integration created successfully",
@@ -179,6 +181,7 @@ def update_integration(integration_id):
         integration = save_integration(data)
         
         if integration:
+            invalidate_config_cache()
             return jsonify({
                 "status": "success",
                 "message": "Integration updated successfully",
@@ -200,6 +203,7 @@ def remove_integration(integration_id):
         result = delete_integration(integration_id)
         
         if result:
+            invalidate_config_cache()
             return jsonify({
                 "status": "success",
                 "message": "Integration deleted successfully"
@@ -5,13 +5,17 @@ This module provides routes for the scanning functionality of the application.
 """
 
 import os
-import json
 import datetime
 import traceback
-from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash, send_from_directory
+import uuid
+from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash, send_from_directory, send_file
 from werkzeug.utils import secure_filename
 
+from scanner.ocr_cache import get_ocr_cache_stats
+from scanner.scan_jobs import SCAN_MAX_BATCH_FILES, get_scan_batch, get_scan_job, public_job, submit_batch
 from scanner.scan_processor import ScanProcessor, save_uploaded_file
+from scanner.thumbnails import THUMBNAIL_MAX_AGE, thumbnail_mimetype, thumbnail_path
+from services.scan_service import SCAN_HISTORY_PAGE_SIZE, get_scan, get_scan_history
 
 # Create blueprint
 scanner_bp = Blueprint('scanner', __name__, url_prefix='/scanner')
@@ -29,77 +33,109 @@ def scanner_page():
 @scanner_bp.route('/upload', methods=['POST'])
 def upload_file():
     """
-    Handle file upload and scanning
+    Handle file uploads
+
+    Accepts one or more files (as 'file' or 'files') and queues each for
+    scanning in the background. Responds 202 with a job per file and the batch
+    they belong to; poll the status URLs for progress and results.
     """
-    if 'file' not in request.files:
+    files = request.files.getlist('file') + request.files.getlist('files')
+    if not files:
         return jsonify({'error': 'No file part'}), 400
-        
-    file = request.files['file']
-    
-    if file.filename == '':
+
+    if any(file.filename == '' for file in files):
         return jsonify({'error': 'No selected file'}), 400
-        
-    # Check file extension
-    allowed_extensions = ['.jpg', '.jpeg', '.png', '.pdf', '.tiff', '.tif', '.bmp']
-    file_ext = os.path.splitext(file.filename.lower())[1]
-    
-    if file_ext not in allowed_extensions:
+
+    if len(files) > SCAN_MAX_BATCH_FILES:
         return jsonify({
-            'error': 'File type not supported',
-            'message': f'Supported formats: {", ".join(allowed_extensions)}'
+            'error': 'Too many files',
+            'message': f'At most {SCAN_MAX_BATCH_FILES} files can be uploaded at once'
         }), 400
-        
+
+    # Check file extensions
+    allowed_extensions = ['.jpg', '.jpeg', '.png', '.pdf', '.tiff', '.tif', '.bmp']
+    for file in files:
+        file_ext = os.path.splitext(file.filename.lower())[1]
+        if file_ext not in allowed_extensions:
+            return jsonify({
+                'error': 'File type not supported',
+                'message': f'{file.filename}: supported formats are {", ".join(allowed_extensions)}'
+            }), 400
+
     try:
-        # Save the uploaded file
-        file_path = save_uploaded_file(file)
-        
-        # Process the file
-        result = scan_processor.process_file(file_path)
-        
-        # Return the results
-        return jsonify({
-            'success': True,
-            'message': 'File processed successfully',
-            'scan_id': result.get('scan_id', ''),
-            'data': result
-        })
-        
+        # Save the uploaded files under unique names
+        saved = []
+        timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+        for file in files:
+            filename = f"{timestamp}_{uuid.uuid4().hex[:8]}_{secure_filename(file.filename)}"
+            saved.append((save_uploaded_file(file, filename), file.filename))
+
+        # Queue them for scanning
+        batch, jobs = submit_batch(saved)
+
     except Exception as e:
         return jsonify({
-            'error': 'Processing error',
+            'error': 'Upload error',
             'message': str(e)
         }), 500
 
+    response = jsonify({
+        'success': True,
+        'message': f'{len(jobs)} file(s) queued for scanning',
+        'batch_id': batch['id'],
+        'batch_url': url_for('scanner.get_batch', batch_id=batch['id']),
+        'jobs': [public_job(job) for job in jobs]
+    })
+    response.status_code = 202
+    if len(jobs) == 1:
+        response.headers['Location'] = url_for('scanner.get_job', job_id=jobs[0]['id'])
+    else:
+        response.headers['Location'] = url_for('scanner.get_batch', batch_id=batch['id'])
+    return response
+
+@scanner_bp.route('/jobs/<job_id>')
+def get_job(job_id):
+    """
+    Get the status, progress and (once completed) result of a scan job
+    """
+    job = get_scan_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Scan job not found'}), 404
+    return jsonify(public_job(job))
+
+@scanner_bp.route('/batches/<batch_id>')
+def get_batch(batch_id):
+    """
+    Get the status of a batch upload and each of its scan jobs
+    """
+    batch = get_scan_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Scan batch not found'}), 404
+    return jsonify(batch)
+
+@scanner_bp.route('/cache/stats')
+def ocr_cache_stats():
+    """
+    Get the OCR result cache size and hit/miss counters
+    """
+    return jsonify({
+        'success': True,
+        'data': get_ocr_cache_stats()
+    })
+
 @scanner_bp.route('/history')
 def scan_history():
     """
-    View scan history
-    """
-    processed_files = []
-    
-    # List processed JSON files
-    processed_folder = 'data/processed_scans'
-    
-    if os.path.exists(processed_folder):
-        for filename in os.listdir(processed_folder):
-            if filename.endswith('.json'):
-                file_path = os.path.join(processed_folder, filename)
-                try:
-                    with open(file_path, 'r') as f:
-                        data = json.load(f)
-                        processed_files.append(data)
-                except Exception as e:
-                    print(f"Error reading {file_path}: {str(e)}")
-    
-    # Sort by timestamp (newest first)
-    processed_files.sort(
-        key=lambda x: x.get('timestamp', ''), 
-        reverse=True
-    )
-    
+    View scan history, one page at a time
+    """
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', SCAN_HISTORY_PAGE_SIZE, type=int)
+    history = get_scan_history(page, per_page)
+
     return render_template(
         'scan_history.html', 
-        scans=processed_files
+        scans=history['scans'],
+        pagination=history
     )
 
 @scanner_bp.route('/view/<scan_id>')
@@ -107,20 +143,10 @@ def view_scan(scan_id):
     """
     View a specific scan
     """
-    processed_folder = 'data/processed_scans'
-    
-    for filename in os.listdir(processed_folder):
-        if filename.endswith('.json'):
-            file_path = os.path.join(processed_folder, filename)
-            try:
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                    if data.get('scan_id') == scan_id:
-                        return render_template('scan_view.html', scan=data)
-            except Exception as e:
-                print(f"Error reading {file_path}: {str(e)}")
-    
-    return render_template('error.html', message=f"Scan with ID {scan_id} not found"), 404
+    data = get_scan(scan_id)
+    if data is None:
+        return render_template('error.html', message=f"Scan with ID {scan_id} not found"), 404
+    return render_template('scan_view.html', scan=data)
 
 @scanner_bp.route('/uploads/<path:filename>')
 def serve_uploaded_file(filename):
@@ -129,6 +155,25 @@ def serve_uploaded_file(filename):
     """
     return send_from_directory('data/scans', filename)
 
+@scanner_bp.route('/thumbnails/<thumbnail_id>/<int:size>.<format_name>')
+def serve_thumbnail(thumbnail_id, size, format_name):
+    """
+    Serve a scan thumbnail
+
+    Thumbnails are content-addressed and never change, so they are cached as
+    immutable and revalidated by ETag.
+    """
+    path = thumbnail_path(thumbnail_id, size, format_name)
+    if path is None or not os.path.exists(path):
+        return jsonify({'error': 'Thumbnail not found'}), 404
+
+    # The name is content-addressed, so it is the same ETag on every server
+    response = send_file(path, mimetype=thumbnail_mimetype(format_name), conditional=True,
+                         etag=f"{thumbnail_id}-{size}-{format_name}", max_age=THUMBNAIL_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @scanner_bp.route('/sample')
 def sample_scan():
     """
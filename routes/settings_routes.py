@@ -9,6 +9,11 @@ from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from models import db, Integration, ExternalStorage
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.attributes import flag_modified
+from services.config_cache import get_global_settings, invalidate_config_cache
+from services.external_db import get_engine, invalidate_engine
+from services.replication_service import get_replication_stats
+from services.segment_sink import close_segment_writer
 
 logger = logging.getLogger(__name__)
 settings_bp = Blueprint('settings', __name__)
@@ -18,9 +23,9 @@ def settings_page():
     # Get all available timezones
     timezones = pytz.all_timezones
     
-    # Get current settings from database
-    current_settings = Integration.query.filter_by(integration_type='settings').first()
-    if not current_settings:
+    # Get current settings from the config cache
+    current_settings = get_global_settings()
+    if current_settings is None:
         current_settings = Integration(
             integration_type='settings',
             name='Global Settings',
@@ -34,10 +39,12 @@ def settings_page():
         )
         db.session.add(current_settings)
         db.session.commit()
+        invalidate_config_cache()
+        current_settings = current_settings.settings
 
     return render_template('settings.html', 
                          timezones=timezones,
-                         current_settings=current_settings.settings)
+                         current_settings=current_settings)
 
 @settings_bp.route('/api/settings', methods=['POST'])
 def update_settings():
@@ -47,6 +54,8 @@ def update_settings():
         
         if settings_obj:
             settings_obj.settings.update(settings_data)
+            # The JSON column does not track in-place changes
+            flag_modified(settings_obj, 'settings')
         else:
             settings_obj = Integration(
                 integration_type='settings',
@@ -56,6 +65,7 @@ def update_settings():
             db.session.add(settings_obj)
             
         db.session.commit()
+        invalidate_config_cache()
         return jsonify({'status': 'success'})
     except Exception as e:
         logger.error(f"Error updating settings: {str(e)}")
@@ -90,6 +100,7 @@ def email_settings_page():
         )
         db.session.add(email_settings)
         db.session.commit()
+        invalidate_config_cache()
     
     return render_template('email_settings.html', email_settings=email_settings.settings)
 
@@ -103,6 +114,7 @@ def update_email_settings():
         if email_settings:
             # Update existing settings
             email_settings.settings.update(settings_data)
+            flag_modified(email_settings, 'settings')
             email_settings.enabled = settings_data.get('email_provider') is not None
         else:
             # Create new email settings
@@ -115,6 +127,7 @@ def update_email_settings():
             db.session.add(email_settings)
             
         db.session.commit()
+        invalidate_config_cache()
         return jsonify({'status': 'success'})
     except Exception as e:
         logger.error(f"Error updating email settings: {str(e)}")
@@ -297,6 +310,18 @@ def get_external_storage_configs():
         logger.error(f"Error getting external storage configs: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@settings_bp.route('/api/external-storage/replication', methods=['GET'])
+def get_replication_status():
+    """Get the replication outbox size and each storage's high-water mark and lag"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': get_replication_stats()
+        })
+    except Exception as e:
+        logger.error(f"Error getting replication stats: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @settings_bp.route('/api/external-storage', methods=['POST'])
 def create_external_storage():
     """Create a new external storage configuration"""
@@ -320,6 +345,7 @@ def create_external_storage():
         
         db.session.add(storage_config)
         db.session.commit()
+        invalidate_config_cache()
         
         return jsonify({
             'status': 'success', 
@@ -368,6 +394,10 @@ def update_external_storage(storage_id):
             storage_config.storage_type = data['storage_type']
             
         db.session.commit()
+        # Rebuild the pooled engine from the new settings on next use
+        invalidate_engine(storage_id)
+        close_segment_writer(storage_id)
+        invalidate_config_cache()
         
         return jsonify({
             'status': 'success',
@@ -387,6 +417,9 @@ def delete_external_storage(storage_id):
         storage_config = ExternalStorage.query.get_or_404(storage_id)
         db.session.delete(storage_config)
         db.session.commit()
+        invalidate_engine(storage_id)
+        close_segment_writer(storage_id)
+        invalidate_config_cache()
         
         return jsonify({
             'status': 'success',
@@ -409,10 +442,9 @@ def test_external_storage_connection(storage_id):
         
         # Test connection based on storage type
         if storage_config.storage_type == 'database':
-            from sqlalchemy import create_engine
             try:
-                engine = create_engine(storage_config.connection_string)
-                conn = engine.connect()
+                # Also creates the pooled engine and its table ahead of the first webhook
+                conn = get_engine(storage_config).connect()
                 conn.close()
                 success = True
                 message = "Database connection successful"
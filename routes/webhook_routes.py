@@ -3,15 +3,19 @@ import logging
 import uuid
 import time
 from datetime import datetime
-from flask import Blueprint, request, jsonify, Response, make_response, send_file
+from flask import Blueprint, request, jsonify, Response, send_file, stream_with_context
 from pathlib import Path
-import io
 import os
 
-from services.data_service import save_webhook_data, get_webhook_data
-from services.notification_service import notify_new_data
-from services.webhook_processor import process_webhook, validate_webhook_signature, determine_source
-from services.export_service import export_data_as_json, export_data_as_csv, export_data_as_excel
+from services.data_service import get_webhook_data, get_webhook_page, iter_webhook_data
+from services.webhook_processor import validate_webhook_signature
+from services.ingest_queue import enqueue_webhook, parse_webhook_body, ingest_webhook, get_queue_stats
+from services.write_batcher import get_batcher_stats
+from services.notification_dispatcher import get_dispatcher_stats
+from services.export_service import (EXPORT_FLATTEN_DEPTH, export_columnar_file, export_excel_file,
+                                     generate_export_filename, get_export_columns, gzip_stream,
+                                     stream_csv, stream_json, stream_ndjson)
+from utils.payload_flattener import parse_flatten_depth
 
 logger = logging.getLogger(__name__)
 webhook_bp = Blueprint('webhook', __name__)
@@ -19,13 +23,18 @@ webhook_bp = Blueprint('webhook', __name__)
 # Maximum number of retry attempts for webhook processing
 MAX_RETRIES = 3
 
+# Queue webhooks for background processing instead of handling them inline
+ASYNC_INGEST = os.environ.get('WEBHOOK_ASYNC_INGEST', 'true').lower() == 'true'
+
 @webhook_bp.route('/api/webhook', methods=['POST'])
 def receive_webhook():
     """
     Endpoint to receive webhook data from external sources
     
     This is the main webhook endpoint that can handle multiple types of incoming data.
-    It identifies the source based on the payload and routes it accordingly.
+    The raw request is appended to the ingest journal and acknowledged with 202;
+    background workers identify the source and route it accordingly. Set
+    WEBHOOK_ASYNC_INGEST=false to process webhooks inline instead.
     """
     start_time = time.time()
     retry_count = 0
@@ -37,49 +46,35 @@ def receive_webhook():
         # Get data from request with retries for robustness
         while retry_count < MAX_RETRIES:
             try:
-                # Try JSON first as it's most common
-                if request.is_json:
-                    data = request.json
-                # Then try form data
-                elif request.form:
-                    data = request.form.to_dict()
-                # Then try raw data as JSON
-                else:
-                    try:
-                        data = json.loads(request.data.decode('utf-8'))
-                    except json.JSONDecodeError:
-                        # As a last resort, store as raw content
-                        data = {"raw_content": request.data.decode('utf-8')}
-                
-                # Break out of retry loop if we successfully got data
+                body, content_type = read_webhook_body()
                 break
             
             except Exception as e:
                 retry_count += 1
                 if retry_count >= MAX_RETRIES:
-                    logger.error(f"Failed to parse webhook data after {MAX_RETRIES} attempts: {str(e)}")
+                    logger.error(f"Failed to read webhook data after {MAX_RETRIES} attempts: {str(e)}")
                     raise
                 time.sleep(0.1)  # Short delay before retry
         
+        if ASYNC_INGEST:
+            # Persist the raw body and let the ingest workers do the rest
+            webhook_id = enqueue_webhook(body, content_type, headers)
+            
+            processing_time = time.time() - start_time
+            logger.info(f"Queued webhook {webhook_id} in {processing_time * 1000:.1f}ms")
+            
+            return jsonify({
+                "status": "success",
+                "message": "Webhook data received and queued for processing",
+                "id": webhook_id
+            }), 202
+        
         # Add HTTP headers to data for processing
+        data = parse_webhook_body(body, content_type)
         data['_headers'] = headers
         
-        # Process the webhook data through our processor pipeline
-        processed_data = process_webhook(data)
-        
-        # Create webhook data record
-        webhook_data = {
-            "id": str(uuid.uuid4()),
-            "timestamp": datetime.now().isoformat(),
-            "source": processed_data.get("source", determine_source(data)),
-            "data": processed_data
-        }
-        
-        # Save the data
-        save_webhook_data(webhook_data)
-        
-        # Notify about new data
-        notify_new_data(webhook_data)
+        # Process, save and notify; the replication worker ships it to external storage later
+        webhook_data = ingest_webhook(data)
         
         # Log successful processing
         processing_time = time.time() - start_time
@@ -103,6 +98,35 @@ def receive_webhook():
             "message": "Webhook received, but there was an error processing it. It has been logged for investigation."
         }), 200
 
+def read_webhook_body():
+    """
+    Read the raw body of the current webhook request
+    
+    Multipart form data can't be re-parsed from the raw body later, so it is
+    converted to JSON up front; everything else is kept exactly as received.
+    
+    Returns:
+        tuple: (body, content_type)
+    """
+    if request.mimetype == 'multipart/form-data':
+        return json.dumps(request.form.to_dict()).encode('utf-8'), 'application/json'
+    return request.get_data(), request.content_type
+
+@webhook_bp.route('/api/webhook/queue/stats', methods=['GET'])
+def ingest_queue_stats():
+    """
+    Ingest queue depth, per-stage latency, write batcher and notification dispatcher statistics
+    """
+    try:
+        stats = get_queue_stats()
+        stats['writer'] = get_batcher_stats()
+        stats['notifications'] = get_dispatcher_stats()
+        return jsonify({"status": "success", "data": stats})
+    
+    except Exception as e:
+        logger.error(f"Error retrieving ingest queue stats: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @webhook_bp.route('/api/webhook/secure', methods=['POST'])
 def receive_secure_webhook():
     """
@@ -141,81 +165,174 @@ def test_webhook():
 def get_data():
     """
     Endpoint to retrieve webhook data
+    
+    Query parameters:
+    - source: filter by source; repeat or comma-separate for several
+    - subtype: filter by source subtype; repeat or comma-separate for several
+    - status: filter by status; repeat or comma-separate for several
+    - from: start date in ISO format
+    - to: end date in ISO format
+    - page_size: rows per page (alias: limit), capped by the server
+    - cursor: next_cursor from the previous page
+    - format: json (default, one page) or ndjson (streams every matching row)
     """
     try:
-        source_filter = request.args.get('source')
+        source_filter = request.args.getlist('source')
+        subtype_filter = request.args.getlist('subtype')
+        status_filter = request.args.getlist('status')
         date_from = request.args.get('from')
         date_to = request.args.get('to')
-        limit = request.args.get('limit')
+        response_format = request.args.get('format', 'json').lower()
         
-        # Convert limit to integer if provided
-        if limit:
+        if response_format == 'ndjson':
+            rows = iter_webhook_data(
+                source_filter, date_from, date_to,
+                subtype_filter=subtype_filter,
+                status_filter=status_filter
+            )
+            lines = (json.dumps(row, separators=(',', ':')) + '\n' for row in rows)
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+        
+        # Convert page size to integer if provided
+        page_size = request.args.get('page_size') or request.args.get('limit')
+        if page_size:
             try:
-                limit = int(limit)
+                page_size = int(page_size)
             except ValueError:
-                limit = None
+                page_size = None
+        
+        try:
+            data, next_cursor = get_webhook_page(
+                source_filter, date_from, date_to,
+                cursor=request.args.get('cursor'),
+                page_size=page_size,
+                subtype_filter=subtype_filter,
+                status_filter=status_filter
+            )
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
         
-        data = get_webhook_data(source_filter, date_from, date_to, limit)
-        return jsonify({"status": "success", "data": data})
+        return jsonify({"status": "success", "data": data, "next_cursor": next_cursor})
     
     except Exception as e:
         logger.error(f"Error retrieving webhook data: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# Content types of the streamed export formats
+STREAMING_EXPORT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Content types of the columnar export formats
+COLUMNAR_EXPORT_TYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
 @webhook_bp.route('/api/webhook/export', methods=['GET'])
 def export_data():
     """
     Export webhook data in various formats
     
+    JSON, NDJSON and CSV exports are streamed from a server-side cursor, so
+    they start immediately and use bounded memory at any size. Excel exports
+    are written row by row to a temporary file and then streamed from disk.
+    Parquet and Arrow exports keep typed columns and are written to a
+    temporary file in bounded batches.
+    
     Query parameters:
-    - format: json, csv, or excel (default: json)
-    - source: filter by source
+    - format: json, ndjson, csv, excel, parquet, or arrow (default: json)
+    - source: filter by source; repeat or comma-separate for several
+    - subtype: filter by source subtype; repeat or comma-separate for several
+    - status: filter by status; repeat or comma-separate for several
     - from: start date in ISO format
     - to: end date in ISO format
     - pretty: true/false for pretty JSON (default: false)
+    - columns: comma-separated CSV/Excel columns (default: every column of
+      the payload shapes recorded for the matching sources)
+    - depth: levels of nested payload objects expanded into dotted CSV/Excel
+      columns, 1-4 (default: EXPORT_FLATTEN_DEPTH)
+    - gzip: true/false to gzip-compress a streamed export (default: false)
     """
     try:
         # Get export parameters
         export_format = request.args.get('format', 'json').lower()
-        source_filter = request.args.get('source')
-        date_from = request.args.get('from')
-        date_to = request.args.get('to')
+        filters = {
+            'source_filter': request.args.getlist('source'),
+            'date_from': request.args.get('from'),
+            'date_to': request.args.get('to'),
+            'subtype_filter': request.args.getlist('subtype'),
+            'status_filter': request.args.getlist('status'),
+        }
         pretty = request.args.get('pretty', 'false').lower() == 'true'
+        compress = request.args.get('gzip', 'false').lower() == 'true'
+        try:
+            depth = parse_flatten_depth(request.args.get('depth'), EXPORT_FLATTEN_DEPTH)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
         
         # Export data in requested format
-        if export_format == 'json':
-            data, filename = export_data_as_json(source_filter, date_from, date_to, pretty)
-            response = make_response(data)
-            response.headers['Content-Type'] = 'application/json'
-            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
-        
-        elif export_format == 'csv':
-            data, filename = export_data_as_csv(source_filter, date_from, date_to)
-            response = make_response(data)
-            response.headers['Content-Type'] = 'text/csv'
+        if export_format in STREAMING_EXPORT_TYPES:
+            if export_format == 'json':
+                chunks = stream_json(pretty=pretty, **filters)
+            elif export_format == 'ndjson':
+                chunks = stream_ndjson(**filters)
+            else:
+                # Resolve the header before streaming so query errors still get a 500
+                columns = [column.strip() for column in request.args.get('columns', '').split(',') if column.strip()]
+                columns = columns or get_export_columns(filters['source_filter'], filters['subtype_filter'], depth,
+                                                        filters['date_from'], filters['date_to'])
+                chunks = stream_csv(columns=columns, depth=depth, **filters)
+            
+            filename = generate_export_filename(export_format, filters['source_filter'])
+            mimetype = STREAMING_EXPORT_TYPES[export_format]
+            if compress:
+                chunks = gzip_stream(chunks)
+                filename += '.gz'
+                mimetype = 'application/gzip'
+            
+            response = Response(stream_with_context(chunks), mimetype=mimetype)
             response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
             return response
         
         elif export_format == 'excel':
-            data, filename = export_data_as_excel(source_filter, date_from, date_to)
-            if data is None:
+            columns = [column.strip() for column in request.args.get('columns', '').split(',') if column.strip()]
+            output, filename = export_excel_file(columns=columns or None, depth=depth, **filters)
+            if output is None:
                 return jsonify({
                     "status": "error", 
-                    "message": "Excel export is not available. Pandas library is required."
+                    "message": "Excel export is not available. The xlsxwriter library is required."
                 }), 400
-                
+            
+            # The temporary file is streamed from disk and removed once the response is closed
             return send_file(
-                io.BytesIO(data),
+                output,
                 mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
                 as_attachment=True,
                 download_name=filename
             )
         
+        elif export_format in COLUMNAR_EXPORT_TYPES:
+            output, filename = export_columnar_file(export_format, **filters)
+            if output is None:
+                return jsonify({
+                    "status": "error",
+                    "message": f"{export_format.capitalize()} export is not available. The pyarrow library is required."
+                }), 400
+            
+            return send_file(
+                output,
+                mimetype=COLUMNAR_EXPORT_TYPES[export_format],
+                as_attachment=True,
+                download_name=filename
+            )
+        
         else:
             return jsonify({
                 "status": "error", 
-                "message": f"Unsupported export format: {export_format}. Supported formats are: json, csv, excel"
+                "message": f"Unsupported export format: {export_format}. Supported formats are: json, ndjson, csv, excel, parquet, arrow"
             }), 400
     
     except Exception as e:
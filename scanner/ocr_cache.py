@@ -0,0 +1,222 @@
+"""
+OCR Cache Module
+
+This module keeps OCR results on disk, keyed by the content hash of the
+scanned file together with the OCR configuration and preprocessing version,
+so re-uploading a file that was already scanned skips OCR entirely. Results
+are stored as JSON files; a small SQLite index tracks their sizes and last
+access times for least-recently-used eviction once OCR_CACHE_MAX_BYTES is
+exceeded, and keeps hit/miss counters shared by every process (the scan
+workers as well as the server).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+OCR_CACHE_FOLDER = os.environ.get('OCR_CACHE_FOLDER', 'data/ocr_cache')
+OCR_CACHE_MAX_BYTES = int(float(os.environ.get('OCR_CACHE_MAX_MB', 256)) * 1024 * 1024)
+OCR_CACHE_ENABLED = os.environ.get('OCR_CACHE_ENABLED', 'true').lower() == 'true'
+
+COUNTERS = ('hits', 'misses', 'stores', 'evictions', 'errors')
+
+_local = threading.local()
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Get the index connection for the current thread, creating the index if needed"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and getattr(_local, 'pid', None) == os.getpid():
+        return conn
+
+    os.makedirs(OCR_CACHE_FOLDER, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(OCR_CACHE_FOLDER, 'index.db'), timeout=30,
+                           isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ocr_cache (
+            key TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_access ON ocr_cache (last_access)")
+    conn.execute("CREATE TABLE IF NOT EXISTS ocr_cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(OCR_CACHE_FOLDER, key[:2], f"{key}.json")
+
+
+def _count(conn: sqlite3.Connection, name: str, amount: int = 1):
+    conn.execute(
+        "INSERT INTO ocr_cache_stats (name, value) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+        (name, amount)
+    )
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Get the SHA-256 hash of a file's contents, reading it in chunks
+
+    Args:
+        file_path (str): Path to the file
+
+    Returns:
+        str: The hex digest
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(content_hash: str, *parts: Any) -> str:
+    """
+    Build a cache key from a content hash and everything else the result depends on
+
+    Args:
+        content_hash (str): Hash of the scanned file
+        *parts: OCR configuration, preprocessing version and similar settings
+
+    Returns:
+        str: The cache key
+    """
+    return hashlib.sha256(json.dumps([content_hash, *parts], default=str).encode('utf-8')).hexdigest()
+
+
+def get_cached_ocr(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a cached OCR result, marking it as recently used
+
+    Args:
+        key (str): Key from make_cache_key()
+
+    Returns:
+        dict: The cached result, or None on a miss (or if the cache is unavailable)
+    """
+    if not OCR_CACHE_ENABLED:
+        return None
+    try:
+        conn = _get_connection()
+        if conn.execute("SELECT 1 FROM ocr_cache WHERE key = ?", (key,)).fetchone() is None:
+            _count(conn, 'misses')
+            return None
+
+        try:
+            with open(_entry_path(key)) as f:
+                value = json.load(f)
+        except (FileNotFoundError, ValueError):
+            # Removed or truncated behind the index's back
+            conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+            _count(conn, 'misses')
+            return None
+
+        conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        _count(conn, 'hits')
+        return value
+
+    except Exception as e:
+        logger.warning(f"OCR cache lookup failed: {str(e)}")
+        return None
+
+
+def store_ocr(key: str, value: Dict[str, Any]) -> bool:
+    """
+    Store an OCR result, evicting the least recently used results if the cache is full
+
+    Args:
+        key (str): Key from make_cache_key()
+        value (dict): JSON-serializable OCR result
+
+    Returns:
+        bool: True if the result was stored
+    """
+    if not OCR_CACHE_ENABLED:
+        return False
+    try:
+        conn = _get_connection()
+        path = _entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        conn.execute(
+            "INSERT INTO ocr_cache (key, size, last_access) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET size = excluded.size, last_access = excluded.last_access",
+            (key, size, time.time())
+        )
+        _count(conn, 'stores')
+        _evict(conn)
+        return True
+
+    except Exception as e:
+        logger.warning(f"OCR cache store failed: {str(e)}")
+        try:
+            _count(_get_connection(), 'errors')
+        except Exception:
+            pass
+        return False
+
+
+def _evict(conn: sqlite3.Connection):
+    """Remove least recently used results until the cache fits in OCR_CACHE_MAX_BYTES"""
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+    if total <= OCR_CACHE_MAX_BYTES:
+        return
+
+    evicted = 0
+    for key, size in conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_access").fetchall():
+        if total <= OCR_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(_entry_path(key))
+        except FileNotFoundError:
+            pass
+        conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+        total -= size
+        evicted += 1
+
+    if evicted:
+        _count(conn, 'evictions', evicted)
+        logger.info(f"Evicted {evicted} OCR cache entries")
+
+
+def get_ocr_cache_stats() -> Dict[str, Any]:
+    """
+    Get the size and hit/miss counters of the OCR cache
+
+    Returns:
+        dict: Cache statistics
+    """
+    conn = _get_connection()
+    entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()
+    counters = {name: 0 for name in COUNTERS}
+    counters.update(conn.execute("SELECT name, value FROM ocr_cache_stats").fetchall())
+    lookups = counters['hits'] + counters['misses']
+    return {
+        'enabled': OCR_CACHE_ENABLED,
+        'entries': entries,
+        'size_bytes': size,
+        'max_bytes': OCR_CACHE_MAX_BYTES,
+        'hit_ratio': round(counters['hits'] / lookups, 4) if lookups else 0,
+        **counters
+    }
@@ -0,0 +1,254 @@
+"""
+Scan Jobs Module
+
+This module runs OCR scans as background jobs in a process pool sized to the
+machine's cores, so an upload returns a job ID immediately instead of holding
+a request worker while the image is denoised and OCR'd. Job state (status,
+progress, stage, result) is kept in JSON files under SCAN_JOBS_FOLDER, so any
+server process can report on any job. Files uploaded together are grouped in
+a batch that reports on all of its jobs.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.job_store import ACTIVE_STATUSES, JobStore, WorkerPool, new_job_id
+
+logger = logging.getLogger(__name__)
+
+# Scan job configuration
+SCAN_JOBS_FOLDER = os.environ.get('SCAN_JOBS_FOLDER', 'data/scan_jobs')
+SCAN_WORKERS = int(os.environ.get('SCAN_WORKERS', 0)) or os.cpu_count() or 1
+# Most files accepted in one batch upload
+SCAN_MAX_BATCH_FILES = int(os.environ.get('SCAN_MAX_BATCH_FILES', 50))
+# Finished jobs and batches are removed after this many hours
+SCAN_JOB_RETENTION_HOURS = float(os.environ.get('SCAN_JOB_RETENTION_HOURS', 24))
+
+
+def _init_worker():
+    """
+    Limit each worker to one thread and its share of the cores for PDF pages
+
+    The pool already runs one scan per core; letting OpenCV and Tesseract
+    start their own thread pools in every worker would oversubscribe the CPU,
+    and so would every worker OCR'ing one PDF page per core at once.
+    """
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+
+    if not os.environ.get('SCAN_PDF_PAGE_WORKERS'):
+        from scanner import scan_processor
+        scan_processor.PDF_PAGE_WORKERS = max((os.cpu_count() or 1) // SCAN_WORKERS, 1)
+
+
+def submit_scan(file_path: str, file_name: Optional[str] = None, batch_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Queue an uploaded file for scanning
+
+    Args:
+        file_path (str): Path to the saved upload
+        file_name (str, optional): Original name of the uploaded file
+        batch_id (str, optional): Batch the job belongs to
+
+    Returns:
+        dict: The job state
+    """
+    job_id = new_job_id()
+    job = {
+        'id': job_id,
+        'status': 'queued',
+        'file_name': file_name or os.path.basename(file_path),
+        'file_path': file_path,
+        'batch_id': batch_id,
+        'progress': 0.0,
+        'stage': 'queued',
+        'scan_id': None,
+        'pages': [],
+        'result': None,
+        'error': None,
+        'pid': None,
+        # The queued work lives in this process's pool, so the job is orphaned if it exits
+        'submitter_pid': os.getpid(),
+        'created_at': datetime.now().isoformat(),
+        'started_at': None,
+        'finished_at': None,
+    }
+    _store.save(job)
+
+    try:
+        future = _pool.submit(_run_scan_job, job_id, file_path)
+    except Exception as e:
+        return _store.finish(job_id, 'failed', error=f"Could not start scan: {str(e)}")
+
+    future.add_done_callback(lambda f: _on_job_done(f, job_id))
+    return job
+
+
+def submit_batch(files: List[Tuple[str, str]]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Queue several uploaded files as one batch
+
+    Args:
+        files (list): (file path, original file name) pairs
+
+    Returns:
+        tuple: (batch, jobs)
+    """
+    cleanup_expired_jobs()
+
+    batch_id = new_job_id()
+    jobs = [submit_scan(file_path, file_name, batch_id) for file_path, file_name in files]
+    _batches.save({
+        'id': batch_id,
+        'job_ids': [job['id'] for job in jobs],
+        'created_at': datetime.now().isoformat(),
+    })
+    return get_scan_batch(batch_id), jobs
+
+
+def _on_job_done(future, job_id: str):
+    """Record jobs whose worker process crashed before it could report"""
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Scan job {job_id} failed: {str(error)}")
+        job = get_scan_job(job_id)
+        if job is not None and job['status'] in ACTIVE_STATUSES:
+            _store.finish(job_id, 'failed', error=str(error))
+
+
+def _run_scan_job(job_id: str, file_path: str):
+    """Run a scan job inside a pool worker process"""
+    from app import app
+    from scanner.scan_processor import ScanProcessor
+
+    if _store.start(job_id, stage='starting') is None:
+        logger.warning(f"Scan job {job_id} is no longer queued, not running it")
+        return
+
+    def progress(fraction, stage):
+        _store.update(job_id, progress=round(fraction, 4), stage=stage)
+
+    # PDF pages are published as they finish, before the whole document is done. They are
+    # appended to a side file rather than rewriting the job's state for every page.
+    pages_path = _store.path(job_id, '.pages')
+
+    def on_page(page):
+        with open(pages_path, 'a') as f:
+            f.write(json.dumps(page) + '\n')
+
+    try:
+        with app.app_context():
+            result = ScanProcessor().process_file(file_path, progress=progress, on_page=on_page)
+    except Exception as e:
+        logger.error(f"Scan job {job_id} failed: {str(e)}")
+        _store.finish(job_id, 'failed', stage='failed', error=str(e), pages=_read_pages(job_id))
+        _remove_pages(job_id)
+        return
+
+    _store.finish(job_id, 'completed', progress=1.0, stage='completed',
+                  scan_id=result.get('scan_id'), result=result, pages=_read_pages(job_id))
+    _remove_pages(job_id)
+
+
+def _read_pages(job_id: str) -> List[Dict[str, Any]]:
+    """Read the pages a running job has published so far"""
+    try:
+        with open(_store.path(job_id, '.pages')) as f:
+            # A line still being written has no newline yet
+            return [json.loads(line) for line in f if line.endswith('\n')]
+    except FileNotFoundError:
+        return []
+
+
+def _remove_pages(job_id: str):
+    try:
+        os.remove(_store.path(job_id, '.pages'))
+    except FileNotFoundError:
+        pass
+
+
+def get_scan_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the state of a scan job
+
+    Jobs whose worker process has died, or whose server process exited
+    while they were still queued, are reported as failed.
+
+    Args:
+        job_id (str): The job ID
+
+    Returns:
+        dict: The job state, or None if there is no such job
+    """
+    job = _store.get(job_id)
+    if job is not None and not job.get('pages'):
+        # Pages are only folded into the state once the job has finished
+        job['pages'] = _read_pages(job_id)
+    return job
+
+
+def get_scan_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the state of a batch and its jobs
+
+    Args:
+        batch_id (str): The batch ID
+
+    Returns:
+        dict: The batch with its jobs, per-status counts, overall status and
+            progress, or None if there is no such batch
+    """
+    batch = _batches.get(batch_id)
+    if batch is None:
+        return None
+
+    jobs = [job for job in (get_scan_job(job_id) for job_id in batch['job_ids']) if job is not None]
+    counts = {status: 0 for status in ('queued', 'running', 'completed', 'failed')}
+    for job in jobs:
+        counts[job['status']] = counts.get(job['status'], 0) + 1
+
+    if counts['queued'] + counts['running']:
+        status = 'running' if counts['running'] or counts['completed'] or counts['failed'] else 'queued'
+    else:
+        status = 'completed' if counts['completed'] else 'failed'
+
+    return {
+        'id': batch['id'],
+        'status': status,
+        'progress': round(sum(job['progress'] for job in jobs) / len(jobs), 4) if jobs else 1.0,
+        'counts': counts,
+        'created_at': batch['created_at'],
+        'jobs': [public_job(job) for job in jobs],
+    }
+
+
+def cleanup_expired_jobs(retention_hours: float = SCAN_JOB_RETENTION_HOURS) -> int:
+    """
+    Remove finished jobs and batches older than the retention period
+
+    Returns:
+        int: Number of jobs removed
+    """
+    _batches.cleanup(retention_hours)
+    return _store.cleanup(retention_hours, suffixes=('.pages', '.json'))
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the client-facing view of a job"""
+    view = {key: value for key, value in job.items() if key not in ('pid', 'submitter_pid', 'file_path')}
+    view['status_url'] = f"/scanner/jobs/{job['id']}"
+    if job['status'] == 'completed' and job.get('scan_id'):
+        view['view_url'] = f"/scanner/view/{job['scan_id']}"
+    return view
+
+
+_store = JobStore(SCAN_JOBS_FOLDER, 'scan')
+_batches = JobStore(os.path.join(SCAN_JOBS_FOLDER, 'batches'), 'scan batch')
+_pool = WorkerPool(SCAN_WORKERS, initializer=_init_worker, preload=('app',))
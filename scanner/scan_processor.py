@@ -5,6 +5,7 @@ This module provides functionality for scanning and processing images and docume
 with text extraction, metadata analysis, and webhook integration.
 
 Note: This version uses pytesseract for OCR.  Ensure pytesseract and its dependencies are installed.
+PDF processing uses pdf2image and the Poppler utilities (pdfinfo, pdftoppm, pdftotext).
 """
 
 import os
@@ -13,15 +14,25 @@ import json
 import datetime
 import logging
 import re
-from typing import Dict, Any, List, Tuple, Optional
-import base64
-from io import BytesIO
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterator, List, Tuple, Optional
 
-from PIL import Image, ImageFilter, ImageEnhance
+from PIL import Image, ImageFilter
 import requests
 import pytesseract
-import cv2
-import numpy as np
+
+from scanner.preprocessing import (OCR_CONTRAST_THRESHOLD, OCR_NOISE_THRESHOLD, OCR_PREPROCESSING_MODE,
+                                   OCR_TARGET_DPI, preprocess_image)
+from scanner.ocr_cache import file_sha256, get_cached_ocr, make_cache_key, store_ocr
+from scanner.thumbnails import generate_thumbnails
+
+try:
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    PDF2IMAGE_AVAILABLE = True
+except ImportError:
+    PDF2IMAGE_AVAILABLE = False
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -32,6 +43,25 @@ UPLOAD_FOLDER = 'data/scans'
 PROCESSED_FOLDER = 'data/processed_scans'
 TEMP_FOLDER = 'data/temp'
 
+# Tesseract configuration used by ocr_image()
+# Images are scaled down to OCR_TARGET_DPI before OCR
+OCR_CONFIG = f'--oem 3 --psm 6 -l eng+osd --dpi {OCR_TARGET_DPI}'
+# Bump whenever ocr_image() preprocessing or its input changes, so cached OCR results are not reused
+OCR_PREPROCESSING_VERSION = 3
+
+# PDF configuration
+PDF_DPI = int(os.environ.get('SCAN_PDF_DPI', 300))
+# Pages OCR'd at the same time; Tesseract and Poppler run as separate processes.
+# Scan job workers lower the default to their share of the cores (see scanner.scan_jobs)
+PDF_PAGE_WORKERS = int(os.environ.get('SCAN_PDF_PAGE_WORKERS', 0)) or os.cpu_count() or 1
+# Pages whose embedded text layer has at least this many characters are not OCR'd
+PDF_TEXT_LAYER_MIN_CHARS = int(os.environ.get('SCAN_PDF_TEXT_LAYER_MIN_CHARS', 25))
+
+# Called with (fraction complete, stage name) while a file is processed
+ProgressCallback = Optional[Callable[[float, str], None]]
+# Called with each page result of a PDF, in page order, as soon as it is ready
+PageCallback = Optional[Callable[[Dict[str, Any]], None]]
+
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
@@ -48,12 +78,15 @@ class ScanProcessor:
         self.supported_document_types = ['.pdf']
         self.webhook_url = 'http://localhost:5000/api/webhook'
 
-    def process_file(self, file_path: str) -> Dict[str, Any]:
+    def process_file(self, file_path: str, progress: ProgressCallback = None,
+                     on_page: PageCallback = None) -> Dict[str, Any]:
         """
         Process an uploaded file based on its type
 
         Args:
             file_path: Path to the uploaded file
+            progress: Optional callback receiving (fraction complete, stage name)
+            on_page: Optional callback receiving each PDF page result as it is ready
 
         Returns:
             Dict containing processed data and metadata
@@ -61,13 +94,27 @@ class ScanProcessor:
         file_ext = os.path.splitext(file_path)[1].lower()
 
         try:
+            if file_ext not in self.supported_image_types and file_ext not in self.supported_document_types:
+                raise ValueError(f"Unsupported file type: {file_ext}")
+
+            # Files scanned before reuse their OCR result
+            content_hash = file_sha256(file_path)
+            cache_key = self._ocr_cache_key(content_hash, file_ext)
+            cached = get_cached_ocr(cache_key)
+
             # Process the file based on its type
             if file_ext in self.supported_image_types:
-                result = self.process_image(file_path)
-            elif file_ext in self.supported_document_types:
-                result = self.process_document(file_path)
+                result = self.process_image(file_path, progress, ocr_result=cached, content_hash=content_hash)
+                ocr_result = {'text': result['raw_text'], 'preprocessing': result['preprocessing']}
             else:
-                raise ValueError(f"Unsupported file type: {file_ext}")
+                result = self.process_document(file_path, progress, on_page, ocr_result=cached)
+                # Pages that failed are retried on the next upload
+                ocr_result = None if any(page.get('error') for page in result['pages']) else {'pages': result['pages']}
+
+            if cached is None and ocr_result is not None:
+                store_ocr(cache_key, ocr_result)
+            result['content_hash'] = content_hash
+            result['ocr_cached'] = cached is not None
 
             # Save processed result
             result_path = os.path.join(
@@ -78,7 +125,12 @@ class ScanProcessor:
             with open(result_path, 'w') as f:
                 json.dump(result, f, indent=2)
 
+            # Index it for the scan history (needs an application context)
+            from services.scan_service import record_scan
+            record_scan(result, result_path)
+
             # Send to webhook system
+            _report(progress, 0.95, 'sending')
             self.send_to_webhook(result)
 
             return result
@@ -87,28 +139,44 @@ class ScanProcessor:
             logger.error(f"Error processing file {file_path}: {str(e)}")
             raise
 
-    def process_image(self, image_path: str) -> Dict[str, Any]:
+    def _ocr_cache_key(self, content_hash: str, file_ext: str) -> str:
+        """Get the OCR cache key of a file, covering every setting its OCR result depends on"""
+        preprocessing = (OCR_PREPROCESSING_VERSION, OCR_PREPROCESSING_MODE, OCR_TARGET_DPI,
+                         OCR_NOISE_THRESHOLD, OCR_CONTRAST_THRESHOLD)
+        if file_ext in self.supported_document_types:
+            return make_cache_key(content_hash, 'pdf', OCR_CONFIG, *preprocessing,
+                                  PDF_DPI, PDF_TEXT_LAYER_MIN_CHARS)
+        return make_cache_key(content_hash, 'image', OCR_CONFIG, *preprocessing)
+
+    def process_image(self, image_path: str, progress: ProgressCallback = None,
+                      ocr_result: Optional[Dict[str, Any]] = None,
+                      content_hash: Optional[str] = None) -> Dict[str, Any]:
         """
         Process an image file
 
         Args:
             image_path: Path to the image file
+            progress: Optional callback receiving (fraction complete, stage name)
+            ocr_result: Cached OCR result ({'text': ...}) to use instead of running OCR
+            content_hash: SHA-256 of the file, if already computed
 
         Returns:
             Dict containing image analysis and metadata
         """
         try:
+            _report(progress, 0.05, 'loading')
+
             # Get image properties
             with Image.open(image_path) as img:
                 width, height = img.size
                 format_name = img.format
                 mode = img.mode
 
-                # Get a thumbnail for preview
-                img.thumbnail((300, 300))
-                buffered = BytesIO()
-                img.save(buffered, format="PNG")
-                img_str = base64.b64encode(buffered.getvalue()).decode()
+                # Thumbnails are written once per distinct file and served by URL
+                thumbnail = generate_thumbnails(img, content_hash or file_sha256(image_path))
+
+                # OCR runs on the full-resolution image
+                ocr_source = img.convert('RGB') if ocr_result is None else None
 
                 # Extract metadata
                 metadata = {}
@@ -121,35 +189,14 @@ class ScanProcessor:
                                 value = str(value)
                             metadata[tag_name] = value
 
-            # Advanced OCR processing
-            def perform_ocr(image):
-                # Convert PIL image to OpenCV format
-                img = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-
-                # Image preprocessing
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                denoised = cv2.fastNlMeansDenoising(gray)
-                thresh = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-
-                # Additional preprocessing for better OCR
-                kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2,2))
-                processed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-
-                # Convert back to PIL for Tesseract
-                pil_img = Image.fromarray(processed)
-
-                # Enhance contrast
-                enhancer = ImageEnhance.Contrast(pil_img)
-                enhanced = enhancer.enhance(1.5)
-
-                # Perform OCR with advanced configuration
-                custom_config = r'--oem 3 --psm 6 -l eng+osd --dpi 300'
-                detected_text = pytesseract.image_to_string(enhanced, config=custom_config)
-
-                return detected_text.strip()
-
             # Process the image with advanced OCR
-            detected_text = perform_ocr(img)
+            if ocr_result is not None:
+                detected_text = ocr_result['text']
+                preprocessing = ocr_result.get('preprocessing')
+            else:
+                _report(progress, 0.1, 'ocr')
+                detected_text, preprocessing = ocr_image(ocr_source)
+            _report(progress, 0.9, 'extracting')
 
 
             # Extract structured data
@@ -171,7 +218,8 @@ class ScanProcessor:
                     'mode': mode,
                     'exif': metadata
                 },
-                'thumbnail': img_str
+                'thumbnail': thumbnail,
+                'preprocessing': preprocessing
             }
 
             return data
@@ -180,60 +228,46 @@ class ScanProcessor:
             logger.error(f"Error in process_image: {str(e)}")
             raise
 
-    def process_document(self, pdf_path: str) -> Dict[str, Any]:
+    def process_document(self, pdf_path: str, progress: ProgressCallback = None,
+                         on_page: PageCallback = None, ocr_result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Process a PDF document
 
+        Pages are handled in parallel by iter_pdf_pages(): the embedded text
+        layer is used where a page has one, and only pages without it are
+        rasterized and OCR'd.
+
         Args:
             pdf_path: Path to the PDF file
+            progress: Optional callback receiving (fraction complete, stage name)
+            on_page: Optional callback receiving each page result as it is ready
+            ocr_result: Cached page results ({'pages': [...]}) to use instead of processing the pages
 
         Returns:
             Dict containing document analysis and metadata
         """
         try:
-            # In a real implementation, we would use a PDF parsing library
-            # Since we don't have direct PDF support, we'll simulate the process
-
-            # Get file size
-            file_size = os.path.getsize(pdf_path)
-
-            # Generate sample page data
-            page_count = min(int(file_size / 10000) + 1, 10)  # Simulate page count based on file size
-
-            # Sample text patterns for different pages
-            page_patterns = [
-                "Page {page_num}\nThis document contains important information.\nSection {section}: {topic}",
-                "Page {page_num}\nData Table\nID\tName\tValue\n001\tItem A\t$100\n002\tItem B\t$200",
-                "Page {page_num}\nSignature: ___________________\nDate: {date}",
-                "Page {page_num}\nAPPENDIX {appendix}\nAdditional notes and references"
-            ]
+            _report(progress, 0.05, 'loading')
+            if ocr_result is not None:
+                pages = ocr_result['pages']
+                page_count = len(pages)
+            else:
+                page_count = get_pdf_page_count(pdf_path)
+                pages = iter_pdf_pages(pdf_path, page_count)
 
-            # Generate pages with simulated content
             page_data = []
-            all_text = []
-
-            for i in range(page_count):
-                page_num = i + 1
-                import random
-
-                pattern = random.choice(page_patterns)
-                page_text = pattern.format(
-                    page_num=page_num,
-                    section=random.randint(1, 5),
-                    topic=random.choice(["Financial", "Technical", "Legal", "Marketing", "Operations"]),
-                    date="03/22/2025",
-                    appendix=chr(65 + i)
-                )
-
-                page_data.append({
-                    'page_num': page_num,
-                    'text': page_text
-                })
-
-                all_text.append(page_text)
+            for page in pages:
+                page_data.append(page)
+                _report(progress, 0.05 + 0.85 * page['page_num'] / page_count, 'ocr')
+                if on_page is not None:
+                    try:
+                        on_page(page)
+                    except Exception as e:
+                        logger.warning(f"Page callback failed: {str(e)}")
 
             # Combine all text
-            combined_text = "\n\n".join(all_text)
+            combined_text = "\n\n".join(page['text'] for page in page_data if page['text'])
+            _report(progress, 0.9, 'extracting')
 
             # Extract structured data
             structured_data = self._extract_structured_data(combined_text)
@@ -246,7 +280,7 @@ class ScanProcessor:
                 'type': 'pdf',
                 'file_name': os.path.basename(pdf_path),
                 'timestamp': datetime.datetime.now().isoformat(),
-                'file_size': file_size,
+                'file_size': os.path.getsize(pdf_path),
                 'page_count': page_count,
                 'scan_id': str(uuid.uuid4())
             }
@@ -369,7 +403,7 @@ class ScanProcessor:
                 headers={'Content-Type': 'application/json'}
             )
 
-            if response.status_code == 200:
+            if response.status_code in (200, 202):
                 logger.info(f"Successfully sent scan data to webhook: {data.get('scan_id')}")
                 return True
             else:
@@ -382,6 +416,141 @@ class ScanProcessor:
 
 
 # Helper functions
+def ocr_image(image: Image.Image, dpi: Optional[float] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Preprocess an image and extract its text with Tesseract
+
+    Args:
+        image: RGB image
+        dpi: Resolution of the image, if known (otherwise taken from the file or estimated)
+
+    Returns:
+        Tuple of the detected text and the preprocessing report (path taken,
+        quality measurements and per-stage timings in milliseconds)
+    """
+    processed, report = preprocess_image(image, dpi=dpi)
+
+    started = time.perf_counter()
+    detected_text = pytesseract.image_to_string(processed, config=OCR_CONFIG)
+    report['timings_ms']['ocr'] = round((time.perf_counter() - started) * 1000, 3)
+
+    return detected_text.strip(), report
+
+
+def get_pdf_page_count(pdf_path: str) -> int:
+    """
+    Get the number of pages of a PDF
+
+    Raises:
+        RuntimeError: If pdf2image is not installed
+    """
+    if not PDF2IMAGE_AVAILABLE:
+        raise RuntimeError("PDF processing is not available. The pdf2image library and Poppler are required.")
+    return int(pdfinfo_from_path(pdf_path)['Pages'])
+
+
+def extract_pdf_text_layer(pdf_path: str, page_num: int) -> str:
+    """
+    Get the embedded text of a PDF page with Poppler's pdftotext
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_num: Page number, starting at 1
+
+    Returns:
+        The page text, or an empty string for scanned pages without a text layer
+    """
+    try:
+        result = subprocess.run(
+            ['pdftotext', '-f', str(page_num), '-l', str(page_num), '-layout', '-enc', 'UTF-8', pdf_path, '-'],
+            capture_output=True, timeout=60
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Could not read the text layer of {pdf_path} page {page_num}: {str(e)}")
+        return ''
+    if result.returncode != 0:
+        return ''
+    # pdftotext ends every page with a form feed
+    return result.stdout.decode('utf-8', errors='replace').replace('\f', '').strip()
+
+
+def process_pdf_page(pdf_path: str, page_num: int, dpi: int = PDF_DPI) -> Dict[str, Any]:
+    """
+    Get the text of one PDF page
+
+    The embedded text layer is used when it has at least
+    PDF_TEXT_LAYER_MIN_CHARS characters; otherwise only this page is
+    rasterized and OCR'd.
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_num: Page number, starting at 1
+        dpi: Rasterization resolution for OCR
+
+    Returns:
+        Dict with page_num, text, text_source ('text_layer' or 'ocr') and error;
+        OCR'd pages also have the preprocessing report from ocr_image()
+    """
+    text = extract_pdf_text_layer(pdf_path, page_num)
+    if len(text) >= PDF_TEXT_LAYER_MIN_CHARS:
+        return {'page_num': page_num, 'text': text, 'text_source': 'text_layer', 'error': None}
+
+    try:
+        image = convert_from_path(pdf_path, dpi=dpi, first_page=page_num, last_page=page_num)[0]
+        try:
+            text, preprocessing = ocr_image(image.convert('RGB'), dpi=dpi)
+        finally:
+            image.close()
+        return {'page_num': page_num, 'text': text, 'text_source': 'ocr', 'error': None,
+                'preprocessing': preprocessing}
+    except Exception as e:
+        logger.error(f"Error processing {pdf_path} page {page_num}: {str(e)}")
+        return {'page_num': page_num, 'text': '', 'text_source': 'ocr', 'error': str(e)}
+
+
+def iter_pdf_pages(pdf_path: str, page_count: Optional[int] = None,
+                   workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Process the pages of a PDF in parallel, yielding results in page order
+
+    Each page is rasterized only inside its own task, so at most `workers`
+    page images are in memory at once, and each result is yielded as soon as
+    it and the pages before it are done.
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_count: Number of pages, if already known
+        workers: Pages processed at the same time (default PDF_PAGE_WORKERS)
+
+    Yields:
+        Page results from process_pdf_page()
+    """
+    workers = workers or PDF_PAGE_WORKERS
+    if page_count is None:
+        page_count = get_pdf_page_count(pdf_path)
+    if page_count == 0:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(workers, page_count)) as executor:
+        futures = [executor.submit(process_pdf_page, pdf_path, page_num) for page_num in range(1, page_count + 1)]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _report(progress: ProgressCallback, fraction: float, stage: str):
+    """Report processing progress, never letting a failing callback abort the scan"""
+    if progress is None:
+        return
+    try:
+        progress(fraction, stage)
+    except Exception as e:
+        logger.warning(f"Progress callback failed: {str(e)}")
+
+
 def save_uploaded_file(file, filename: Optional[str] = None) -> str:
     """
     Save an uploaded file to the upload folder
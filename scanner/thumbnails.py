@@ -0,0 +1,113 @@
+"""
+Thumbnails Module
+
+This module renders scan thumbnails once, into a content-addressed directory,
+instead of embedding a base64 image in every scan result. Thumbnails are named
+after the SHA-256 of the scanned file, so identical uploads share them and a
+thumbnail never changes once written, which lets the thumbnail endpoint mark
+them as immutable for browsers and proxies. Each configured size is written
+in each configured format (WebP and JPEG by default).
+"""
+
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+# Thumbnail configuration
+THUMBNAIL_FOLDER = os.environ.get('SCAN_THUMBNAIL_FOLDER', 'data/thumbnails')
+# Longest edge of each thumbnail size, in pixels
+THUMBNAIL_SIZES = sorted({int(size) for size in os.environ.get('SCAN_THUMBNAIL_SIZES', '150,300,600').split(',')
+                          if size.strip()})
+THUMBNAIL_QUALITY = int(os.environ.get('SCAN_THUMBNAIL_QUALITY', 80))
+# Cache lifetime sent with thumbnails; they are content-addressed and never change
+THUMBNAIL_MAX_AGE = int(os.environ.get('SCAN_THUMBNAIL_MAX_AGE', 365 * 24 * 3600))
+
+# Format name -> (file extension, PIL format, mimetype)
+THUMBNAIL_FORMAT_TYPES = {
+    'webp': ('webp', 'WEBP', 'image/webp'),
+    'jpeg': ('jpg', 'JPEG', 'image/jpeg'),
+}
+THUMBNAIL_FORMATS = [name for name in os.environ.get('SCAN_THUMBNAIL_FORMATS', 'webp,jpeg').split(',')
+                     if name in THUMBNAIL_FORMAT_TYPES and (name != 'webp' or features.check('webp'))]
+
+_THUMBNAIL_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def thumbnail_path(thumbnail_id: str, size: int, format_name: str) -> Optional[str]:
+    """
+    Get the path of a thumbnail file
+
+    Args:
+        thumbnail_id (str): Content hash of the scanned file
+        size (int): Thumbnail size
+        format_name (str): 'webp' or 'jpeg'
+
+    Returns:
+        str: The path, or None if the ID, size or format is not valid
+    """
+    if (not _THUMBNAIL_ID_PATTERN.match(thumbnail_id or '') or size not in THUMBNAIL_SIZES
+            or format_name not in THUMBNAIL_FORMATS):
+        return None
+    extension = THUMBNAIL_FORMAT_TYPES[format_name][0]
+    return os.path.join(THUMBNAIL_FOLDER, thumbnail_id[:2], f"{thumbnail_id}_{size}.{extension}")
+
+
+def thumbnail_mimetype(format_name: str) -> str:
+    """Get the content type of a thumbnail format"""
+    return THUMBNAIL_FORMAT_TYPES[format_name][2]
+
+
+def generate_thumbnails(image: Image.Image, thumbnail_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Write the thumbnails of an image that don't exist yet
+
+    Sizes are rendered largest first, each from the previous one, so the full
+    image is only resampled once.
+
+    Args:
+        image: The scanned image (left unchanged)
+        thumbnail_id (str): Content hash of the scanned file
+
+    Returns:
+        dict: id, sizes and formats of the thumbnails, or None if they could not be written
+    """
+    try:
+        paths = {(size, name): thumbnail_path(thumbnail_id, size, name)
+                 for size in THUMBNAIL_SIZES for name in THUMBNAIL_FORMATS}
+        if None in paths.values():
+            raise ValueError(f"Invalid thumbnail ID: {thumbnail_id}")
+
+        if not all(os.path.exists(path) for path in paths.values()):
+            current = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            for size in reversed(THUMBNAIL_SIZES):
+                current = current.copy()
+                current.thumbnail((size, size), Image.LANCZOS)
+                for name in THUMBNAIL_FORMATS:
+                    path = paths[(size, name)]
+                    if not os.path.exists(path):
+                        _save(current, path, name)
+
+        return {'id': thumbnail_id, 'sizes': THUMBNAIL_SIZES, 'formats': THUMBNAIL_FORMATS}
+
+    except Exception as e:
+        logger.error(f"Error generating thumbnails for {thumbnail_id}: {str(e)}")
+        return None
+
+
+def _save(image: Image.Image, path: str, format_name: str):
+    """Atomically write one thumbnail file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if format_name == 'jpeg' and image.mode == 'RGBA':
+        # JPEG has no alpha channel; flatten onto white rather than black
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    image.save(tmp_path, format=THUMBNAIL_FORMAT_TYPES[format_name][1], quality=THUMBNAIL_QUALITY)
+    os.replace(tmp_path, path)
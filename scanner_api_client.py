@@ -10,6 +10,7 @@ import requests
 import uuid
 from datetime import datetime
 import sys
+import time
 import argparse
 
 
@@ -30,24 +31,80 @@ class ScannerAPIClient:
             "Accept": "application/json"
         }
     
-    def upload_file(self, file_path):
+    def upload_file(self, file_path, wait=True, poll_interval=1.0):
         """
-        Upload a file for scanning and processing
+        Upload one or more files for scanning and processing
+        
+        The files are scanned in the background; by default this waits for
+        every scan to finish.
         
         Args:
-            file_path (str): Path to the file to upload
+            file_path (str or list): Path(s) of the file(s) to upload
+            wait (bool): Poll until the scans have finished
+            poll_interval (float): Seconds between status checks
             
         Returns:
-            dict: The processed scan data
+            dict: The batch status, with each job's scan result once completed
         """
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found: {file_path}")
+        file_paths = [file_path] if isinstance(file_path, str) else list(file_path)
+        for path in file_paths:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"File not found: {path}")
         
         upload_url = f"{self.base_url}/scanner/upload"
         
-        with open(file_path, 'rb') as f:
-            files = {"file": (os.path.basename(file_path), f)}
+        handles = [open(path, 'rb') for path in file_paths]
+        try:
+            files = [("file", (os.path.basename(path), f)) for path, f in zip(file_paths, handles)]
             response = requests.post(upload_url, headers=self.headers, files=files)
+        finally:
+            for f in handles:
+                f.close()
+        
+        if response.status_code != 202:
+            print(f"Error: {response.status_code}")
+            print(response.text)
+            return {"success": False, "error": f"HTTP Error: {response.status_code}"}
+        
+        batch_id = response.json()["batch_id"]
+        if not wait:
+            return self.get_batch(batch_id)
+        return self.wait_for_batch(batch_id, poll_interval)
+    
+    def get_job(self, job_id):
+        """
+        Get the status of a scan job
+        
+        Args:
+            job_id (str): ID of the scan job
+            
+        Returns:
+            dict: The job status, progress and (once completed) result
+        """
+        job_url = f"{self.base_url}/scanner/jobs/{job_id}"
+        
+        response = requests.get(job_url, headers=self.headers)
+        
+        if response.status_code == 200:
+            return response.json()
+        else:
+            print(f"Error: {response.status_code}")
+            print(response.text)
+            return {"success": False, "error": f"HTTP Error: {response.status_code}"}
+    
+    def get_batch(self, batch_id):
+        """
+        Get the status of a batch upload
+        
+        Args:
+            batch_id (str): ID of the batch
+            
+        Returns:
+            dict: The batch status with each of its jobs
+        """
+        batch_url = f"{self.base_url}/scanner/batches/{batch_id}"
+        
+        response = requests.get(batch_url, headers=self.headers)
         
         if response.status_code == 200:
             return response.json()
@@ -56,6 +113,23 @@ class ScannerAPIClient:
             print(response.text)
             return {"success": False, "error": f"HTTP Error: {response.status_code}"}
     
+    def wait_for_batch(self, batch_id, poll_interval=1.0):
+        """
+        Wait until every scan job of a batch has finished
+        
+        Args:
+            batch_id (str): ID of the batch
+            poll_interval (float): Seconds between status checks
+            
+        Returns:
+            dict: The final batch status
+        """
+        while True:
+            batch = self.get_batch(batch_id)
+            if batch.get("status") not in ("queued", "running"):
+                return batch
+            time.sleep(poll_interval)
+    
     def get_scan_history(self):
         """
         Get a list of all processed scans (as JSON)
@@ -149,10 +223,11 @@ def main():
     """Main function to demonstrate the Scanner API client"""
     parser = argparse.ArgumentParser(description='Scanner API Client')
     parser.add_argument('--url', default='http://localhost:5000', help='Base URL of the scanner API')
-    parser.add_argument('command', choices=['upload', 'history', 'get', 'sample', 'webhook'],
+    parser.add_argument('command', choices=['upload', 'history', 'get', 'job', 'batch', 'sample', 'webhook'],
                         help='Command to execute')
-    parser.add_argument('--file', help='File to upload (for upload command)')
-    parser.add_argument('--id', help='Scan ID (for get command)')
+    parser.add_argument('--file', nargs='+', help='File(s) to upload (for upload command)')
+    parser.add_argument('--no-wait', action='store_true', help='Return once queued (for upload command)')
+    parser.add_argument('--id', help='Scan, job or batch ID (for get, job and batch commands)')
     parser.add_argument('--data', help='JSON data file (for webhook command)')
     
     args = parser.parse_args()
@@ -164,7 +239,7 @@ def main():
             print("Error: --file is required for upload command")
             sys.exit(1)
         
-        result = client.upload_file(args.file)
+        result = client.upload_file(args.file, wait=not args.no_wait)
         print(json.dumps(result, indent=2))
     
     elif args.command == 'history':
@@ -179,6 +254,14 @@ def main():
         scan = client.get_scan(args.id)
         print(json.dumps(scan, indent=2))
     
+    elif args.command in ('job', 'batch'):
+        if not args.id:
+            print(f"Error: --id is required for {args.command} command")
+            sys.exit(1)
+        
+        status = client.get_job(args.id) if args.command == 'job' else client.get_batch(args.id)
+        print(json.dumps(status, indent=2))
+    
     elif args.command == 'sample':
         sample = client.create_sample_scan()
         print(json.dumps(sample, indent=2))
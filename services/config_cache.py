@@ -0,0 +1,183 @@
+"""
+Config cache service
+
+This module caches the configuration read on the ingest and notification
+paths: the enabled external storages, the email integration and the global
+settings. Entries are tagged with a config version, and the settings and
+integration routes bump the version after every change they commit, so
+steady-state ingestion runs without a single configuration query.
+
+The version is kept in a small stamp file (CONFIG_VERSION_PATH) that is
+replaced on every bump, so each lookup costs one stat() call and a change
+made by one server process is seen by all the others on their next lookup.
+CONFIG_CACHE_TTL bounds how long a change made outside these routes (for
+example directly in the database) can go unnoticed.
+"""
+import copy
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from models import ExternalStorage, Integration
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cache configuration
+CONFIG_VERSION_PATH = os.environ.get('CONFIG_VERSION_PATH', os.path.join(BASE_DIR, 'data', 'config_version'))
+CONFIG_CACHE_TTL = float(os.environ.get('CONFIG_CACHE_TTL', 300))
+
+
+class StorageConfig:
+    """
+    StorageConfig is a detached copy of an ExternalStorage's configuration
+
+    It carries the attributes replication needs and stays valid outside the
+    session and request it was loaded in.
+    """
+    __slots__ = ('id', 'storage_type', 'name', 'enabled', 'connection_string', 'config')
+
+    def __init__(self, storage: ExternalStorage):
+        self.id = storage.id
+        self.storage_type = storage.storage_type
+        self.name = storage.name
+        self.enabled = storage.enabled
+        self.connection_string = storage.connection_string
+        self.config = copy.deepcopy(storage.config or {})
+
+
+class ConfigCache:
+    """
+    ConfigCache stores loaded configuration keyed by name and config version
+    """
+
+    def __init__(self, version_path: str = CONFIG_VERSION_PATH, ttl: float = CONFIG_CACHE_TTL):
+        """Initialize an empty cache"""
+        self.version_path = version_path
+        self.ttl = ttl
+        self._entries = {}
+        # Bumped locally too, so this process never depends on the stamp file for its own changes
+        self._local_version = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def version(self):
+        """Get the current config version token"""
+        try:
+            stat = os.stat(self.version_path)
+            # The stamp file is replaced on every bump, so its inode changes even within one mtime tick
+            stamp = (stat.st_ino, stat.st_mtime_ns)
+        except OSError:
+            stamp = None
+        return self._local_version, stamp
+
+    def get(self, key: str, load: Callable[[], Any]) -> Any:
+        """
+        Get a cached value, loading it on a miss
+
+        Args:
+            key (str): Cache key
+            load (callable): Loads the value from the database
+
+        Returns:
+            The cached value; callers must not modify it
+        """
+        # Taken before loading, so a change committed during the load is not cached as current
+        version = self.version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._stats['hits'] += 1
+                return entry[2]
+            self._stats['misses'] += 1
+
+        value = load()
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self):
+        """Bump the config version in this process and in the stamp file"""
+        with self._lock:
+            self._local_version += 1
+            self._entries.clear()
+            self._stats['invalidations'] += 1
+
+        try:
+            try:
+                with open(self.version_path) as f:
+                    counter = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                counter = 0
+            os.makedirs(os.path.dirname(self.version_path) or '.', exist_ok=True)
+            tmp_path = f"{self.version_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(str(counter + 1))
+            os.replace(tmp_path, self.version_path)
+        except OSError as e:
+            logger.warning(f"Could not bump config version file {self.version_path}: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and cache configuration"""
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._entries)
+        return {'ttl': self.ttl, 'entries': entries, **stats}
+
+
+def _load_enabled_storages() -> List[StorageConfig]:
+    storages = ExternalStorage.query.filter_by(enabled=True).order_by(ExternalStorage.id).all()
+    return [StorageConfig(storage) for storage in storages]
+
+
+def _load_integration_settings(integration_type: str) -> Optional[Dict[str, Any]]:
+    integration = Integration.query.filter_by(integration_type=integration_type).first()
+    if integration is None:
+        return None
+    return {'enabled': integration.enabled, 'settings': copy.deepcopy(integration.settings or {})}
+
+
+def get_enabled_storages() -> List[StorageConfig]:
+    """
+    Get the configurations of the enabled external storages
+
+    Returns:
+        list: StorageConfig objects, ordered by ID
+    """
+    return _cache.get('external_storage:enabled', _load_enabled_storages)
+
+
+def get_integration_settings(integration_type: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the settings of the first integration of a type
+
+    Args:
+        integration_type (str): The integration type, e.g. 'email' or 'settings'
+
+    Returns:
+        dict: {'enabled': bool, 'settings': dict}, or None if it is not configured
+    """
+    return _cache.get(f"integration:{integration_type}",
+                      lambda: _load_integration_settings(integration_type))
+
+
+def get_global_settings() -> Optional[Dict[str, Any]]:
+    """Get a copy of the global settings, or None if they were never saved"""
+    entry = get_integration_settings('settings')
+    return copy.deepcopy(entry['settings']) if entry else None
+
+
+def invalidate_config_cache():
+    """Invalidate cached configuration after a settings or integration change was committed"""
+    _cache.invalidate()
+
+
+def get_config_cache_stats() -> Dict[str, Any]:
+    """Get statistics for the config cache"""
+    return _cache.get_stats()
+
+
+_cache = ConfigCache()
@@ -2,21 +2,35 @@ import logging
 import uuid
 import json
 import os
+import base64
 from datetime import datetime
-import sqlalchemy
-from sqlalchemy import create_engine, and_, func, MetaData
+from sqlalchemy import and_, or_
 from app import db
-from models import WebhookData, DataSource, ExternalStorage
+from models import WebhookData, DataSource
+from services.write_batcher import write_row, run_insert_hooks
+from services.rollup_service import get_rollup_stats, get_daily_source_counts
+from utils.data_transformers import chart_dates, format_chart_data
 
 logger = logging.getLogger(__name__)
 
-def save_webhook_data(data, raw_data=None):
+# Page sizes for keyset-paginated reads of webhook data
+DEFAULT_PAGE_SIZE = int(os.environ.get('WEBHOOK_DATA_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.environ.get('WEBHOOK_DATA_MAX_PAGE_SIZE', 1000))
+# Rows fetched per round trip when streaming webhook data
+STREAM_CHUNK_SIZE = int(os.environ.get('WEBHOOK_DATA_STREAM_CHUNK_SIZE', 1000))
+
+def save_webhook_data(data, raw_data=None, fallback=True):
     """
     Save webhook data to the database with enhanced error handling and support for subtypes
     
+    Saved webhooks are queued for external storage in the replication outbox
+    within the same transaction, and shipped by the replication worker.
+    
     Args:
         data (dict): Processed webhook data including id, timestamp, source, etc.
         raw_data (str, optional): Raw request data for debugging/recovery
+        fallback (bool): Save a minimal 'save_failed' record when the save fails;
+            when False the error is raised instead, so the caller can retry
     
     Returns:
         bool: Success status
@@ -47,35 +61,42 @@ def save_webhook_data(data, raw_data=None):
             if 'error' in data['data']:
                 status = 'error'
         
+        # Sources and subtypes are stored lower-cased so filters can use plain,
+        # index-friendly equality
+        if isinstance(source_subtype, str):
+            source_subtype = source_subtype.strip().lower() or None
+        
         # Create a new WebhookData instance with enhanced fields
         webhook_data = WebhookData(
             id=data.get('id'),
-            timestamp=data.get('timestamp'),
-            source=data.get('source', 'other'),
+            timestamp=data.get('timestamp') or datetime.now(),
+            source=str(data.get('source') or 'other').strip().lower(),
             source_subtype=source_subtype,
             status=status,
             data=data.get('data', {}),
             raw_data=raw_data
         )
         
-        # Save to database
-        db.session.add(webhook_data)
-        db.session.commit()
+        # Save to database through the group-commit writer
+        write_row(WebhookData, {
+            'id': webhook_data.id,
+            'timestamp': webhook_data.timestamp,
+            'source': webhook_data.source,
+            'source_subtype': webhook_data.source_subtype,
+            'status': webhook_data.status,
+            'payload': webhook_data.payload,
+            'raw_data': webhook_data.raw_data
+        })
         
         logger.debug(f"Saved webhook data with ID: {data.get('id')}, source: {data.get('source')}, subtype: {source_subtype}")
         
-        # Mirror to external storage if configured
-        if status != 'error':
-            try:
-                mirror_to_external_storage(webhook_data)
-            except Exception as mirror_error:
-                logger.warning(f"Failed to mirror webhook data to external storage: {str(mirror_error)}")
-        
         return True
     
     except Exception as e:
         logger.error(f"Error saving webhook data: {str(e)}")
         db.session.rollback()
+        if not fallback:
+            raise
         
         # Attempt to save with minimal data if normal save fails
         try:
@@ -88,6 +109,12 @@ def save_webhook_data(data, raw_data=None):
                 raw_data=raw_data or str(data)
             )
             db.session.add(minimal_data)
+            run_insert_hooks(WebhookData, [{
+                'timestamp': minimal_data.timestamp,
+                'source': minimal_data.source,
+                'status': minimal_data.status,
+                'payload': minimal_data.payload
+            }])
             db.session.commit()
             logger.info(f"Saved minimal error data after failure: {minimal_data.id}")
         except Exception as recovery_error:
@@ -95,45 +122,107 @@ def save_webhook_data(data, raw_data=None):
             
         return False
 
-def get_webhook_data(source_filter=None, date_from=None, date_to=None, limit=None):
+def normalize_filter_values(values):
+    """
+    Normalize filter values for index-friendly equality matching
+    
+    Accepts a single string, a comma-separated string or a list of either, and
+    returns the de-duplicated, lower-cased values (sources and subtypes are
+    lower-cased when they are saved).
+    
+    Args:
+        values (str or list): The raw filter value(s)
+        
+    Returns:
+        list: Normalized values, empty if there is nothing to filter on
+    """
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = [values]
+    
+    normalized = []
+    for value in values:
+        for part in str(value).split(','):
+            part = part.strip().lower()
+            if part and part not in normalized:
+                normalized.append(part)
+    return normalized
+
+def _build_webhook_query(source_filter=None, date_from=None, date_to=None, subtype_filter=None, status_filter=None):
+    """
+    Build a WebhookData query with the common filters applied
+    
+    Args:
+        source_filter (str or list, optional): Filter by one or more sources
+        date_from (str, optional): ISO format date string for start date
+        date_to (str, optional): ISO format date string for end date
+        subtype_filter (str or list, optional): Filter by one or more source subtypes
+        status_filter (str or list, optional): Filter by one or more statuses
+        
+    Returns:
+        Query: The filtered, unordered query
+    """
+    query = WebhookData.query
+    
+    # Plain equality on normalized values so the (source, timestamp) and
+    # (status, timestamp) indexes can be used
+    for column, values in (
+        (WebhookData.source, normalize_filter_values(source_filter)),
+        (WebhookData.source_subtype, normalize_filter_values(subtype_filter)),
+        (WebhookData.status, normalize_filter_values(status_filter)),
+    ):
+        if len(values) == 1:
+            query = query.filter(column == values[0])
+        elif values:
+            query = query.filter(column.in_(values))
+    
+    # Filter by date range
+    date_from_obj = parse_date_filter(date_from, 'date_from')
+    if date_from_obj:
+        query = query.filter(WebhookData.timestamp >= date_from_obj)
+    
+    date_to_obj = parse_date_filter(date_to, 'date_to')
+    if date_to_obj:
+        query = query.filter(WebhookData.timestamp <= date_to_obj)
+    
+    return query
+
+def parse_date_filter(value, name):
+    """Parse an ISO format date filter, ignoring it with a warning if it is malformed"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        logger.warning(f"Invalid {name} format: {value}")
+        return None
+
+def get_webhook_data(source_filter=None, date_from=None, date_to=None, limit=None,
+                     subtype_filter=None, status_filter=None):
     """
     Get webhook data with optional filtering
     
+    Without a limit this loads every matching row; prefer get_webhook_page()
+    or iter_webhook_data() for anything that can grow large.
+    
     Args:
-        source_filter (str, optional): Filter by source
+        source_filter (str or list, optional): Filter by one or more sources
         date_from (str, optional): ISO format date string for start date
         date_to (str, optional): ISO format date string for end date
         limit (int, optional): Max number of records to return
+        subtype_filter (str or list, optional): Filter by one or more source subtypes
+        status_filter (str or list, optional): Filter by one or more statuses
         
     Returns:
         list: List of webhook data dictionaries
     """
     try:
         # Build query with filters
-        query = WebhookData.query
-        
-        # Filter by source (case-insensitive)
-        if source_filter:
-            # Handle case-insensitive search by using SQLAlchemy's func.lower()
-            query = query.filter(func.lower(WebhookData.source) == func.lower(source_filter))
-        
-        # Filter by date range
-        if date_from:
-            try:
-                date_from_obj = datetime.fromisoformat(date_from)
-                query = query.filter(WebhookData.timestamp >= date_from_obj)
-            except ValueError:
-                logger.warning(f"Invalid date_from format: {date_from}")
-        
-        if date_to:
-            try:
-                date_to_obj = datetime.fromisoformat(date_to)
-                query = query.filter(WebhookData.timestamp <= date_to_obj)
-            except ValueError:
-                logger.warning(f"Invalid date_to format: {date_to}")
+        query = _build_webhook_query(source_filter, date_from, date_to, subtype_filter, status_filter)
         
         # Order by timestamp descending (most recent first)
-        query = query.order_by(WebhookData.timestamp.desc())
+        query = query.order_by(WebhookData.timestamp.desc(), WebhookData.id.desc())
         
         # Apply limit if provided
         if limit is not None:
@@ -147,6 +236,121 @@ def get_webhook_data(source_filter=None, date_from=None, date_to=None, limit=Non
         logger.error(f"Error retrieving webhook data: {str(e)}")
         return []
 
+def count_webhook_data(source_filter=None, date_from=None, date_to=None, subtype_filter=None, status_filter=None):
+    """
+    Count the webhook data rows matching the filters
+    
+    Args:
+        source_filter (str or list, optional): Filter by one or more sources
+        date_from (str, optional): ISO format date string for start date
+        date_to (str, optional): ISO format date string for end date
+        subtype_filter (str or list, optional): Filter by one or more source subtypes
+        status_filter (str or list, optional): Filter by one or more statuses
+        
+    Returns:
+        int: Number of matching rows
+    """
+    return _build_webhook_query(source_filter, date_from, date_to, subtype_filter, status_filter).count()
+
+def encode_cursor(timestamp, webhook_id):
+    """
+    Encode a (timestamp, id) keyset position as an opaque cursor string
+    """
+    position = json.dumps([timestamp.isoformat(), webhook_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor()
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    
+    Returns:
+        tuple: (timestamp, id)
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, webhook_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(timestamp), str(webhook_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def get_webhook_page(source_filter=None, date_from=None, date_to=None, cursor=None, page_size=None,
+                     subtype_filter=None, status_filter=None):
+    """
+    Get one page of webhook data using keyset pagination on (timestamp, id)
+    
+    Pages are ordered newest first. Each page costs an index range scan no
+    matter how deep into the result set it is.
+    
+    Args:
+        source_filter (str or list, optional): Filter by one or more sources
+        date_from (str, optional): ISO format date string for start date
+        date_to (str, optional): ISO format date string for end date
+        cursor (str, optional): next_cursor returned with the previous page
+        page_size (int, optional): Rows per page, capped at MAX_PAGE_SIZE
+        subtype_filter (str or list, optional): Filter by one or more source subtypes
+        status_filter (str or list, optional): Filter by one or more statuses
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    
+    Returns:
+        tuple: (rows, next_cursor)
+            - rows: list of webhook data dictionaries
+            - next_cursor: cursor for the following page, or None on the last page
+    """
+    page_size = min(max(int(page_size or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    
+    query = _build_webhook_query(source_filter, date_from, date_to, subtype_filter, status_filter)
+    
+    if cursor:
+        cursor_timestamp, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            WebhookData.timestamp < cursor_timestamp,
+            and_(WebhookData.timestamp == cursor_timestamp, WebhookData.id < cursor_id)
+        ))
+    
+    # Fetch one extra row to find out whether there is another page
+    items = query.order_by(
+        WebhookData.timestamp.desc(), WebhookData.id.desc()
+    ).limit(page_size + 1).all()
+    
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor(items[-1].timestamp, items[-1].id)
+    
+    return [item.to_dict() for item in items], next_cursor
+
+def iter_webhook_data(source_filter=None, date_from=None, date_to=None, chunk_size=STREAM_CHUNK_SIZE,
+                      subtype_filter=None, status_filter=None):
+    """
+    Stream webhook data newest first without loading the whole result set
+    
+    Rows are fetched from a server-side cursor chunk_size at a time, so
+    memory use stays flat regardless of how many rows match.
+    
+    Args:
+        source_filter (str or list, optional): Filter by one or more sources
+        date_from (str, optional): ISO format date string for start date
+        date_to (str, optional): ISO format date string for end date
+        chunk_size (int, optional): Rows fetched per round trip
+        subtype_filter (str or list, optional): Filter by one or more source subtypes
+        status_filter (str or list, optional): Filter by one or more statuses
+        
+    Yields:
+        dict: Webhook data dictionaries
+    """
+    query = _build_webhook_query(source_filter, date_from, date_to, subtype_filter, status_filter).order_by(
+        WebhookData.timestamp.desc(), WebhookData.id.desc()
+    ).yield_per(chunk_size)
+    
+    # The session's identity map holds rows weakly, so finished chunks are freed
+    for item in query:
+        yield item.to_dict()
+
 def get_data_sources():
     """
     Get the list of data sources from the database
@@ -167,154 +371,6 @@ def get_data_sources():
             {"id": "other", "name": "Other Sources", "color": "#9C27B0"}
         ]
 
-def mirror_to_external_storage(webhook_data):
-    """
-    Mirror webhook data to configured external storage systems
-    
-    Args:
-        webhook_data (WebhookData): The webhook data to mirror
-    
-    Returns:
-        bool: Success status
-    """
-    try:
-        # Get enabled external storage configurations
-        storage_configs = ExternalStorage.query.filter_by(enabled=True).all()
-        
-        if not storage_configs:
-            # No external storage configured or enabled
-            return True
-            
-        success = True
-        webhook_dict = webhook_data.to_dict()
-        
-        for storage in storage_configs:
-            try:
-                if storage.storage_type == 'database':
-                    success = success and mirror_to_external_database(webhook_dict, storage)
-                elif storage.storage_type == 'file':
-                    success = success and mirror_to_file_storage(webhook_dict, storage)
-                # Add more storage types as needed
-                
-                if success:
-                    # Update last sync time
-                    storage.last_sync = datetime.utcnow()
-                    storage.sync_status = 'success'
-                    db.session.commit()
-                    
-            except Exception as e:
-                storage.sync_status = 'error'
-                db.session.commit()
-                logger.error(f"Error mirroring to {storage.name} (ID: {storage.id}): {str(e)}")
-                success = False
-                
-        return success
-        
-    except Exception as e:
-        logger.error(f"Error in mirror_to_external_storage: {str(e)}")
-        return False
-
-
-def mirror_to_external_database(webhook_data, storage_config):
-    """
-    Mirror webhook data to an external database
-    
-    Args:
-        webhook_data (dict): The webhook data dictionary
-        storage_config (ExternalStorage): The external storage configuration
-    
-    Returns:
-        bool: Success status
-    """
-    try:
-        # Get connection details from storage configuration
-        connection_string = storage_config.connection_string
-        
-        if not connection_string:
-            logger.warning(f"No connection string for external storage {storage_config.name}")
-            return False
-            
-        # Create database engine
-        engine = create_engine(connection_string)
-        
-        # Define the table structure
-        metadata = MetaData()
-        webhook_table = sqlalchemy.Table(
-            'external_webhooks', metadata,
-            sqlalchemy.Column('id', sqlalchemy.String(36), primary_key=True),
-            sqlalchemy.Column('timestamp', sqlalchemy.DateTime),
-            sqlalchemy.Column('source', sqlalchemy.String(50)),
-            sqlalchemy.Column('source_subtype', sqlalchemy.String(50)),
-            sqlalchemy.Column('status', sqlalchemy.String(20)),
-            sqlalchemy.Column('data', sqlalchemy.JSON),
-            sqlalchemy.Column('synced_at', sqlalchemy.DateTime)
-        )
-        
-        # Create table if it doesn't exist
-        metadata.create_all(engine)
-        
-        # Insert or update data
-        with engine.connect() as conn:
-            # Check if record exists
-            result = conn.execute(
-                sqlalchemy.text("SELECT id FROM external_webhooks WHERE id = :id"),
-                {"id": webhook_data['id']}
-            )
-            exists = result.fetchone() is not None
-            
-            if exists:
-                # Update existing record
-                conn.execute(
-                    sqlalchemy.text("""
-                        UPDATE external_webhooks
-                        SET timestamp = :timestamp,
-                            source = :source,
-                            source_subtype = :source_subtype,
-                            status = :status,
-                            data = :data,
-                            synced_at = :synced_at
-                        WHERE id = :id
-                    """),
-                    {
-                        "id": webhook_data['id'],
-                        "timestamp": datetime.fromisoformat(webhook_data['timestamp']),
-                        "source": webhook_data['source'],
-                        "source_subtype": webhook_data.get('source_subtype'),
-                        "status": webhook_data.get('status', 'processed'),
-                        "data": json.dumps(webhook_data['data']),
-                        "synced_at": datetime.utcnow()
-                    }
-                )
-            else:
-                # Insert new record
-                conn.execute(
-                    sqlalchemy.text("""
-                        INSERT INTO external_webhooks
-                        (id, timestamp, source, source_subtype, status, data, synced_at)
-                        VALUES
-                        (:id, :timestamp, :source, :source_subtype, :status, :data, :synced_at)
-                    """),
-                    {
-                        "id": webhook_data['id'],
-                        "timestamp": datetime.fromisoformat(webhook_data['timestamp']),
-                        "source": webhook_data['source'],
-                        "source_subtype": webhook_data.get('source_subtype'),
-                        "status": webhook_data.get('status', 'processed'),
-                        "data": json.dumps(webhook_data['data']),
-                        "synced_at": datetime.utcnow()
-                    }
-                )
-            
-            # Commit the transaction
-            conn.commit()
-            
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error mirroring to external database: {str(e)}")
-        return False
-
-
 def mirror_to_file_storage(webhook_data, storage_config):
     """
     Mirror webhook data to a file storage system
@@ -353,61 +409,26 @@ def mirror_to_file_storage(webhook_data, storage_config):
         return False
 
 
-def get_webhook_stats():
+def get_webhook_stats(source_filter=None, date_from=None, date_to=None):
     """
     Get statistics about webhooks
+    
+    Counts are read from the pre-aggregated rollup table, which is kept up to
+    date as webhooks are saved, rather than aggregated from webhook_data.
+    Rollups are per day, so a date range counts every day it overlaps.
+    
+    Args:
+        source_filter (str or list, optional): Filter by one or more sources
+        date_from (str, optional): ISO format date string for start date
+        date_to (str, optional): ISO format date string for end date
     """
     try:
-        stats = {}
-        
-        # Total count
-        stats['total'] = WebhookData.query.count()
-        
-        # Count by source
-        source_counts = db.session.query(
-            WebhookData.source, 
-            func.count(WebhookData.id)
-        ).group_by(WebhookData.source).all()
-        
-        stats['by_source'] = {source: count for source, count in source_counts}
-        
-        # Count by source subtype
-        subtype_counts = db.session.query(
-            WebhookData.source,
-            WebhookData.source_subtype,
-            func.count(WebhookData.id)
-        ).filter(WebhookData.source_subtype.isnot(None)).group_by(
-            WebhookData.source, WebhookData.source_subtype
-        ).all()
-        
-        stats['by_subtype'] = {}
-        for source, subtype, count in subtype_counts:
-            if source not in stats['by_subtype']:
-                stats['by_subtype'][source] = {}
-            stats['by_subtype'][source][subtype] = count
-        
-        # Recent activity - last 7 days
-        seven_days_ago = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        seven_days_ago = seven_days_ago.replace(day=seven_days_ago.day - 7)
-        
-        daily_counts = db.session.query(
-            func.date(WebhookData.timestamp),
-            func.count(WebhookData.id)
-        ).filter(WebhookData.timestamp >= seven_days_ago).group_by(
-            func.date(WebhookData.timestamp)
-        ).all()
-        
-        stats['daily'] = {str(date): count for date, count in daily_counts}
-        
-        # Add status statistics
-        status_counts = db.session.query(
-            WebhookData.status,
-            func.count(WebhookData.id)
-        ).group_by(WebhookData.status).all()
-        
-        stats['by_status'] = {status: count for status, count in status_counts}
-        
-        return stats
+        return get_rollup_stats(
+            days=7,
+            sources=normalize_filter_values(source_filter),
+            date_from=parse_date_filter(date_from, 'date_from'),
+            date_to=parse_date_filter(date_to, 'date_to')
+        )
     
     except Exception as e:
         logger.error(f"Error retrieving webhook stats: {str(e)}")
@@ -418,3 +439,33 @@ def get_webhook_stats():
             'by_status': {},
             'daily': {}
         }
+
+def get_webhook_chart_data(days=7, source_filter=None, date_from=None, date_to=None):
+    """
+    Get per-source daily webhook counts for the dashboard chart
+    
+    Reads the day rollups, so the cost depends on the number of sources and
+    days rather than the number of webhooks stored.
+    
+    Args:
+        days (int): Number of days to chart, including today
+        source_filter (str or list, optional): Filter by one or more sources
+        date_from (str, optional): ISO format date string for start date
+        date_to (str, optional): ISO format date string for end date
+        
+    Returns:
+        dict: Chart.js labels and datasets
+    """
+    try:
+        dates = chart_dates(days)
+        since = datetime.strptime(dates[0], "%Y-%m-%d")
+        return format_chart_data(dates, get_daily_source_counts(
+            since,
+            sources=normalize_filter_values(source_filter),
+            date_from=parse_date_filter(date_from, 'date_from'),
+            date_to=parse_date_filter(date_to, 'date_to')
+        ))
+    
+    except Exception as e:
+        logger.error(f"Error retrieving webhook chart data: {str(e)}")
+        return {'labels': [], 'datasets': []}
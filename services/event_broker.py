@@ -0,0 +1,173 @@
+"""
+Event broker service
+
+This module fans out live dashboard events to Server-Sent Events subscribers.
+Published events are serialized once into an SSE frame and appended to a
+shared ring buffer; subscribers keep only a cursor into that buffer and wait
+on a single condition variable, so publishing costs the same no matter how
+many dashboards are connected and no per-subscriber queue or thread is kept.
+
+The buffer is per process. Clients reconnecting with Last-Event-ID receive the
+events they missed, or a 'resync' event when those have already been evicted.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Broker configuration
+EVENT_BUFFER_SIZE = int(os.environ.get('EVENT_BUFFER_SIZE', 1000))
+EVENT_STREAM_MAX_SUBSCRIBERS = int(os.environ.get('EVENT_STREAM_MAX_SUBSCRIBERS', 500))
+# Seconds between keep-alive comments on an idle stream
+EVENT_STREAM_HEARTBEAT = float(os.environ.get('EVENT_STREAM_HEARTBEAT', 15))
+# Milliseconds browsers wait before reconnecting a dropped stream
+EVENT_STREAM_RETRY_MS = int(os.environ.get('EVENT_STREAM_RETRY_MS', 3000))
+
+
+class TooManySubscribers(Exception):
+    """Raised when a new subscriber would exceed EVENT_STREAM_MAX_SUBSCRIBERS"""
+
+
+class EventBroker:
+    """
+    EventBroker keeps recent events in a ring buffer and streams them to subscribers
+    """
+
+    def __init__(self, buffer_size: int = EVENT_BUFFER_SIZE, max_subscribers: int = EVENT_STREAM_MAX_SUBSCRIBERS):
+        """Initialize the broker"""
+        self.max_subscribers = max_subscribers
+        # Event IDs are prefixed with the broker's start time so IDs from
+        # another process or an earlier run are never mistaken for ours
+        self.epoch = str(int(time.time() * 1000))
+        self._buffer = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._last_id = 0
+        self._subscribers = 0
+        self._published = 0
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> int:
+        """
+        Publish an event to every subscriber
+
+        Args:
+            event_type (str): SSE event name
+            data (dict): JSON-serializable event payload
+
+        Returns:
+            int: The event sequence number
+        """
+        payload = json.dumps(data, default=str, separators=(',', ':'))
+        with self._condition:
+            self._last_id += 1
+            event_id = self._last_id
+            self._buffer.append((event_id, f"id: {self.epoch}.{event_id}\nevent: {event_type}\ndata: {payload}\n\n"))
+            self._published += 1
+            self._condition.notify_all()
+        return event_id
+
+    def subscribe(self, last_event_id: Optional[str] = None,
+                  heartbeat: float = EVENT_STREAM_HEARTBEAT) -> Iterator[str]:
+        """
+        Open a subscription and return a generator of SSE frames
+
+        Args:
+            last_event_id (str, optional): Resume after this event ID (the Last-Event-ID header)
+            heartbeat (float): Seconds between keep-alive comments
+
+        Returns:
+            generator: SSE frames, running until the client disconnects
+
+        Raises:
+            TooManySubscribers: If the subscriber limit has been reached
+        """
+        with self._condition:
+            if self._subscribers >= self.max_subscribers:
+                raise TooManySubscribers(f"{self._subscribers} event stream subscribers connected")
+            start_id = self._last_id
+        return self._stream(start_id, last_event_id, heartbeat)
+
+    def _stream(self, start_id: int, last_event_id: Optional[str], heartbeat: float) -> Iterator[str]:
+        # Counted once the stream is actually iterated, so a response that is never sent doesn't leak a slot
+        with self._condition:
+            self._subscribers += 1
+        try:
+            yield f"retry: {EVENT_STREAM_RETRY_MS}\n\n"
+
+            cursor = start_id
+            if last_event_id is not None:
+                epoch, _, seq = last_event_id.partition('.')
+                if epoch == self.epoch and seq.isdigit() and int(seq) <= start_id:
+                    # Replay what was missed; evicted events turn into a resync below
+                    cursor = int(seq)
+                else:
+                    # The ID is from another process or before a restart; the client must refetch
+                    yield "event: resync\ndata: {}\n\n"
+
+            while True:
+                with self._condition:
+                    if self._last_id <= cursor:
+                        self._condition.wait(timeout=heartbeat)
+                    frames = self._frames_after(cursor)
+
+                if frames is None:
+                    # The subscriber fell behind the ring buffer
+                    with self._condition:
+                        cursor = self._last_id
+                    yield "event: resync\ndata: {}\n\n"
+                elif frames:
+                    cursor = frames[-1][0]
+                    yield ''.join(frame for _, frame in frames)
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            with self._condition:
+                self._subscribers -= 1
+
+    def _frames_after(self, cursor: int):
+        """Get buffered frames newer than cursor, or None if some were evicted (lock held)"""
+        if self._last_id <= cursor:
+            return []
+        newer = self._last_id - cursor
+        if newer > len(self._buffer):
+            return None
+        buffer = self._buffer
+        return [buffer[-i] for i in range(newer, 0, -1)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get subscriber and event counters"""
+        with self._condition:
+            return {
+                'subscribers': self._subscribers,
+                'max_subscribers': self.max_subscribers,
+                'published': self._published,
+                'last_event_id': self._last_id,
+                'buffered': len(self._buffer),
+                'buffer_size': self._buffer.maxlen
+            }
+
+
+_broker = EventBroker()
+
+
+def publish_event(event_type: str, data: Dict[str, Any]) -> int:
+    """Publish a live event to all dashboard subscribers"""
+    try:
+        return _broker.publish(event_type, data)
+    except Exception as e:
+        logger.warning(f"Failed to publish {event_type} event: {str(e)}")
+        return 0
+
+
+def subscribe(last_event_id: Optional[str] = None) -> Iterator[str]:
+    """Open an SSE subscription, resuming after last_event_id if given"""
+    return _broker.subscribe(last_event_id)
+
+
+def get_broker_stats() -> Dict[str, Any]:
+    """Get statistics for the event broker"""
+    return _broker.get_stats()
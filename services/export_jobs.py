@@ -0,0 +1,324 @@
+"""
+Export jobs service
+
+This module runs large webhook exports as background jobs in a process pool,
+so they don't hold a request worker for minutes. Each job writes its result to
+EXPORT_DIR and keeps its state (status, progress, errors) in a JSON file next
+to it, so any server process can report on and serve any job. Identical
+requests made while a job is still queued or running share that job.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from services.data_service import normalize_filter_values
+from services.export_service import (EXPORT_FLATTEN_DEPTH, PYARROW_AVAILABLE, XLSXWRITER_AVAILABLE,
+                                     generate_export_filename)
+from utils.job_store import ACTIVE_STATUSES, JobStore, WorkerPool, new_job_id
+from utils.payload_flattener import parse_flatten_depth
+
+logger = logging.getLogger(__name__)
+
+# Export job configuration
+EXPORT_DIR = os.environ.get('EXPORT_DIR', os.path.join('data', 'exports'))
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+# Finished jobs and their files are removed after this many hours
+EXPORT_RETENTION_HOURS = float(os.environ.get('EXPORT_RETENTION_HOURS', 24))
+
+EXPORT_FORMATS = {
+    'json': ('json', 'application/json'),
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+    'csv': ('csv', 'text/csv'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream'),
+}
+# Formats written to a file by their own writer rather than streamed as chunks
+FILE_FORMATS = ('excel', 'parquet', 'arrow')
+
+
+def normalize_export_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate and normalize export request parameters
+
+    Args:
+        params (dict): format, source, subtype, status, from, to, pretty, gzip, columns, depth
+
+    Returns:
+        dict: Canonical parameters; equal requests normalize to equal dicts
+
+    Raises:
+        ValueError: If the format is not supported or not available, or the depth is invalid
+    """
+    export_format = str(params.get('format') or 'json').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}. "
+                         f"Supported formats are: {', '.join(EXPORT_FORMATS)}")
+    if export_format == 'excel' and not XLSXWRITER_AVAILABLE:
+        raise ValueError("Excel export is not available. The xlsxwriter library is required.")
+    if export_format in ('parquet', 'arrow') and not PYARROW_AVAILABLE:
+        raise ValueError(f"{export_format.capitalize()} export is not available. The pyarrow library is required.")
+
+    def flag(name):
+        value = params.get(name, False)
+        return value if isinstance(value, bool) else str(value).lower() == 'true'
+
+    columns = params.get('columns') or []
+    if isinstance(columns, str):
+        columns = columns.split(',')
+
+    return {
+        'format': export_format,
+        'source': sorted(normalize_filter_values(params.get('source'))),
+        'subtype': sorted(normalize_filter_values(params.get('subtype'))),
+        'status': sorted(normalize_filter_values(params.get('status'))),
+        'from': params.get('from') or None,
+        'to': params.get('to') or None,
+        'pretty': flag('pretty') and export_format == 'json',
+        'gzip': flag('gzip') and export_format not in FILE_FORMATS,
+        'columns': [column.strip() for column in columns if column.strip()],
+        'depth': parse_flatten_depth(params.get('depth'), EXPORT_FLATTEN_DEPTH),
+    }
+
+
+def _dedup_path(params: Dict[str, Any]) -> str:
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+    return _store.path(f"active-{key}", '.lock')
+
+
+def get_export_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the state of an export job
+
+    Jobs whose worker process has died, or whose server process exited
+    while they were still queued, are reported as failed.
+
+    Args:
+        job_id (str): The job ID
+
+    Returns:
+        dict: The job state, or None if there is no such job
+    """
+    return _store.get(job_id)
+
+
+def create_export_job(params: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """
+    Start an export job, or join the identical one already in progress
+
+    Args:
+        params (dict): Export request parameters (see normalize_export_params)
+
+    Returns:
+        tuple: (job, created) - created is False when an identical queued or
+            running job was reused
+
+    Raises:
+        ValueError: If the parameters are invalid
+    """
+    params = normalize_export_params(params)
+    os.makedirs(_store.directory, exist_ok=True)
+    cleanup_expired_jobs()
+
+    dedup_path = _dedup_path(params)
+    job_id = new_job_id()
+    while True:
+        try:
+            # O_EXCL makes claiming the request atomic across processes
+            fd = os.open(dedup_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(dedup_path) as f:
+                    existing = get_export_job(f.read().strip())
+            except FileNotFoundError:
+                continue
+            if existing is not None and existing['status'] in ACTIVE_STATUSES:
+                return existing, False
+            # Left behind by a finished or vanished job
+            try:
+                os.remove(dedup_path)
+            except FileNotFoundError:
+                pass
+            continue
+        with os.fdopen(fd, 'w') as f:
+            f.write(job_id)
+        break
+
+    extension, _ = EXPORT_FORMATS[params['format']]
+    if params['gzip']:
+        extension += '.gz'
+
+    job = {
+        'id': job_id,
+        'status': 'queued',
+        'params': params,
+        'filename': generate_export_filename(extension, params['source']),
+        'rows_written': 0,
+        'total_rows': None,
+        'progress': 0.0,
+        'size': None,
+        'error': None,
+        'pid': None,
+        # The queued work lives in this process's pool, so the job is orphaned if it exits
+        'submitter_pid': os.getpid(),
+        'created_at': datetime.now().isoformat(),
+        'started_at': None,
+        'finished_at': None,
+    }
+    _store.save(job)
+
+    try:
+        future = _pool.submit(_run_export_job, job_id, params, dedup_path)
+    except Exception as e:
+        _release(dedup_path, job_id)
+        job = _store.finish(job_id, 'failed', error=f"Could not start export: {str(e)}")
+        return job, True
+
+    future.add_done_callback(lambda f: _on_job_done(f, job_id, dedup_path))
+    return job, True
+
+
+def _on_job_done(future, job_id: str, dedup_path: str):
+    """Record jobs whose worker process crashed before it could report"""
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Export job {job_id} failed: {str(error)}")
+        job = get_export_job(job_id)
+        if job is not None and job['status'] in ACTIVE_STATUSES:
+            _store.finish(job_id, 'failed', error=str(error))
+        _release(dedup_path, job_id)
+
+
+def _release(dedup_path: str, job_id: str):
+    """Remove the dedup claim if it still belongs to this job"""
+    try:
+        with open(dedup_path) as f:
+            if f.read().strip() == job_id:
+                os.remove(dedup_path)
+    except FileNotFoundError:
+        pass
+
+
+def _run_export_job(job_id: str, params: Dict[str, Any], dedup_path: str):
+    """Run an export job inside a pool worker process"""
+    from app import app
+    from services.data_service import count_webhook_data
+    from services.export_service import (gzip_stream, stream_csv, stream_json, stream_ndjson,
+                                         write_columnar, write_excel)
+
+    filters = {
+        'source_filter': params['source'],
+        'date_from': params['from'],
+        'date_to': params['to'],
+        'subtype_filter': params['subtype'],
+        'status_filter': params['status'],
+    }
+    tmp_path = _store.path(job_id, '.part')
+    try:
+        with app.app_context():
+            total = count_webhook_data(**filters)
+            if _store.start(job_id, total_rows=total) is None:
+                logger.warning(f"Export job {job_id} is no longer queued, not running it")
+                return
+
+            def progress(rows):
+                _store.update(job_id, rows_written=rows, progress=round(rows / total, 4) if total else 1.0)
+
+            columns = params['columns'] or None
+            if params['format'] == 'excel':
+                write_excel(tmp_path, columns=columns, progress=progress, depth=params['depth'], **filters)
+            elif params['format'] in ('parquet', 'arrow'):
+                write_columnar(tmp_path, params['format'], progress=progress, **filters)
+            else:
+                if params['format'] == 'json':
+                    chunks = stream_json(pretty=params['pretty'], progress=progress, **filters)
+                elif params['format'] == 'ndjson':
+                    chunks = stream_ndjson(progress=progress, **filters)
+                else:
+                    chunks = stream_csv(columns=columns, progress=progress, depth=params['depth'], **filters)
+                if params['gzip']:
+                    chunks = gzip_stream(chunks)
+
+                with open(tmp_path, 'wb') as f:
+                    for chunk in chunks:
+                        f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+
+        result_path = _store.path(job_id, '.export')
+        os.replace(tmp_path, result_path)
+        _store.finish(job_id, 'completed', progress=1.0, size=os.path.getsize(result_path))
+
+    except Exception as e:
+        logger.error(f"Export job {job_id} failed: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        _store.finish(job_id, 'failed', error=str(e))
+
+    finally:
+        _release(dedup_path, job_id)
+
+
+def get_export_file(job_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Get a job and the path of its finished export file
+
+    Returns:
+        tuple: (job, path) - job is None for unknown jobs; path is None until the job has completed
+    """
+    job = get_export_job(job_id)
+    if job is None or job['status'] != 'completed':
+        return job, None
+    path = _store.path(job_id, '.export')
+    return job, path if os.path.exists(path) else None
+
+
+def get_export_mimetype(job: Dict[str, Any]) -> str:
+    """Get the content type of a job's export file"""
+    if job['params'].get('gzip'):
+        return 'application/gzip'
+    return EXPORT_FORMATS[job['params']['format']][1]
+
+
+def cleanup_expired_jobs(retention_hours: float = EXPORT_RETENTION_HOURS) -> int:
+    """
+    Remove finished jobs older than the retention period, with their files
+
+    Returns:
+        int: Number of jobs removed
+    """
+    removed = _store.cleanup(retention_hours, suffixes=('.export', '.part', '.json'))
+    _release_stale_claims()
+    return removed
+
+
+def _release_stale_claims():
+    """Remove dedup claims left behind by jobs that are no longer queued or running"""
+    if not os.path.isdir(_store.directory):
+        return
+    for name in os.listdir(_store.directory):
+        if not (name.startswith('active-') and name.endswith('.lock')):
+            continue
+        path = os.path.join(_store.directory, name)
+        try:
+            with open(path) as f:
+                job_id = f.read().strip()
+        except FileNotFoundError:
+            continue
+        job = get_export_job(job_id)
+        if job is None or job['status'] not in ACTIVE_STATUSES:
+            _release(path, job_id)
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the client-facing view of a job"""
+    view = {key: value for key, value in job.items() if key not in ('pid', 'submitter_pid')}
+    if job['status'] == 'completed':
+        view['download_url'] = f"/api/exports/{job['id']}/download"
+    return view
+
+
+_store = JobStore(EXPORT_DIR, 'export')
+# The app is imported first, as in the server, so the job modules' imports of it don't run circularly
+_pool = WorkerPool(EXPORT_WORKERS, preload=('app',))
@@ -2,26 +2,275 @@
 Export service for webhook data
 
 This module provides functionality to export webhook data in various formats
-such as CSV, Excel, and JSON.
+such as CSV, Excel, JSON and NDJSON. Rows are read from a server-side cursor
+in chunks and encoded incrementally: CSV, JSON and NDJSON exports are
+streamed, and Excel workbooks are written row by row to a temporary file in
+xlsxwriter's constant_memory mode, so memory use stays bounded however large
+the export is.
 """
 import json
 import logging
 import csv
+import os
+import tempfile
+import zlib
 from datetime import datetime
-from io import StringIO, BytesIO
-from typing import Tuple, Dict, List, Optional, Any, Union
+from io import StringIO
+from typing import BinaryIO, Callable, Tuple, Dict, Iterable, Iterator, List, Optional, Any, Union
 
-from services.data_service import get_webhook_data
+from services.data_service import iter_webhook_data, normalize_filter_values
+from services.shape_service import get_shapes
+from utils.payload_flattener import BASE_COLUMNS, PAYLOAD_COLUMN, PayloadFlattener, shape_columns
 
 logger = logging.getLogger(__name__)
 
-# Try to import pandas for Excel export
+# Rows encoded per chunk yielded to the response
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 500))
+EXPORT_GZIP_LEVEL = int(os.environ.get('EXPORT_GZIP_LEVEL', 6))
+
+# Levels of nested payload objects expanded into dotted columns by default
+EXPORT_FLATTEN_DEPTH = int(os.environ.get('EXPORT_FLATTEN_DEPTH', 1))
+
+# Header written when a CSV export matches no rows
+EMPTY_CSV_COLUMNS = ["id", "timestamp", "source", "data"]
+
+# Excel limits: rows per worksheet (including the header) and column width
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_COLUMN_WIDTH = 255
+EXCEL_SHEET_NAME = 'Webhook Data'
+
+# Try to import xlsxwriter for Excel export
 try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
+    import xlsxwriter
+    XLSXWRITER_AVAILABLE = True
 except ImportError:
-    PANDAS_AVAILABLE = False
-    logger.warning("Pandas not available. Excel export functionality will be limited.")
+    XLSXWRITER_AVAILABLE = False
+    logger.warning("xlsxwriter not available. Excel export functionality will be disabled.")
+
+# Try to import pyarrow for Parquet and Arrow export
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.warning("pyarrow not available. Parquet and Arrow export functionality will be disabled.")
+
+# Columnar formats: file extension per format
+COLUMNAR_EXPORT_EXTENSIONS = {
+    'parquet': 'parquet',
+    'arrow': 'arrows',
+}
+# Rows per Parquet row group / Arrow record batch; bounds the rows held in memory
+ARROW_BATCH_ROWS = int(os.environ.get('EXPORT_ARROW_BATCH_ROWS', 50000))
+PARQUET_COMPRESSION = os.environ.get('EXPORT_PARQUET_COMPRESSION', 'zstd')
+
+ProgressCallback = Optional[Callable[[int], None]]
+
+def track_progress(rows: Iterable[Any], progress: ProgressCallback = None) -> Iterator[Any]:
+    """
+    Pass rows through, reporting the running row count every EXPORT_CHUNK_ROWS rows and at the end
+    
+    Args:
+        rows (iterable): The rows being exported
+        progress (callable, optional): Called with the number of rows so far
+    """
+    if progress is None:
+        yield from rows
+        return
+    
+    count = 0
+    for count, row in enumerate(rows, 1):
+        yield row
+        if count % EXPORT_CHUNK_ROWS == 0:
+            progress(count)
+    progress(count)
+
+def get_export_columns(
+    source_filter: Optional[Union[str, List[str]]] = None,
+    subtype_filter: Optional[Union[str, List[str]]] = None,
+    depth: int = EXPORT_FLATTEN_DEPTH,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+) -> List[str]:
+    """
+    Derive the CSV and Excel header from the learned payload shapes
+    
+    The columns cover every payload shape recorded for the matching sources
+    and subtypes in the date range, so no pass over the rows is needed. Status
+    filters do not narrow the header; columns without values in the export
+    stay empty. If payloads beyond the shape cap fall in the range, a `data`
+    column carries each whole payload as JSON.
+    
+    Args:
+        source_filter (str or list, optional): Filter by one or more sources
+        subtype_filter (str or list, optional): Filter by one or more source subtypes
+        depth (int): Levels of nested objects to expand into dotted columns
+        date_from (str, optional): ISO format date string for start date
+        date_to (str, optional): ISO format date string for end date
+    
+    Returns:
+        list: Sorted column names, or EMPTY_CSV_COLUMNS if no shapes match
+    """
+    shapes, overflowed = get_shapes(source_filter, subtype_filter, date_from, date_to)
+    columns = shape_columns(shapes, depth)
+    if overflowed:
+        columns = sorted(set(columns).union(BASE_COLUMNS, [PAYLOAD_COLUMN]))
+    return columns or list(EMPTY_CSV_COLUMNS)
+
+def iter_flattened_rows(
+    columns: List[str],
+    source_filter: Optional[Union[str, List[str]]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    subtype_filter: Optional[Union[str, List[str]]] = None,
+    status_filter: Optional[Union[str, List[str]]] = None,
+    depth: int = EXPORT_FLATTEN_DEPTH
+) -> Iterator[List[Any]]:
+    """
+    Stream flattened webhook rows for tabular exports in a single pass
+    
+    The flattener is compiled once from the learned payload shapes of the
+    matching sources and subtypes. Must be consumed inside an application context.
+    
+    Yields:
+        list: Row values in column order
+    """
+    shapes, _ = get_shapes(source_filter, subtype_filter, date_from, date_to)
+    flattener = PayloadFlattener(columns, shapes, depth)
+    for item in iter_webhook_data(source_filter, date_from, date_to,
+                                  subtype_filter=subtype_filter, status_filter=status_filter):
+        yield flattener.row(item)
+
+def stream_csv(
+    source_filter: Optional[Union[str, List[str]]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    subtype_filter: Optional[Union[str, List[str]]] = None,
+    status_filter: Optional[Union[str, List[str]]] = None,
+    columns: Optional[List[str]] = None,
+    progress: ProgressCallback = None,
+    depth: int = EXPORT_FLATTEN_DEPTH
+) -> Iterator[str]:
+    """
+    Stream webhook data as CSV
+    
+    Rows are read, flattened and written in a single pass.
+    
+    Args:
+        source_filter (str or list, optional): Filter by one or more sources
+        date_from (str, optional): ISO format date string for start date
+        date_to (str, optional): ISO format date string for end date
+        subtype_filter (str or list, optional): Filter by one or more source subtypes
+        status_filter (str or list, optional): Filter by one or more statuses
+        columns (list, optional): Columns to write; derived with get_export_columns() if omitted
+        progress (callable, optional): Called with the number of rows written so far
+        depth (int, optional): Levels of nested objects to expand into dotted columns
+    
+    Yields:
+        str: CSV text, EXPORT_CHUNK_ROWS rows at a time
+    """
+    if columns is None:
+        columns = get_export_columns(source_filter, subtype_filter, depth, date_from, date_to)
+    
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    
+    rows = iter_flattened_rows(columns, source_filter, date_from, date_to, subtype_filter, status_filter, depth)
+    for count, row in enumerate(track_progress(rows, progress), 1):
+        writer.writerow(row)
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    
+    yield output.getvalue()
+
+def stream_json(
+    source_filter: Optional[Union[str, List[str]]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    subtype_filter: Optional[Union[str, List[str]]] = None,
+    status_filter: Optional[Union[str, List[str]]] = None,
+    pretty: bool = False,
+    progress: ProgressCallback = None
+) -> Iterator[str]:
+    """
+    Stream webhook data as a JSON array
+    
+    The output is identical to json.dumps() of the full list, including the
+    indentation and key order of pretty output, without building the list.
+    
+    Yields:
+        str: JSON text, EXPORT_CHUNK_ROWS rows at a time
+    """
+    parts = ['[']
+    first = True
+    rows = iter_webhook_data(source_filter, date_from, date_to,
+                             subtype_filter=subtype_filter, status_filter=status_filter)
+    for count, item in enumerate(track_progress(rows, progress), 1):
+        if pretty:
+            # Items of an indented list are indented one more level
+            parts.append('\n  ' if first else ',\n  ')
+            parts.append(json.dumps(item, indent=2, sort_keys=True).replace('\n', '\n  '))
+        else:
+            parts.append('' if first else ', ')
+            parts.append(json.dumps(item))
+        first = False
+        
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield ''.join(parts)
+            parts = []
+    
+    parts.append('\n]' if pretty and not first else ']')
+    yield ''.join(parts)
+
+def stream_ndjson(
+    source_filter: Optional[Union[str, List[str]]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    subtype_filter: Optional[Union[str, List[str]]] = None,
+    status_filter: Optional[Union[str, List[str]]] = None,
+    progress: ProgressCallback = None
+) -> Iterator[str]:
+    """
+    Stream webhook data as newline-delimited JSON, one record per line
+    
+    Yields:
+        str: NDJSON text, EXPORT_CHUNK_ROWS rows at a time
+    """
+    parts = []
+    rows = iter_webhook_data(source_filter, date_from, date_to,
+                             subtype_filter=subtype_filter, status_filter=status_filter)
+    for item in track_progress(rows, progress):
+        parts.append(json.dumps(item))
+        parts.append('\n')
+        if len(parts) >= EXPORT_CHUNK_ROWS * 2:
+            yield ''.join(parts)
+            parts = []
+    
+    if parts:
+        yield ''.join(parts)
+
+def gzip_stream(chunks: Iterable[Union[str, bytes]], level: int = EXPORT_GZIP_LEVEL) -> Iterator[bytes]:
+    """
+    Gzip-compress a stream of text or byte chunks on the fly
+    
+    Args:
+        chunks (iterable): Text (encoded as UTF-8) or byte chunks
+        level (int): zlib compression level
+    
+    Yields:
+        bytes: gzip-format compressed data
+    """
+    # wbits=31 selects the gzip container
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
 
 def export_data_as_json(
     source_filter: Optional[str] = None, 
@@ -32,6 +281,8 @@ def export_data_as_json(
     """
     Export webhook data as JSON
     
+    Builds the whole export in memory; use stream_json() for large exports.
+    
     Args:
         source_filter (str, optional): Filter by source
         date_from (str, optional): ISO format date string for start date
@@ -44,19 +295,10 @@ def export_data_as_json(
             - filename: suggested filename for the export
     """
     try:
-        # Get data from database
-        data = get_webhook_data(source_filter, date_from, date_to)
-        
         # Generate a filename
         filename = generate_export_filename("json", source_filter)
         
-        # Convert to JSON
-        if pretty:
-            json_data = json.dumps(data, indent=2, sort_keys=True)
-        else:
-            json_data = json.dumps(data)
-        
-        return json_data, filename
+        return ''.join(stream_json(source_filter, date_from, date_to, pretty=pretty)), filename
     
     except Exception as e:
         logger.error(f"Error exporting JSON data: {str(e)}")
@@ -70,6 +312,8 @@ def export_data_as_csv(
     """
     Export webhook data as CSV
     
+    Builds the whole export in memory; use stream_csv() for large exports.
+    
     Args:
         source_filter (str, optional): Filter by source
         date_from (str, optional): ISO format date string for start date
@@ -81,39 +325,10 @@ def export_data_as_csv(
             - filename: suggested filename for the export
     """
     try:
-        # Get data from database
-        data = get_webhook_data(source_filter, date_from, date_to)
-        
         # Generate a filename
         filename = generate_export_filename("csv", source_filter)
         
-        # Create CSV
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Write header row
-        flattened_data = flatten_webhook_data(data)
-        if flattened_data:
-            # Get all unique keys from all items
-            all_keys = set()
-            for item in flattened_data:
-                all_keys.update(item.keys())
-            
-            # Sort the keys for consistent output
-            sorted_keys = sorted(all_keys)
-            
-            # Write header
-            writer.writerow(sorted_keys)
-            
-            # Write data rows
-            for item in flattened_data:
-                row = [item.get(key, "") for key in sorted_keys]
-                writer.writerow(row)
-        else:
-            # Write an empty result with a header
-            writer.writerow(["id", "timestamp", "source", "data"])
-        
-        return output.getvalue(), filename
+        return ''.join(stream_csv(source_filter, date_from, date_to)), filename
     
     except Exception as e:
         logger.error(f"Error exporting CSV data: {str(e)}")
@@ -123,6 +338,132 @@ def export_data_as_csv(
         writer.writerow([str(e)])
         return output.getvalue(), "export_error.csv"
 
+def write_excel(
+    output: Union[str, BinaryIO],
+    source_filter: Optional[Union[str, List[str]]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    subtype_filter: Optional[Union[str, List[str]]] = None,
+    status_filter: Optional[Union[str, List[str]]] = None,
+    columns: Optional[List[str]] = None,
+    progress: ProgressCallback = None,
+    depth: int = EXPORT_FLATTEN_DEPTH
+) -> int:
+    """
+    Write webhook data to an Excel workbook with bounded memory
+    
+    Rows go straight from the database cursor into xlsxwriter in
+    constant_memory mode, which flushes each row to disk as soon as the next
+    one starts. Column widths are tracked as a running maximum and applied
+    when each sheet is finished, and exports longer than Excel's row limit
+    continue on additional sheets.
+    
+    Args:
+        output (str or file): Path or binary file object to write the workbook to
+        source_filter (str or list, optional): Filter by one or more sources
+        date_from (str, optional): ISO format date string for start date
+        date_to (str, optional): ISO format date string for end date
+        subtype_filter (str or list, optional): Filter by one or more source subtypes
+        status_filter (str or list, optional): Filter by one or more statuses
+        columns (list, optional): Columns to write; derived with get_export_columns() if omitted
+        progress (callable, optional): Called with the number of rows written so far
+        depth (int, optional): Levels of nested objects to expand into dotted columns
+    
+    Returns:
+        int: Number of data rows written
+    """
+    if columns is None:
+        columns = get_export_columns(source_filter, subtype_filter, depth, date_from, date_to)
+    
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    try:
+        sheet_number = 0
+        worksheet = None
+        widths = []
+        row_index = EXCEL_MAX_ROWS
+        total = 0
+        
+        def finish_sheet():
+            for column_index, width in enumerate(widths):
+                worksheet.set_column(column_index, column_index, min(width + 2, EXCEL_MAX_COLUMN_WIDTH))
+        
+        def start_sheet():
+            name = EXCEL_SHEET_NAME if sheet_number == 1 else f"{EXCEL_SHEET_NAME} {sheet_number}"
+            sheet = workbook.add_worksheet(name)
+            sheet.write_row(0, 0, columns)
+            return sheet, [len(column) for column in columns]
+        
+        rows = iter_flattened_rows(columns, source_filter, date_from, date_to, subtype_filter, status_filter, depth)
+        for values in track_progress(rows, progress):
+            if row_index >= EXCEL_MAX_ROWS:
+                if worksheet is not None:
+                    finish_sheet()
+                sheet_number += 1
+                worksheet, widths = start_sheet()
+                row_index = 1
+            
+            worksheet.write_row(row_index, 0, values)
+            for column_index, value in enumerate(values):
+                length = len(value) if isinstance(value, str) else len(str(value))
+                if length > widths[column_index]:
+                    widths[column_index] = length
+            row_index += 1
+            total += 1
+        
+        if worksheet is None:
+            # No matching rows: a single sheet with just the header
+            sheet_number = 1
+            worksheet, widths = start_sheet()
+        finish_sheet()
+    finally:
+        workbook.close()
+    
+    return total
+
+def export_excel_file(
+    source_filter: Optional[Union[str, List[str]]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    subtype_filter: Optional[Union[str, List[str]]] = None,
+    status_filter: Optional[Union[str, List[str]]] = None,
+    columns: Optional[List[str]] = None,
+    depth: int = EXPORT_FLATTEN_DEPTH
+) -> Tuple[Optional[BinaryIO], str]:
+    """
+    Export webhook data as an Excel workbook in a temporary file
+    
+    Returns:
+        tuple: (file, filename)
+            - file: temporary file positioned at the start of the workbook,
+              removed when closed, or None if xlsxwriter is not available
+            - filename: suggested filename for the export
+    """
+    if not XLSXWRITER_AVAILABLE:
+        logger.warning("Excel export requested but xlsxwriter is not available")
+        return None, "export_error.xlsx"
+    
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        # Generate a filename
+        filename = generate_export_filename("xlsx", source_filter)
+        
+        write_excel(output, source_filter, date_from, date_to, subtype_filter, status_filter, columns, depth=depth)
+        output.seek(0)
+        return output, filename
+    
+    except Exception as e:
+        logger.error(f"Error exporting Excel data: {str(e)}")
+        # Replace the partial workbook with one describing the error
+        output.seek(0)
+        output.truncate()
+        workbook = xlsxwriter.Workbook(output)
+        worksheet = workbook.add_worksheet(EXCEL_SHEET_NAME)
+        worksheet.write_row(0, 0, ["Error"])
+        worksheet.write_row(1, 0, [str(e)])
+        workbook.close()
+        output.seek(0)
+        return output, "export_error.xlsx"
+
 def export_data_as_excel(
     source_filter: Optional[str] = None, 
     date_from: Optional[str] = None, 
@@ -131,6 +472,8 @@ def export_data_as_excel(
     """
     Export webhook data as Excel
     
+    Reads the whole workbook into memory; use export_excel_file() for large exports.
+    
     Args:
         source_filter (str, optional): Filter by source
         date_from (str, optional): ISO format date string for start date
@@ -138,65 +481,168 @@ def export_data_as_excel(
     
     Returns:
         tuple: (data, filename)
-            - data: bytes containing the Excel data, or None if pandas is not available
+            - data: bytes containing the Excel data, or None if xlsxwriter is not available
             - filename: suggested filename for the export
     """
-    if not PANDAS_AVAILABLE:
-        logger.warning("Excel export requested but pandas is not available")
-        return None, "export_error.xlsx"
+    output, filename = export_excel_file(source_filter, date_from, date_to)
+    if output is None:
+        return None, filename
+    with output:
+        return output.read(), filename
+
+def webhook_arrow_schema() -> 'pa.Schema':
+    """
+    Get the Arrow schema of columnar webhook exports
     
+    The common payload fields are promoted to typed columns; the full payload
+    is kept as JSON text in the `data` column.
+    """
+    return pa.schema([
+        pa.field('id', pa.string(), nullable=False),
+        pa.field('timestamp', pa.timestamp('us'), nullable=False),
+        pa.field('source', pa.string()),
+        pa.field('source_subtype', pa.string()),
+        pa.field('status', pa.string()),
+        pa.field('event_type', pa.string()),
+        pa.field('payment_status', pa.string()),
+        pa.field('amount', pa.float64()),
+        pa.field('customer_email', pa.string()),
+        pa.field('data', pa.large_string(), metadata={'content_type': 'application/json'}),
+    ])
+
+def _to_float(value: Any) -> Optional[float]:
+    """Coerce an amount (number or numeric string) to float, or None"""
+    if value is None or isinstance(value, bool):
+        return None
     try:
-        # Get data from database
-        data = get_webhook_data(source_filter, date_from, date_to)
-        
-        # Generate a filename
-        filename = generate_export_filename("xlsx", source_filter)
-        
-        # Flatten the webhook data
-        flattened_data = flatten_webhook_data(data)
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(flattened_data)
-        
-        # Convert to Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name='Webhook Data', index=False)
-            
-            # Auto-adjust columns' width
-            worksheet = writer.sheets['Webhook Data']
-            for i, col in enumerate(df.columns):
-                column_width = max(df[col].astype(str).map(len).max(), len(col)) + 2
-                worksheet.set_column(i, i, column_width)
-        
-        return output.getvalue(), filename
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _arrow_batch(items: List[Dict[str, Any]], schema: 'pa.Schema') -> 'pa.RecordBatch':
+    """Convert webhook data dictionaries into a record batch"""
+    columns = {name: [] for name in schema.names}
+    for item in items:
+        payload = item.get('data')
+        fields = payload if isinstance(payload, dict) else {}
+        columns['id'].append(item['id'])
+        columns['timestamp'].append(datetime.fromisoformat(item['timestamp']))
+        columns['source'].append(item.get('source'))
+        columns['source_subtype'].append(item.get('source_subtype'))
+        columns['status'].append(item.get('status'))
+        for key in ('event_type', 'payment_status', 'customer_email'):
+            value = fields.get(key)
+            columns[key].append(str(value) if value is not None else None)
+        columns['amount'].append(_to_float(fields.get('amount')))
+        columns['data'].append(json.dumps(payload) if payload is not None else None)
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+def write_columnar(
+    output: Union[str, BinaryIO],
+    file_format: str = 'parquet',
+    source_filter: Optional[Union[str, List[str]]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    subtype_filter: Optional[Union[str, List[str]]] = None,
+    status_filter: Optional[Union[str, List[str]]] = None,
+    progress: ProgressCallback = None
+) -> int:
+    """
+    Write webhook data as a Parquet file or an Arrow IPC stream
     
-    except Exception as e:
-        logger.error(f"Error exporting Excel data: {str(e)}")
-        if PANDAS_AVAILABLE:
-            # Create an error DataFrame
-            df = pd.DataFrame([{"Error": str(e)}])
-            output = BytesIO()
-            df.to_excel(output, index=False)
-            return output.getvalue(), "export_error.xlsx"
-        return None, "export_error.xlsx"
+    Rows are read from a server-side cursor and written ARROW_BATCH_ROWS at a
+    time, each batch becoming one Parquet row group or Arrow record batch, so
+    memory stays bounded at any export size. Column types are kept instead of
+    being turned into strings as in the tabular exports.
+    
+    Args:
+        output (str or file): Path or binary file object to write to
+        file_format (str): 'parquet' or 'arrow'
+        source_filter (str or list, optional): Filter by one or more sources
+        date_from (str, optional): ISO format date string for start date
+        date_to (str, optional): ISO format date string for end date
+        subtype_filter (str or list, optional): Filter by one or more source subtypes
+        status_filter (str or list, optional): Filter by one or more statuses
+        progress (callable, optional): Called with the number of rows written so far
+    
+    Returns:
+        int: Number of rows written
+    """
+    if file_format not in COLUMNAR_EXPORT_EXTENSIONS:
+        raise ValueError(f"Unsupported columnar format: {file_format}")
+    
+    schema = webhook_arrow_schema()
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(output, schema, compression=PARQUET_COMPRESSION)
+    else:
+        writer = pa.ipc.new_stream(output, schema)
+    
+    count = 0
+    try:
+        batch = []
+        rows = iter_webhook_data(source_filter, date_from, date_to,
+                                 subtype_filter=subtype_filter, status_filter=status_filter)
+        for count, item in enumerate(track_progress(rows, progress), 1):
+            batch.append(item)
+            if len(batch) >= ARROW_BATCH_ROWS:
+                writer.write_batch(_arrow_batch(batch, schema))
+                batch = []
+        if batch:
+            writer.write_batch(_arrow_batch(batch, schema))
+    finally:
+        writer.close()
+    
+    return count
 
-def generate_export_filename(extension: str, source_filter: Optional[str] = None) -> str:
+def export_columnar_file(
+    file_format: str,
+    source_filter: Optional[Union[str, List[str]]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    subtype_filter: Optional[Union[str, List[str]]] = None,
+    status_filter: Optional[Union[str, List[str]]] = None
+) -> Tuple[Optional[BinaryIO], str]:
+    """
+    Export webhook data as Parquet or an Arrow IPC stream in a temporary file
+    
+    Returns:
+        tuple: (file, filename)
+            - file: temporary file positioned at the start of the export,
+              removed when closed, or None if pyarrow is not available
+            - filename: suggested filename for the export
+    """
+    extension = COLUMNAR_EXPORT_EXTENSIONS[file_format]
+    if not PYARROW_AVAILABLE:
+        logger.warning(f"{file_format} export requested but pyarrow is not available")
+        return None, f"export_error.{extension}"
+    
+    output = tempfile.TemporaryFile(suffix=f'.{extension}')
+    try:
+        write_columnar(output, file_format, source_filter, date_from, date_to, subtype_filter, status_filter)
+        output.seek(0)
+        return output, generate_export_filename(extension, source_filter)
+    
+    except Exception:
+        output.close()
+        raise
+
+def generate_export_filename(extension: str, source_filter: Optional[Union[str, List[str]]] = None) -> str:
     """
     Generate a filename for an export file
     
     Args:
         extension (str): The file extension (without dot)
-        source_filter (str, optional): Source filter used for the export
+        source_filter (str or list, optional): Source filter(s) used for the export
     
     Returns:
         str: A filename for the export
     """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    if source_filter:
-        # Normalize source filter to lowercase to ensure consistent filenames
-        source_name = source_filter.lower()
+    # Normalize source filter to lowercase to ensure consistent filenames
+    sources = normalize_filter_values(source_filter)
+    if sources:
+        source_name = "_".join(sources)
         return f"webhook_data_{source_name}_{timestamp}.{extension}"
     else:
         return f"webhook_data_{timestamp}.{extension}"
@@ -214,44 +660,51 @@ def flatten_webhook_data(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     Returns:
         list: List of flattened webhook data dictionaries
     """
-    flattened = []
+    return [flatten_webhook_item(item) for item in data]
+
+def flatten_webhook_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flatten a single webhook data dictionary for export
+    
+    Args:
+        item (dict): Webhook data dictionary
+    
+    Returns:
+        dict: Flattened webhook data dictionary
+    """
+    flat_item = {
+        "id": item.get("id", ""),
+        "timestamp": item.get("timestamp", ""),
+        "source": item.get("source", "")
+    }
+    
+    # Add first-level keys from the payload
+    payload = item.get("data", {})
     
-    for item in data:
-        flat_item = {
-            "id": item.get("id", ""),
-            "timestamp": item.get("timestamp", ""),
-            "source": item.get("source", "")
-        }
+    if isinstance(payload, dict):
+        # For each key in the payload, add it to the flattened item
+        # Skip 'original_data' to avoid duplication and deeply nested structures
+        for key, value in payload.items():
+            if key != 'original_data' and not isinstance(value, (dict, list)):
+                flat_key = f"data_{key}"
+                flat_item[flat_key] = str(value) if value is not None else ""
         
-        # Add first-level keys from the payload
-        payload = item.get("data", {})
+        # Special handling for common nested structures
+        # Contact info
+        if "contact_info" in payload and isinstance(payload["contact_info"], dict):
+            for key, value in payload["contact_info"].items():
+                flat_item[f"contact_{key}"] = str(value) if value is not None else ""
         
-        if isinstance(payload, dict):
-            # For each key in the payload, add it to the flattened item
-            # Skip 'original_data' to avoid duplication and deeply nested structures
-            for key, value in payload.items():
-                if key != 'original_data' and not isinstance(value, (dict, list)):
-                    flat_key = f"data_{key}"
-                    flat_item[flat_key] = str(value) if value is not None else ""
-            
-            # Special handling for common nested structures
-            # Contact info
-            if "contact_info" in payload and isinstance(payload["contact_info"], dict):
-                for key, value in payload["contact_info"].items():
-                    flat_item[f"contact_{key}"] = str(value) if value is not None else ""
-            
-            # Entity data (for CRM)
-            if "entity_data" in payload and isinstance(payload["entity_data"], dict):
-                for key, value in payload["entity_data"].items():
-                    if not isinstance(value, (dict, list)):
-                        flat_item[f"entity_{key}"] = str(value) if value is not None else ""
-            
-            # Submission data (for forms)
-            if "submission_data" in payload and isinstance(payload["submission_data"], dict):
-                for key, value in payload["submission_data"].items():
-                    if not isinstance(value, (dict, list)):
-                        flat_item[f"submission_{key}"] = str(value) if value is not None else ""
+        # Entity data (for CRM)
+        if "entity_data" in payload and isinstance(payload["entity_data"], dict):
+            for key, value in payload["entity_data"].items():
+                if not isinstance(value, (dict, list)):
+                    flat_item[f"entity_{key}"] = str(value) if value is not None else ""
         
-        flattened.append(flat_item)
+        # Submission data (for forms)
+        if "submission_data" in payload and isinstance(payload["submission_data"], dict):
+            for key, value in payload["submission_data"].items():
+                if not isinstance(value, (dict, list)):
+                    flat_item[f"submission_{key}"] = str(value) if value is not None else ""
     
-    return flattened
\ No newline at end of file
+    return flat_item
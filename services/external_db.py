@@ -0,0 +1,241 @@
+"""
+External database service
+
+This module keeps one long-lived SQLAlchemy engine per external database
+storage, so mirroring a webhook borrows a pooled connection instead of
+building a new engine, handshaking and introspecting the schema every time.
+Engines are keyed by the storage ID and a fingerprint of its connection
+settings: a changed configuration gets a fresh engine (and the old one is
+disposed) even in processes that never saw the update, and the settings
+routes invalidate an engine explicitly when its storage is updated or
+deleted. The external_webhooks table is ensured once per engine, and rows
+are written with a single dialect-specific UPSERT.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import sqlalchemy
+from sqlalchemy import create_engine, MetaData
+from sqlalchemy.engine import Engine, make_url
+
+logger = logging.getLogger(__name__)
+
+# Connection pool configuration for external databases
+EXTERNAL_DB_POOL_SIZE = int(os.environ.get('EXTERNAL_DB_POOL_SIZE', 5))
+EXTERNAL_DB_MAX_OVERFLOW = int(os.environ.get('EXTERNAL_DB_MAX_OVERFLOW', 5))
+# Seconds after which pooled connections are replaced, before servers drop them
+EXTERNAL_DB_POOL_RECYCLE = int(os.environ.get('EXTERNAL_DB_POOL_RECYCLE', 1800))
+
+metadata = MetaData()
+external_webhooks = sqlalchemy.Table(
+    'external_webhooks', metadata,
+    sqlalchemy.Column('id', sqlalchemy.String(36), primary_key=True),
+    sqlalchemy.Column('timestamp', sqlalchemy.DateTime),
+    sqlalchemy.Column('source', sqlalchemy.String(50)),
+    sqlalchemy.Column('source_subtype', sqlalchemy.String(50)),
+    sqlalchemy.Column('status', sqlalchemy.String(20)),
+    sqlalchemy.Column('data', sqlalchemy.JSON),
+    sqlalchemy.Column('synced_at', sqlalchemy.DateTime)
+)
+
+# Columns overwritten when a mirrored webhook already exists
+_UPDATE_COLUMNS = [column.name for column in external_webhooks.columns if column.name != 'id']
+
+
+def _fingerprint(storage) -> str:
+    """Hash of the settings an engine is built from"""
+    settings = [storage.connection_string, (storage.config or {}).get('engine_options')]
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class EngineRegistry:
+    """
+    EngineRegistry holds one pooled engine per external database storage
+    """
+
+    def __init__(self):
+        """Initialize an empty registry"""
+        # storage ID -> (fingerprint, engine)
+        self._engines: Dict[int, Tuple[str, Engine]] = {}
+        self._lock = threading.Lock()
+        # One lock per storage, held while its engine connects and creates its table, so
+        # a slow or unreachable database doesn't block lookups of the other storages
+        self._build_locks: Dict[int, threading.Lock] = {}
+        self._stats = {'created': 0, 'reused': 0, 'invalidated': 0}
+
+    def get(self, storage) -> Engine:
+        """
+        Get the engine of a storage, creating it and its table on first use
+
+        Args:
+            storage (ExternalStorage): The external storage configuration
+
+        Raises:
+            ValueError: If the storage has no connection string
+
+        Returns:
+            Engine: The pooled engine
+        """
+        if not storage.connection_string:
+            raise ValueError(f"No connection string for external storage {storage.name}")
+
+        fingerprint = _fingerprint(storage)
+        engine = self._lookup(storage.id, fingerprint)
+        if engine is not None:
+            return engine
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(storage.id, threading.Lock())
+        with build_lock:
+            # Another thread may have built it while this one waited
+            engine = self._lookup(storage.id, fingerprint)
+            if engine is not None:
+                return engine
+
+            engine = self._create_engine(storage)
+            try:
+                metadata.create_all(engine)
+            except Exception:
+                engine.dispose()
+                raise
+
+            with self._lock:
+                previous = self._engines.get(storage.id)
+                self._engines[storage.id] = (fingerprint, engine)
+                self._stats['created'] += 1
+            if previous is not None:
+                previous[1].dispose()
+            logger.info(f"Created engine for external storage {storage.name} (ID: {storage.id})")
+            return engine
+
+    def _lookup(self, storage_id: int, fingerprint: str) -> Optional[Engine]:
+        """Get the registered engine of a storage if its configuration is unchanged"""
+        with self._lock:
+            entry = self._engines.get(storage_id)
+            if entry is not None and entry[0] == fingerprint:
+                self._stats['reused'] += 1
+                return entry[1]
+        return None
+
+    def _create_engine(self, storage) -> Engine:
+        url = make_url(storage.connection_string)
+        options = {'pool_pre_ping': True}
+        # SQLite pools are per-file or per-thread and take no size settings
+        if url.get_backend_name() != 'sqlite':
+            options.update(pool_size=EXTERNAL_DB_POOL_SIZE, max_overflow=EXTERNAL_DB_MAX_OVERFLOW,
+                           pool_recycle=EXTERNAL_DB_POOL_RECYCLE)
+        options.update((storage.config or {}).get('engine_options') or {})
+        return create_engine(url, **options)
+
+    def invalidate(self, storage_id: Optional[int] = None):
+        """
+        Dispose of the engine of a storage, or of every engine
+
+        Args:
+            storage_id (int, optional): The storage whose configuration changed
+        """
+        with self._lock:
+            ids = list(self._engines) if storage_id is None else [storage_id]
+            entries = [entry for entry in (self._engines.pop(key, None) for key in ids) if entry is not None]
+            self._stats['invalidated'] += len(entries)
+        # Disposing closes pooled connections, so it happens outside the lock too
+        for _, engine in entries:
+            engine.dispose()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of engines and how often they were created, reused and invalidated"""
+        with self._lock:
+            return {'engines': len(self._engines), **self._stats}
+
+
+def upsert_statement(dialect_name: str, rows: List[Dict[str, Any]]):
+    """
+    Build one INSERT ... ON CONFLICT statement for the given dialect
+
+    Args:
+        dialect_name (str): Engine dialect name
+        rows (list): Row dictionaries for external_webhooks
+
+    Returns:
+        The statement, or None if the dialect has no UPSERT
+    """
+    if dialect_name in ('sqlite', 'postgresql'):
+        if dialect_name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(external_webhooks).values(rows)
+        return statement.on_conflict_do_update(
+            index_elements=['id'],
+            set_={name: statement.excluded[name] for name in _UPDATE_COLUMNS}
+        )
+    if dialect_name in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(external_webhooks).values(rows)
+        return statement.on_duplicate_key_update({name: statement.inserted[name] for name in _UPDATE_COLUMNS})
+    return None
+
+
+def external_row(webhook: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a webhook dictionary (WebhookData.to_dict()) to an external_webhooks row
+
+    Args:
+        webhook (dict): The webhook data dictionary
+
+    Returns:
+        dict: Row values, stamped with the sync time
+    """
+    timestamp = webhook['timestamp']
+    return {
+        'id': webhook['id'],
+        'timestamp': datetime.fromisoformat(timestamp) if isinstance(timestamp, str) else timestamp,
+        'source': webhook['source'],
+        'source_subtype': webhook.get('source_subtype'),
+        'status': webhook.get('status') or 'processed',
+        'data': webhook['data'],
+        'synced_at': datetime.utcnow()
+    }
+
+
+def upsert_webhooks(engine: Engine, rows: List[Dict[str, Any]]):
+    """
+    Insert or update rows of external_webhooks in one transaction
+
+    Args:
+        engine (Engine): Engine from the registry
+        rows (list): Row dictionaries for external_webhooks
+    """
+    if not rows:
+        return
+    statement = upsert_statement(engine.dialect.name, rows)
+    with engine.begin() as conn:
+        if statement is not None:
+            conn.execute(statement)
+            return
+        # Dialects without an UPSERT: update, then insert the rows that were not there
+        for row in rows:
+            result = conn.execute(
+                external_webhooks.update().where(external_webhooks.c.id == row['id']),
+                {name: row[name] for name in _UPDATE_COLUMNS}
+            )
+            if result.rowcount == 0:
+                conn.execute(external_webhooks.insert(), row)
+
+
+def invalidate_engine(storage_id: Optional[int] = None):
+    """Dispose of the engine of a storage whose configuration changed (or of every engine)"""
+    _registry.invalidate(storage_id)
+
+
+def get_engine(storage) -> Engine:
+    """Get the pooled engine of an external database storage"""
+    return _registry.get(storage)
+
+
+_registry = EngineRegistry()
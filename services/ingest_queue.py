@@ -0,0 +1,384 @@
+"""
+Ingest queue service
+
+This module provides a durable, file-backed ingestion journal for the
+/api/webhook endpoint. The request handler only appends the raw request body
+to an append-only SQLite journal and acknowledges it; a pool of background
+workers then runs the processing, persistence and notification stages for
+each journal entry. Replication to external storage happens later, from the
+replication outbox filled by the persistence stage.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import parse_qsl
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Journal location and worker configuration
+INGEST_QUEUE_PATH = os.environ.get('INGEST_QUEUE_PATH', os.path.join(BASE_DIR, 'data', 'ingest_queue.db'))
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 4))
+INGEST_MAX_ATTEMPTS = int(os.environ.get('INGEST_MAX_ATTEMPTS', 3))
+INGEST_POLL_INTERVAL = float(os.environ.get('INGEST_POLL_INTERVAL', 0.5))
+# Entries claimed longer than this (e.g. by a worker that died) are requeued
+INGEST_STALE_AFTER = float(os.environ.get('INGEST_STALE_AFTER', 300))
+# FULL fsyncs every append; NORMAL trades the last few entries on power loss for speed
+INGEST_SYNCHRONOUS = os.environ.get('INGEST_SYNCHRONOUS', 'FULL').upper()
+
+# Pipeline stages, in execution order
+STAGES = ['queue_wait', 'parse', 'process', 'persist', 'notify']
+
+_local = threading.local()
+_wakeup = threading.Event()
+_workers = []
+_workers_pid = None
+_workers_lock = threading.Lock()
+_app = None
+
+_stats_lock = threading.Lock()
+_stage_stats = {}
+_counters = {'enqueued': 0, 'processed': 0, 'retried': 0, 'failed': 0}
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Get the journal connection for the current thread, creating the journal if needed"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and getattr(_local, 'pid', None) == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(INGEST_QUEUE_PATH), exist_ok=True)
+    conn = sqlite3.connect(INGEST_QUEUE_PATH, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={INGEST_SYNCHRONOUS}")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_journal (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            received_at TEXT NOT NULL,
+            content_type TEXT,
+            headers TEXT,
+            body BLOB,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            enqueued_at REAL NOT NULL,
+            claimed_at REAL,
+            last_error TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ingest_journal_status ON ingest_journal (status, seq)")
+
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def enqueue_webhook(body: bytes, content_type: Optional[str] = None, headers: Optional[Dict[str, str]] = None) -> str:
+    """
+    Append a raw webhook request to the ingest journal
+
+    Args:
+        body (bytes): The raw request body
+        content_type (str, optional): The request Content-Type header
+        headers (dict, optional): HTTP headers to pass on to the processors
+
+    Returns:
+        str: The ID assigned to the webhook record
+    """
+    webhook_id = str(uuid.uuid4())
+    conn = _get_connection()
+    conn.execute(
+        "INSERT INTO ingest_journal (id, received_at, content_type, headers, body, enqueued_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (webhook_id, datetime.now().isoformat(), content_type, json.dumps(headers or {}), body, time.time())
+    )
+
+    with _stats_lock:
+        _counters['enqueued'] += 1
+
+    ensure_workers()
+    _wakeup.set()
+    return webhook_id
+
+
+def parse_webhook_body(body: bytes, content_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Parse a raw webhook body into a dictionary
+
+    JSON is tried first as it's most common, then URL-encoded form data. Anything
+    that can't be parsed is kept as raw content. Bytes that aren't valid UTF-8
+    are replaced with U+FFFD rather than failing the webhook.
+
+    Args:
+        body (bytes): The raw request body
+        content_type (str, optional): The request Content-Type header
+
+    Returns:
+        dict: The parsed webhook data
+    """
+    text = body.decode('utf-8', errors='replace') if body else ''
+    mimetype = (content_type or '').split(';', 1)[0].strip().lower()
+
+    if mimetype == 'application/x-www-form-urlencoded':
+        data = {}
+        for key, value in parse_qsl(text, keep_blank_values=True):
+            data.setdefault(key, value)
+        return data
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # As a last resort, store as raw content
+        return {"raw_content": text}
+
+    if not isinstance(data, dict):
+        return {"raw_content": data}
+    return data
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Context manager that records the latency of a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage_latency(stage, time.perf_counter() - start)
+
+
+def record_stage_latency(stage: str, seconds: float):
+    """Record a latency sample for a pipeline stage"""
+    elapsed_ms = seconds * 1000
+    with _stats_lock:
+        stats = _stage_stats.setdefault(stage, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0})
+        stats['count'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        stats['last_ms'] = elapsed_ms
+
+
+def ingest_webhook(data: Dict[str, Any], webhook_id: Optional[str] = None, timestamp: Optional[str] = None,
+                   retry: bool = False, last_attempt: bool = True) -> Dict[str, Any]:
+    """
+    Run parsed webhook data through the processing, persistence and
+    notification stages
+
+    Must be called inside an application context.
+
+    Args:
+        data (dict): The parsed webhook data (including '_headers')
+        webhook_id (str, optional): ID to store the record under
+        timestamp (str, optional): ISO format time the webhook was received
+        retry (bool): The webhook may have been through some stages already, so
+            persistence and notification are skipped if their rows exist
+        last_attempt (bool): Save a minimal 'save_failed' record if the webhook
+            can't be saved; otherwise the save error is raised so it can be retried
+
+    Returns:
+        dict: The webhook data record that was saved
+    """
+    # Imported here to avoid circular imports at application start-up
+    from app import db
+    from models import Notification, WebhookData
+    from services.data_service import save_webhook_data
+    from services.notification_service import notify_new_data
+    from services.summary_cache import invalidate_summary_cache
+    from services.webhook_processor import process_webhook, determine_source
+
+    with track_stage('process'):
+        processed_data = process_webhook(data)
+
+    webhook_data = {
+        "id": webhook_id or str(uuid.uuid4()),
+        "timestamp": timestamp or datetime.now().isoformat(),
+        "source": processed_data.get("source", determine_source(data)),
+        "data": processed_data
+    }
+
+    with track_stage('persist'):
+        if retry and db.session.get(WebhookData, webhook_data['id']) is not None:
+            logger.info(f"Webhook {webhook_data['id']} was already saved by an earlier attempt")
+        else:
+            save_webhook_data(webhook_data, fallback=last_attempt)
+
+    with track_stage('notify'):
+        if retry and Notification.query.filter_by(webhook_id=webhook_data['id'], type='new_webhook').first():
+            logger.info(f"Webhook {webhook_data['id']} was already notified by an earlier attempt")
+        # The summary cache is invalidated once the notification row is written
+        elif not notify_new_data(webhook_data):
+            invalidate_summary_cache()
+
+    return webhook_data
+
+
+def _claim_next() -> Optional[Tuple]:
+    """Atomically claim the oldest pending journal entry"""
+    conn = _get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT seq, id, received_at, content_type, headers, body, attempts, enqueued_at "
+            "FROM ingest_journal WHERE status = 'pending' ORDER BY seq LIMIT 1"
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE ingest_journal SET status = 'processing', attempts = attempts + 1, claimed_at = ? WHERE seq = ?",
+                (time.time(), row[0])
+            )
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _requeue_stale_entries():
+    """Return entries abandoned by a dead worker to the pending state"""
+    conn = _get_connection()
+    cursor = conn.execute(
+        "UPDATE ingest_journal SET status = 'pending' WHERE status = 'processing' AND claimed_at < ?",
+        (time.time() - INGEST_STALE_AFTER,)
+    )
+    if cursor.rowcount:
+        logger.warning(f"Requeued {cursor.rowcount} stale ingest journal entries")
+
+
+def _handle_entry(entry: Tuple):
+    """Process a single claimed journal entry"""
+    seq, webhook_id, received_at, content_type, headers, body, attempts, enqueued_at = entry
+    conn = _get_connection()
+    record_stage_latency('queue_wait', max(time.time() - enqueued_at, 0))
+
+    try:
+        with track_stage('parse'):
+            data = parse_webhook_body(body, content_type)
+            data['_headers'] = json.loads(headers) if headers else {}
+
+        with _app.app_context():
+            ingest_webhook(data, webhook_id=webhook_id, timestamp=received_at, retry=attempts > 0,
+                           last_attempt=attempts + 1 >= INGEST_MAX_ATTEMPTS)
+
+        # The record now lives in the main database, so the journal entry can go
+        conn.execute("DELETE FROM ingest_journal WHERE seq = ?", (seq,))
+        with _stats_lock:
+            _counters['processed'] += 1
+
+    except Exception as e:
+        attempt = attempts + 1
+        if attempt >= INGEST_MAX_ATTEMPTS:
+            logger.error(f"Giving up on webhook {webhook_id} after {attempt} attempts: {str(e)}")
+            status = 'failed'
+            with _stats_lock:
+                _counters['failed'] += 1
+        else:
+            logger.warning(f"Error processing webhook {webhook_id} (attempt {attempt}), will retry: {str(e)}")
+            status = 'pending'
+            with _stats_lock:
+                _counters['retried'] += 1
+
+        conn.execute(
+            "UPDATE ingest_journal SET status = ?, last_error = ? WHERE seq = ?",
+            (status, str(e), seq)
+        )
+
+
+def _worker_loop():
+    """Main loop of an ingest worker thread"""
+    while True:
+        try:
+            entry = _claim_next()
+            if entry is None:
+                _wakeup.wait(INGEST_POLL_INTERVAL)
+                _wakeup.clear()
+                continue
+            _handle_entry(entry)
+        except Exception as e:
+            logger.error(f"Ingest worker error: {str(e)}")
+            time.sleep(INGEST_POLL_INTERVAL)
+
+
+def ensure_workers():
+    """Start the worker pool for this process if it isn't running yet"""
+    global _workers, _workers_pid
+
+    if _app is None or INGEST_WORKERS <= 0:
+        return
+
+    with _workers_lock:
+        # Threads don't survive a fork, so pre-forking servers get a fresh pool per process
+        if _workers_pid == os.getpid() and all(worker.is_alive() for worker in _workers):
+            return
+
+        _requeue_stale_entries()
+        _workers = []
+        for i in range(INGEST_WORKERS):
+            worker = threading.Thread(target=_worker_loop, name=f"ingest-worker-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+        _workers_pid = os.getpid()
+        logger.info(f"Started {INGEST_WORKERS} ingest workers")
+
+
+def init_app(app):
+    """
+    Attach the ingest queue to the Flask application and start the workers
+
+    Args:
+        app (Flask): The application the workers run their stages in
+    """
+    global _app
+    _app = app
+    ensure_workers()
+
+
+def get_queue_stats() -> Dict[str, Any]:
+    """
+    Get queue depth, worker state and per-stage latency statistics
+
+    Returns:
+        dict: Queue statistics
+    """
+    conn = _get_connection()
+    depth = {status: count for status, count in conn.execute(
+        "SELECT status, COUNT(*) FROM ingest_journal GROUP BY status"
+    ).fetchall()}
+    oldest = conn.execute(
+        "SELECT MIN(enqueued_at) FROM ingest_journal WHERE status = 'pending'"
+    ).fetchone()[0]
+
+    with _stats_lock:
+        stages = {}
+        for stage in STAGES:
+            stats = _stage_stats.get(stage)
+            if not stats:
+                continue
+            stages[stage] = {
+                'count': stats['count'],
+                'avg_ms': round(stats['total_ms'] / stats['count'], 3),
+                'max_ms': round(stats['max_ms'], 3),
+                'last_ms': round(stats['last_ms'], 3)
+            }
+        counters = dict(_counters)
+
+    return {
+        'depth': {
+            'pending': depth.get('pending', 0),
+            'processing': depth.get('processing', 0),
+            'failed': depth.get('failed', 0)
+        },
+        'oldest_pending_age_s': round(time.time() - oldest, 3) if oldest else 0,
+        'workers': {
+            'configured': INGEST_WORKERS,
+            'alive': sum(1 for worker in _workers if worker.is_alive()) if _workers_pid == os.getpid() else 0
+        },
+        'counters': counters,
+        'stages': stages
+    }
@@ -0,0 +1,372 @@
+"""
+Notification dispatcher service
+
+This module sends notification emails in the background, so a slow or
+unreachable mail server never holds up webhook ingestion. Emails are queued
+in a bounded in-memory queue (NOTIFY_QUEUE_SIZE) and sent by
+NOTIFY_WORKERS worker threads. Each worker keeps its own authenticated SMTP
+session open between emails, checking it with NOOP after it has been idle
+and reconnecting when the server has dropped it. A failed email is retried
+with backoff up to NOTIFY_MAX_ATTEMPTS times.
+
+The delivery status of each email is recorded on its notification row:
+'queued' when it is accepted, then 'sent', 'failed' or 'skipped' (email
+disabled by the time it was sent). An email is 'dropped' when the queue is
+full, so a mail outage sheds email rather than slowing ingestion.
+"""
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import update
+
+from app import db
+from models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Dispatcher configuration
+NOTIFY_DISPATCH_ENABLED = os.environ.get('NOTIFY_DISPATCH_ENABLED', 'true').lower() == 'true'
+# Emails waiting to be sent; further emails are dropped
+NOTIFY_QUEUE_SIZE = int(os.environ.get('NOTIFY_QUEUE_SIZE', 1000))
+# Worker threads, each with its own SMTP session
+NOTIFY_WORKERS = int(os.environ.get('NOTIFY_WORKERS', 1))
+NOTIFY_MAX_ATTEMPTS = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', 3))
+# Delay before the first retry, doubling for each further attempt
+NOTIFY_RETRY_DELAY = float(os.environ.get('NOTIFY_RETRY_DELAY', 2.0))
+# Socket timeout for SMTP connections
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 10))
+# Seconds a session may sit idle before it is checked with NOOP before the next email
+SMTP_IDLE_CHECK_SECONDS = float(os.environ.get('SMTP_IDLE_CHECK_SECONDS', 30))
+# How long a worker waits for the notification row to be committed before recording its status
+NOTIFY_ROW_TIMEOUT = float(os.environ.get('NOTIFY_ROW_TIMEOUT', 30))
+
+
+class SMTPSession:
+    """
+    SMTPSession keeps one authenticated SMTP connection open between emails
+    """
+
+    def __init__(self, timeout: float = SMTP_TIMEOUT, idle_check_seconds: float = SMTP_IDLE_CHECK_SECONDS):
+        """Initialize a closed session; it connects on the first email"""
+        self.timeout = timeout
+        self.idle_check_seconds = idle_check_seconds
+        self._server = None
+        self._key = None
+        self._last_used = 0.0
+        self.last_error = None
+        self.stats = {'connects': 0, 'reconnects': 0, 'sent': 0}
+
+    def send(self, settings: Dict[str, Any], message):
+        """
+        Send a message, connecting or reconnecting as needed
+
+        Args:
+            settings (dict): Email settings with the SMTP host, port and credentials
+            message: The email.message.Message to send
+
+        Raises:
+            smtplib.SMTPException, OSError: If the message could not be sent
+        """
+        key = (settings.get('smtp_host'), int(settings.get('smtp_port', 587)), settings.get('smtp_username'),
+               settings.get('smtp_password'), settings.get('smtp_use_tls', True))
+        try:
+            self._send(key, message)
+        except Exception as e:
+            self.last_error = str(e)
+            raise
+        self.last_error = None
+
+    def _send(self, key, message):
+        if self._server is not None and (key != self._key or not self._alive()):
+            self.close()
+            self.stats['reconnects'] += 1
+
+        if self._server is None:
+            self._connect(key)
+            try:
+                self._server.send_message(message)
+            except Exception:
+                self.close()
+                raise
+        else:
+            try:
+                self._server.send_message(message)
+            except (smtplib.SMTPServerDisconnected, OSError):
+                # Dropped by the server since the last email; retry once on a fresh connection
+                self.close()
+                self.stats['reconnects'] += 1
+                self._connect(key)
+                self._server.send_message(message)
+
+        self._last_used = time.monotonic()
+        self.stats['sent'] += 1
+
+    def _connect(self, key):
+        host, port, username, password, use_tls = key
+        server = smtplib.SMTP(host, port, timeout=self.timeout)
+        try:
+            if use_tls:
+                server.starttls()
+            if username and password:
+                server.login(username, password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self._key = key
+        self._last_used = time.monotonic()
+        self.stats['connects'] += 1
+
+    def _alive(self) -> bool:
+        """Check a session that has been idle for a while with NOOP"""
+        if time.monotonic() - self._last_used < self.idle_check_seconds:
+            return True
+        try:
+            return self._server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def close(self):
+        """Close the connection, politely if the server is still there"""
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            self._server.close()
+        self._server = None
+        self._key = None
+
+
+class EmailJob:
+    """
+    EmailJob is one queued notification email
+    """
+
+    def __init__(self, subject: str, body: str, recipient: Optional[str] = None,
+                 notification: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the job
+
+        Args:
+            subject (str): Email subject
+            body (str): Email body content
+            recipient (str, optional): Override recipient email
+            notification (dict, optional): Column values identifying the notification
+                row the delivery status is recorded on, e.g. {'id': 5}
+        """
+        self.subject = subject
+        self.body = body
+        self.recipient = recipient
+        self.notification = notification
+        self.attempts = 0
+        # Set once the notification row is committed, so its status can be recorded
+        self.row_saved = threading.Event()
+
+    def track(self, future):
+        """Record the delivery status once the write batcher has committed the notification row"""
+        future.add_done_callback(lambda _: self.row_saved.set())
+
+
+class NotificationDispatcher:
+    """
+    NotificationDispatcher sends queued emails from a pool of worker threads
+    """
+
+    def __init__(self, workers: int = NOTIFY_WORKERS, queue_size: int = NOTIFY_QUEUE_SIZE,
+                 max_attempts: int = NOTIFY_MAX_ATTEMPTS, retry_delay: float = NOTIFY_RETRY_DELAY):
+        """Initialize the dispatcher"""
+        self.workers = max(workers, 1)
+        self.max_attempts = max(max_attempts, 1)
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._app = None
+        self._threads = []
+        self._sessions = []
+        self._thread_pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'queued': 0, 'sent': 0, 'failed': 0, 'skipped': 0, 'dropped': 0, 'retries': 0}
+
+    def init_app(self, app):
+        """Attach the dispatcher to the application and start its workers"""
+        self._app = app
+        self.ensure_threads()
+
+    def ensure_threads(self):
+        """Start the worker threads for this process if they aren't running yet"""
+        if self._app is None:
+            return
+        if self._thread_pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+            return
+
+        with self._lock:
+            # Threads don't survive a fork, so pre-forking servers get workers per process
+            if self._thread_pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+                return
+            self._threads = []
+            self._sessions = []
+            for index in range(self.workers):
+                session = SMTPSession()
+                thread = threading.Thread(target=self._run, args=(session,),
+                                          name=f"notification-dispatcher-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+                self._sessions.append(session)
+            self._thread_pid = os.getpid()
+
+    def submit(self, job: EmailJob) -> bool:
+        """
+        Queue an email without blocking
+
+        Returns:
+            bool: False if the queue is full and the email was dropped
+        """
+        self.ensure_threads()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._count('dropped')
+            logger.warning(f"Notification email dropped, dispatch queue is full: {job.subject}")
+            return False
+        self._count('queued')
+        return True
+
+    def _run(self, session: SMTPSession):
+        """Send queued emails until the process exits"""
+        while True:
+            job = self._queue.get()
+            try:
+                with self._app.app_context():
+                    self._deliver(job, session)
+            except Exception as e:
+                logger.error(f"Notification dispatcher error: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, job: EmailJob, session: SMTPSession):
+        """Send one email with retries and record the outcome on its notification row"""
+        # Imported here to avoid a circular import with notification_service
+        from services.notification_service import get_email_settings, send_email_notification
+
+        status, error = 'failed', None
+        while job.attempts < self.max_attempts:
+            if get_email_settings() is None:
+                status = 'skipped'
+                break
+            job.attempts += 1
+            try:
+                if send_email_notification(job.subject, job.body, job.recipient, smtp_session=session):
+                    status, error = 'sent', None
+                    break
+                error = session.last_error or 'Email not sent, see the server log'
+            except Exception as e:
+                error = str(e)
+            if job.attempts < self.max_attempts:
+                self._count('retries')
+                time.sleep(self.retry_delay * 2 ** (job.attempts - 1))
+
+        self._count(status)
+        self._record_status(job, delivery_status=status, delivery_attempts=job.attempts,
+                            delivered_at=datetime.utcnow() if status == 'sent' else None,
+                            delivery_error=error)
+
+    def _record_status(self, job: EmailJob, **values):
+        if not job.notification:
+            return
+        if not job.row_saved.wait(NOTIFY_ROW_TIMEOUT):
+            logger.warning(f"Notification row for '{job.subject}' was not saved in time, delivery status not recorded")
+            return
+        try:
+            statement = update(Notification).values(**values)
+            for column, value in job.notification.items():
+                statement = statement.where(getattr(Notification, column) == value)
+            db.session.execute(statement)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error recording notification delivery status: {str(e)}")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued email has been handled
+
+        Returns:
+            bool: True if the queue drained within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get dispatch counters, queue depth and SMTP connection reuse"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        connects = sum(session.stats['connects'] for session in self._sessions)
+        smtp_sent = sum(session.stats['sent'] for session in self._sessions)
+        return {
+            'enabled': NOTIFY_DISPATCH_ENABLED,
+            'workers': self.workers,
+            'queue_size': self._queue.maxsize,
+            'pending': self._queue.qsize(),
+            'smtp_connects': connects,
+            'smtp_reconnects': sum(session.stats['reconnects'] for session in self._sessions),
+            'smtp_emails_per_connection': round(smtp_sent / connects, 2) if connects else 0,
+            **stats
+        }
+
+
+def queue_email(subject: str, body: str, recipient: Optional[str] = None,
+                notification: Optional[Dict[str, Any]] = None) -> Optional[EmailJob]:
+    """
+    Queue a notification email for background delivery
+
+    Args:
+        subject (str): Email subject
+        body (str): Email body content
+        recipient (str, optional): Override recipient email
+        notification (dict, optional): Column values identifying the notification row
+            whose delivery status is recorded
+
+    Returns:
+        EmailJob: The queued job, or None if the queue was full and the email was dropped
+    """
+    job = EmailJob(subject, body, recipient, notification)
+    return job if _dispatcher.submit(job) else None
+
+
+def init_app(app):
+    """
+    Attach the notification dispatcher to the Flask application and start its workers
+
+    Args:
+        app (Flask): The application the workers run in
+    """
+    if NOTIFY_DISPATCH_ENABLED:
+        _dispatcher.init_app(app)
+
+
+def wait_for_dispatch(timeout: Optional[float] = None) -> bool:
+    """Wait until every queued notification email has been handled"""
+    return _dispatcher.wait(timeout)
+
+
+def get_dispatcher_stats() -> Dict[str, Any]:
+    """Get statistics for the notification dispatcher"""
+    return _dispatcher.get_stats()
+
+
+_dispatcher = NotificationDispatcher()
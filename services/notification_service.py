@@ -5,22 +5,27 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from app import db
-from models import Notification, WebhookData, Integration
+from models import Notification, WebhookData
+from services.config_cache import get_integration_settings
+from services.notification_dispatcher import NOTIFY_DISPATCH_ENABLED, queue_email
+from services.write_batcher import submit_row
+from services.event_broker import publish_event
+from services.summary_cache import invalidate_summary_cache
 
 logger = logging.getLogger(__name__)
 
 def get_email_settings():
-    """Get email settings from database"""
+    """Get email settings from the config cache"""
     try:
-        email_settings = Integration.query.filter_by(integration_type='email').first()
-        if email_settings and email_settings.enabled:
-            return email_settings.settings
+        email_settings = get_integration_settings('email')
+        if email_settings and email_settings['enabled']:
+            return dict(email_settings['settings'])
         return None
     except Exception as e:
         logger.error(f"Error retrieving email settings: {str(e)}")
         return None
 
-def send_email_notification(subject, body, recipient=None):
+def send_email_notification(subject, body, recipient=None, smtp_session=None):
     """
     Send an email notification based on configured settings
     
@@ -28,6 +33,7 @@ def send_email_notification(subject, body, recipient=None):
         subject (str): Email subject
         body (str): Email body content
         recipient (str, optional): Override recipient email
+        smtp_session (SMTPSession, optional): Open SMTP session to send through
         
     Returns:
         bool: Success status
@@ -55,7 +61,7 @@ def send_email_notification(subject, body, recipient=None):
             
         # Send based on provider type
         if provider == 'smtp':
-            return send_smtp_email(settings, to_email, subject, body)
+            return send_smtp_email(settings, to_email, subject, body, session=smtp_session)
         elif provider == 'sendgrid':
             return send_sendgrid_email(settings, to_email, subject, body)
         elif provider == 'mailgun':
@@ -68,8 +74,8 @@ def send_email_notification(subject, body, recipient=None):
         logger.error(f"Error sending email notification: {str(e)}")
         return False
         
-def send_smtp_email(settings, to_email, subject, body):
-    """Send email via SMTP"""
+def send_smtp_email(settings, to_email, subject, body, session=None):
+    """Send email via SMTP, reusing the connection of an open session if given"""
     try:
         # Get SMTP settings
         smtp_host = settings.get('smtp_host')
@@ -94,6 +100,11 @@ def send_smtp_email(settings, to_email, subject, body):
         # Add body
         msg.attach(MIMEText(body, 'plain'))
         
+        if session is not None:
+            session.send(settings, msg)
+            logger.info(f"SMTP email sent to {to_email}")
+            return True
+        
         # Connect to SMTP server
         if smtp_use_tls:
             server = smtplib.SMTP(smtp_host, smtp_port)
@@ -176,20 +187,17 @@ def notify_new_data(data):
         source = data.get("source", "other")
         message = f"New data received from {source}"
         
-        notification = Notification(
-            webhook_id=webhook_id,
-            type="new_webhook",
-            source=source,
-            message=message
-        )
-        
-        # Save notification to database
-        db.session.add(notification)
-        db.session.commit()
-        
-        logger.info(f"Created notification for webhook data: {webhook_id}")
-        
-        # Send email notification if configured
+        notification = {
+            'webhook_id': webhook_id,
+            'timestamp': datetime.utcnow(),
+            'type': "new_webhook",
+            'source': source,
+            'message': message,
+            'read': False
+        }
+        
+        # Queue an email notification if configured
+        delivery, job = {}, None
         email_settings = get_email_settings()
         if email_settings and email_settings.get('notify_on_webhook', False):
             # Prepare email content
@@ -206,8 +214,29 @@ def notify_new_data(data):
                 else:
                     body += f"Payload: {payload}"
             
-            # Send the email
-            send_email_notification(subject, body)
+            delivery, job = _dispatch_email(subject, body, {'webhook_id': webhook_id, 'type': "new_webhook"})
+        
+        # Queue the notification row; it is committed with the next write batch
+        future = submit_row(Notification, dict(notification, **delivery))
+        future.add_done_callback(_log_notification_write_error)
+        # Summaries include the notification, so they are refreshed once it is written
+        future.add_done_callback(lambda _: invalidate_summary_cache())
+        if job is not None:
+            job.track(future)
+        
+        logger.info(f"Created notification for webhook data: {webhook_id}")
+        
+        # Push a compact delta to live dashboards
+        publish_event('webhook', {
+            'record': {
+                'id': webhook_id,
+                'timestamp': data.get('timestamp'),
+                'source': source,
+                'data': _record_sample(data.get('data'))
+            },
+            'counts': {source: 1},
+            'notification': dict(notification, timestamp=notification['timestamp'].isoformat())
+        })
         
         return True
     
@@ -216,6 +245,47 @@ def notify_new_data(data):
         db.session.rollback()
         return False
 
+def _dispatch_email(subject, body, notification):
+    """
+    Hand an email to the notification dispatcher, or send it now if dispatching is disabled
+    
+    Args:
+        subject (str): Email subject
+        body (str): Email body content
+        notification (dict): Column values identifying the notification row
+        
+    Returns:
+        tuple: (delivery column values for the notification row, queued EmailJob or None)
+    """
+    if NOTIFY_DISPATCH_ENABLED:
+        job = queue_email(subject, body, notification=notification)
+        return {'delivery_status': 'queued' if job else 'dropped'}, job
+    
+    sent = send_email_notification(subject, body)
+    return {
+        'delivery_status': 'sent' if sent else 'failed',
+        'delivery_attempts': 1,
+        'delivered_at': datetime.utcnow() if sent else None
+    }, None
+
+def _record_sample(payload, max_length=100):
+    """Reduce a webhook payload to the single field the dashboard table displays"""
+    if not isinstance(payload, dict) or not payload:
+        return {}
+    key = next((key for key in payload if key != 'source'), next(iter(payload)))
+    value = payload[key]
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str)
+    if isinstance(value, str) and len(value) > max_length:
+        value = value[:max_length]
+    return {key: value}
+
+def _log_notification_write_error(future):
+    """Log notification rows that the write batcher failed to commit"""
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Error saving notification: {str(error)}")
+
 def get_notifications(limit=10, unread_only=False):
     """
     Get the latest notifications from the database
@@ -339,8 +409,12 @@ Error: {error_message}
             if webhook_id:
                 body += f"\nWebhook ID: {webhook_id}"
             
-            # Send the email
-            send_email_notification(subject, body)
+            delivery, job = _dispatch_email(subject, body, {'id': notification.id})
+            for column, value in delivery.items():
+                setattr(notification, column, value)
+            db.session.commit()
+            if job is not None:
+                job.row_saved.set()
         
         return True
     
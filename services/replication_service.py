@@ -0,0 +1,371 @@
+"""
+Replication service
+
+This module replicates saved webhooks to the enabled external storages in the
+background, so a slow or unreachable external system never slows ingestion.
+Every saved webhook is queued in the replication_outbox table by an insert
+hook, in the same transaction that inserts it. A replication worker thread
+then ships the outbox to each storage in batches of REPLICATION_BATCH_SIZE,
+recording a high-water mark per storage in replication_cursors. Writers in
+other transactions can commit sequence numbers out of order, so numbers
+missing below the highest one shipped are remembered as gaps and shipped
+when they appear; the high-water mark only advances past a gap once it is
+filled or has stayed empty for REPLICATION_GAP_TIMEOUT. A storage
+that fails is retried with exponential backoff and catches up from its
+high-water mark once it is reachable again; outbox rows are pruned once
+every enabled storage has shipped them.
+
+Each storage is shipped to by one worker at a time, holding a short lease on
+its cursor row, so several server processes can run the worker safely.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import ExternalStorage, ReplicationCursor, ReplicationOutbox, WebhookData
+from services.config_cache import StorageConfig, get_enabled_storages
+from services.data_service import mirror_to_file_storage
+from services.external_db import external_row, get_engine, upsert_webhooks
+from services.segment_sink import append_to_segments
+from services.write_batcher import register_insert_hook
+
+logger = logging.getLogger(__name__)
+
+# Replication configuration
+REPLICATION_ENABLED = os.environ.get('REPLICATION_ENABLED', 'true').lower() == 'true'
+# Webhooks shipped to a storage per flush
+REPLICATION_BATCH_SIZE = int(os.environ.get('REPLICATION_BATCH_SIZE', 500))
+# Seconds the worker sleeps when every storage is caught up
+REPLICATION_POLL_INTERVAL = float(os.environ.get('REPLICATION_POLL_INTERVAL', 1.0))
+# Retry delay after the first failed flush, doubling up to the maximum
+REPLICATION_RETRY_BASE = float(os.environ.get('REPLICATION_RETRY_BASE', 2.0))
+REPLICATION_RETRY_MAX = float(os.environ.get('REPLICATION_RETRY_MAX', 300.0))
+# Seconds a worker holds a storage before another process may take it over
+REPLICATION_LEASE_SECONDS = float(os.environ.get('REPLICATION_LEASE_SECONDS', 60))
+# Outbox rows older than this are dropped even if a storage has not shipped them
+REPLICATION_OUTBOX_MAX_AGE_HOURS = float(os.environ.get('REPLICATION_OUTBOX_MAX_AGE_HOURS', 168))
+# Seconds a missing sequence number is waited for before it is taken to be a rolled-back insert
+REPLICATION_GAP_TIMEOUT = float(os.environ.get('REPLICATION_GAP_TIMEOUT', 300))
+
+# Webhooks with these statuses are not replicated
+SKIPPED_STATUSES = ('error', 'save_failed')
+
+
+def queue_replication(rows: List[Dict[str, Any]]):
+    """Insert hook adding newly inserted webhook rows to the replication outbox"""
+    now = datetime.utcnow()
+    entries = [{'webhook_id': row['id'], 'created_at': now}
+               for row in rows if row.get('id') and row.get('status') not in SKIPPED_STATUSES]
+    if entries:
+        db.session.execute(insert(ReplicationOutbox), entries)
+        _worker.wake()
+
+
+def ship_webhooks(storage: StorageConfig, webhooks: List[Dict[str, Any]]):
+    """
+    Write a batch of webhooks to an external storage
+
+    Args:
+        storage (StorageConfig): The external storage configuration
+        webhooks (list): Webhook data dictionaries
+
+    Raises:
+        Exception: If the batch could not be written
+    """
+    if storage.storage_type == 'database':
+        # The last version of each webhook wins within one UPSERT
+        rows = {webhook['id']: external_row(webhook) for webhook in webhooks}
+        upsert_webhooks(get_engine(storage), list(rows.values()))
+    elif storage.storage_type == 'file' and (storage.config or {}).get('layout') == 'segments':
+        append_to_segments(storage, webhooks)
+    elif storage.storage_type == 'file':
+        for webhook in webhooks:
+            if not mirror_to_file_storage(webhook, storage):
+                raise RuntimeError(f"Could not write webhook {webhook['id']} to {storage.name}")
+
+
+def retry_delay(failures: int) -> float:
+    """Seconds to wait before retrying a storage after consecutive failures, with jitter"""
+    delay = min(REPLICATION_RETRY_BASE * 2 ** max(failures - 1, 0), REPLICATION_RETRY_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class ReplicationWorker:
+    """
+    ReplicationWorker ships the replication outbox to every enabled external storage
+    """
+
+    def __init__(self, batch_size: int = REPLICATION_BATCH_SIZE, poll_interval: float = REPLICATION_POLL_INTERVAL):
+        """Initialize the worker"""
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._app = None
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+        # Enabled storages at the last prune, to sweep cursors only when they change
+        self._pruned_storage_ids = None
+
+    @property
+    def owner(self) -> str:
+        """Lease owner name of this process"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def init_app(self, app):
+        """Attach the worker to the application and start its thread"""
+        self._app = app
+        self.ensure_thread()
+
+    def wake(self):
+        """Ask the worker to flush without waiting for the poll interval"""
+        self._wakeup.set()
+
+    def ensure_thread(self):
+        """Start the worker thread for this process if it isn't running yet"""
+        if self._app is None or not REPLICATION_ENABLED:
+            return
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+
+        with self._lock:
+            # Threads don't survive a fork, so pre-forking servers get a worker per process
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="replication-worker", daemon=True)
+            self._thread.start()
+            self._thread_pid = os.getpid()
+
+    def _run(self):
+        """Flush until every storage is caught up, then wait for new rows"""
+        while True:
+            try:
+                with self._app.app_context():
+                    backlog = self.run_once()
+            except Exception as e:
+                logger.error(f"Replication worker error: {str(e)}")
+                backlog = False
+
+            if not backlog:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def run_once(self) -> bool:
+        """
+        Ship one batch to every enabled storage and prune the outbox
+
+        Must be called inside an application context.
+
+        Returns:
+            bool: True if a storage shipped a full batch and may have more waiting
+        """
+        storages = get_enabled_storages()
+        backlog = False
+        for storage in storages:
+            try:
+                backlog = self._flush_storage(storage) >= self.batch_size or backlog
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error replicating to {storage.name} (ID: {storage.id}): {str(e)}")
+
+        self._prune([storage.id for storage in storages])
+        return backlog
+
+    def _claim(self, storage_id: int) -> Optional[ReplicationCursor]:
+        """Take or renew the lease on a storage's cursor, creating the cursor if needed"""
+        if db.session.get(ReplicationCursor, storage_id) is None:
+            try:
+                db.session.add(ReplicationCursor(storage_id=storage_id, last_seq=0, shipped_count=0, failures=0))
+                db.session.commit()
+            except IntegrityError:
+                # Created by another process at the same time
+                db.session.rollback()
+
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(ReplicationCursor)
+            .where(ReplicationCursor.storage_id == storage_id)
+            .where(or_(ReplicationCursor.lease_owner == self.owner,
+                       ReplicationCursor.lease_until.is_(None),
+                       ReplicationCursor.lease_until < now))
+            .values(lease_owner=self.owner, lease_until=now + timedelta(seconds=REPLICATION_LEASE_SECONDS))
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return None
+
+        return db.session.get(ReplicationCursor, storage_id)
+
+    def _flush_storage(self, storage: StorageConfig) -> int:
+        """
+        Ship the next batch of the outbox to a storage
+
+        Returns:
+            int: Number of outbox rows shipped
+        """
+        cursor = self._claim(storage.id)
+        if cursor is None or (cursor.next_attempt_at and cursor.next_attempt_at > datetime.utcnow()):
+            return 0
+
+        high = cursor.max_seq if cursor.max_seq is not None else cursor.last_seq
+        gaps = dict(cursor.gaps or {})
+        entries = db.session.query(ReplicationOutbox.seq, ReplicationOutbox.created_at, WebhookData).outerjoin(
+            WebhookData, WebhookData.id == ReplicationOutbox.webhook_id
+        ).filter(
+            or_(ReplicationOutbox.seq > high, ReplicationOutbox.seq.in_([int(seq) for seq in gaps]))
+        ).order_by(ReplicationOutbox.seq).limit(self.batch_size).all()
+        if not entries:
+            if gaps:
+                self._advance(cursor, high, gaps, [])
+                db.session.commit()
+            return 0
+
+        # Webhooks deleted since they were queued are skipped
+        webhooks = [webhook.to_dict() for _, _, webhook in entries if webhook is not None]
+        try:
+            ship_webhooks(storage, webhooks)
+        except Exception as e:
+            db.session.rollback()
+            cursor.failures += 1
+            delay = retry_delay(cursor.failures)
+            cursor.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            cursor.last_error = str(e)
+            self._set_sync_status(storage.id, sync_status='error')
+            db.session.commit()
+            logger.warning(f"Replication to {storage.name} (ID: {storage.id}) failed "
+                           f"(attempt {cursor.failures}), retrying in {delay:.1f}s: {str(e)}")
+            return 0
+
+        now = datetime.utcnow()
+        self._advance(cursor, high, gaps, [seq for seq, _, _ in entries])
+        cursor.shipped_count += len(webhooks)
+        cursor.last_shipped_at = now
+        cursor.last_lag_seconds = round((now - entries[-1][1]).total_seconds(), 3)
+        cursor.failures = 0
+        cursor.next_attempt_at = None
+        cursor.last_error = None
+        self._set_sync_status(storage.id, last_sync=now, sync_status='success')
+        db.session.commit()
+        return len(entries)
+
+    def _advance(self, cursor: ReplicationCursor, high: int, gaps: Dict[str, str], shipped: List[int]):
+        """
+        Move a cursor past shipped sequence numbers, remembering the ones skipped over
+
+        Args:
+            cursor (ReplicationCursor): The storage's cursor
+            high (int): Highest sequence number shipped before this batch
+            gaps (dict): Missing sequence numbers (as strings) and when they were first seen
+            shipped (list): Sequence numbers shipped in this batch, ascending
+        """
+        now = datetime.utcnow()
+        gaps = dict(gaps)
+        for seq in shipped:
+            gaps.pop(str(seq), None)
+
+        new_high = max([high] + shipped)
+        # A cursor that has shipped nothing starts at the oldest row still in the outbox
+        start = high + 1 if high else (shipped[0] if shipped else new_high)
+        shipped_set = set(shipped)
+        for seq in range(start, new_high):
+            if seq not in shipped_set:
+                gaps.setdefault(str(seq), now.isoformat())
+
+        for seq, seen in list(gaps.items()):
+            if (now - datetime.fromisoformat(seen)).total_seconds() > REPLICATION_GAP_TIMEOUT:
+                del gaps[seq]
+                logger.warning(f"Replication to storage {cursor.storage_id}: outbox row {seq} never appeared, "
+                               f"assuming its insert was rolled back")
+
+        cursor.max_seq = new_high
+        cursor.gaps = gaps or None
+        # Everything below the lowest gap has been shipped, so it is safe to prune
+        cursor.last_seq = min(int(seq) for seq in gaps) - 1 if gaps else new_high
+
+    def _set_sync_status(self, storage_id: int, **values):
+        """Record the outcome of a flush on the storage row, which the cached configuration doesn't carry"""
+        db.session.execute(update(ExternalStorage).where(ExternalStorage.id == storage_id).values(**values))
+
+    def _prune(self, storage_ids: List[int]):
+        """Delete outbox rows every enabled storage has shipped, and rows past the maximum age"""
+        if storage_ids:
+            shipped = db.session.query(func.min(ReplicationCursor.last_seq)).filter(
+                ReplicationCursor.storage_id.in_(storage_ids)
+            ).scalar() or 0
+            # A storage without a cursor yet has shipped nothing
+            if db.session.query(ReplicationCursor).filter(
+                    ReplicationCursor.storage_id.in_(storage_ids)).count() < len(storage_ids):
+                shipped = 0
+        else:
+            shipped = db.session.query(func.max(ReplicationOutbox.seq)).scalar() or 0
+
+        cutoff = datetime.utcnow() - timedelta(hours=REPLICATION_OUTBOX_MAX_AGE_HOURS)
+        result = db.session.execute(delete(ReplicationOutbox).where(
+            or_(ReplicationOutbox.seq <= shipped, ReplicationOutbox.created_at < cutoff)
+        ))
+        if storage_ids != self._pruned_storage_ids:
+            # Cursors of deleted storages
+            db.session.execute(delete(ReplicationCursor).where(
+                ReplicationCursor.storage_id.not_in(db.session.query(ExternalStorage.id))
+            ))
+        db.session.commit()
+        self._pruned_storage_ids = storage_ids
+        if result.rowcount:
+            logger.debug(f"Pruned {result.rowcount} replication outbox rows")
+
+
+def get_replication_stats() -> Dict[str, Any]:
+    """
+    Get the outbox size and the replication state and lag of each storage
+
+    Returns:
+        dict: Replication statistics
+    """
+    now = datetime.utcnow()
+    outbox = db.session.query(func.count(ReplicationOutbox.seq)).scalar()
+    storages = []
+    for storage in ExternalStorage.query.order_by(ExternalStorage.id).all():
+        cursor = db.session.get(ReplicationCursor, storage.id)
+        high = (cursor.max_seq if cursor.max_seq is not None else cursor.last_seq) if cursor else 0
+        gaps = [int(seq) for seq in (cursor.gaps or {})] if cursor else []
+        pending, oldest = db.session.query(
+            func.count(ReplicationOutbox.seq), func.min(ReplicationOutbox.created_at)
+        ).filter(or_(ReplicationOutbox.seq > high, ReplicationOutbox.seq.in_(gaps))).one()
+        storages.append({
+            'id': storage.id,
+            'name': storage.name,
+            'enabled': storage.enabled,
+            'pending': pending,
+            # Age of the oldest webhook the storage has not received yet
+            'lag_seconds': round((now - oldest).total_seconds(), 3) if oldest else 0,
+            **(cursor.to_dict() if cursor else {'storage_id': storage.id, 'last_seq': 0})
+        })
+    return {'enabled': REPLICATION_ENABLED, 'outbox': outbox, 'storages': storages}
+
+
+def init_app(app):
+    """
+    Attach the replication worker to the Flask application and start it
+
+    Args:
+        app (Flask): The application the worker runs in
+    """
+    _worker.init_app(app)
+
+
+def run_replication() -> bool:
+    """Ship one batch to every enabled storage now (inside an application context)"""
+    return _worker.run_once()
+
+
+_worker = ReplicationWorker()
+
+register_insert_hook(WebhookData, queue_replication)
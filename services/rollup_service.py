@@ -0,0 +1,298 @@
+"""
+Rollup service
+
+This module maintains pre-aggregated webhook counts per minute, hour and day,
+broken down by source, subtype and status. The counts are upserted in the same
+transaction that inserts the webhook rows, so dashboard statistics can read
+O(buckets) rollup rows instead of aggregating the whole webhook_data table.
+"""
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional
+
+from sqlalchemy import func, delete
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import WebhookData, WebhookRollup
+from services.write_batcher import register_insert_hook
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('minute', 'hour', 'day')
+
+# Minute buckets are only useful for recent activity; older ones are pruned
+ROLLUP_MINUTE_RETENTION_HOURS = int(os.environ.get('ROLLUP_MINUTE_RETENTION_HOURS', 48))
+# Rows upserted per statement, kept well below SQLite's bound parameter limit
+ROLLUP_UPSERT_CHUNK = 500
+# Seconds between prunes of expired minute buckets
+ROLLUP_PRUNE_INTERVAL = float(os.environ.get('ROLLUP_PRUNE_INTERVAL', 3600))
+BACKFILL_CHUNK_SIZE = int(os.environ.get('ROLLUP_BACKFILL_CHUNK_SIZE', 5000))
+
+_UPSERT_DIALECTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+_last_prune = 0.0
+_KEY_COLUMNS = ['granularity', 'bucket_start', 'source', 'source_subtype', 'status']
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its bucket"""
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def coerce_timestamp(value) -> datetime:
+    """Get a webhook timestamp as a naive datetime, falling back to now"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+        except ValueError:
+            pass
+    return datetime.now()
+
+
+def count_rows(rows: Iterable[Dict[str, Any]], counts: Counter = None) -> Counter:
+    """
+    Aggregate webhook rows into rollup bucket counts
+
+    Args:
+        rows (iterable): Dicts with timestamp, source, source_subtype and status
+        counts (Counter, optional): Existing counts to add to
+
+    Returns:
+        Counter: (granularity, bucket_start, source, subtype, status) -> count
+    """
+    counts = counts if counts is not None else Counter()
+    for row in rows:
+        timestamp = coerce_timestamp(row.get('timestamp'))
+        source = row.get('source') or 'other'
+        subtype = row.get('source_subtype') or ''
+        status = row.get('status') or ''
+        for granularity in GRANULARITIES:
+            counts[(granularity, bucket_start(timestamp, granularity), source, subtype, status)] += 1
+    return counts
+
+
+def upsert_counts(counts: Counter):
+    """
+    Add bucket counts to the rollup table in the current transaction
+
+    Uses INSERT ... ON CONFLICT DO UPDATE where the dialect supports it and a
+    read-modify-write fallback elsewhere. The caller commits.
+    """
+    if not counts:
+        return
+
+    values = [
+        dict(zip(_KEY_COLUMNS, key), event_count=count)
+        for key, count in counts.items()
+    ]
+
+    dialect = db.session.get_bind().dialect.name
+    insert_fn = _UPSERT_DIALECTS.get(dialect)
+    if insert_fn is None:
+        _upsert_counts_fallback(values)
+        return
+
+    for start in range(0, len(values), ROLLUP_UPSERT_CHUNK):
+        stmt = insert_fn(WebhookRollup).values(values[start:start + ROLLUP_UPSERT_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=_KEY_COLUMNS,
+            set_={'event_count': WebhookRollup.event_count + stmt.excluded.event_count}
+        )
+        db.session.execute(stmt)
+
+
+def _upsert_counts_fallback(values: List[Dict[str, Any]]):
+    """Row-at-a-time upsert for databases without ON CONFLICT support"""
+    for value in values:
+        rollup = WebhookRollup.query.filter_by(**{column: value[column] for column in _KEY_COLUMNS}).first()
+        if rollup:
+            rollup.event_count += value['event_count']
+        else:
+            db.session.add(WebhookRollup(**value))
+    db.session.flush()
+
+
+def apply_rollups(rows: List[Dict[str, Any]]):
+    """Insert hook keeping the rollups in step with newly inserted webhook rows"""
+    global _last_prune
+    upsert_counts(count_rows(rows))
+
+    # Compact expired minute buckets at most once per interval, in the same transaction
+    now = time.monotonic()
+    if now - _last_prune >= ROLLUP_PRUNE_INTERVAL:
+        _last_prune = now
+        prune_rollups()
+
+
+def backfill_rollups(chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+    """
+    Rebuild the rollup table from the existing webhook data
+
+    Webhook rows are streamed in chunks, aggregated in memory per chunk and
+    upserted, so memory use is bounded by the number of buckets per chunk.
+    The rebuild runs in a single transaction. Must be called inside an
+    application context.
+
+    Returns:
+        int: Number of webhook rows counted
+    """
+    db.session.execute(delete(WebhookRollup))
+
+    query = db.session.query(
+        WebhookData.timestamp,
+        WebhookData.source,
+        WebhookData.source_subtype,
+        WebhookData.status
+    ).execution_options(yield_per=chunk_size)
+
+    total = 0
+    counts = Counter()
+    for row in query:
+        count_rows([row._asdict()], counts)
+        total += 1
+        if total % chunk_size == 0:
+            upsert_counts(counts)
+            counts.clear()
+    upsert_counts(counts)
+
+    prune_rollups()
+    db.session.commit()
+    logger.info(f"Backfilled webhook rollups from {total} rows")
+    return total
+
+
+def prune_rollups(retention_hours: int = ROLLUP_MINUTE_RETENTION_HOURS) -> int:
+    """
+    Delete minute buckets older than the retention window
+
+    Hour and day buckets are kept. The caller commits.
+
+    Returns:
+        int: Number of minute buckets removed
+    """
+    cutoff = datetime.now() - timedelta(hours=retention_hours)
+    result = db.session.execute(
+        delete(WebhookRollup).where(
+            WebhookRollup.granularity == 'minute',
+            WebhookRollup.bucket_start < cutoff
+        )
+    )
+    return result.rowcount or 0
+
+
+def rollups_empty() -> bool:
+    """Check whether the rollup table has no rows yet"""
+    return db.session.query(WebhookRollup.id).first() is None
+
+
+def _day_rollups(sources: Optional[List[str]] = None, date_from: Optional[datetime] = None,
+                 date_to: Optional[datetime] = None):
+    """
+    Query the day rollups, optionally limited to sources and a date range
+
+    Rollups are counted per whole day, so the range covers every day it
+    overlaps.
+    """
+    day_rollups = db.session.query(WebhookRollup).filter(WebhookRollup.granularity == 'day')
+    if sources:
+        day_rollups = day_rollups.filter(WebhookRollup.source.in_(sources))
+    if date_from:
+        day_rollups = day_rollups.filter(WebhookRollup.bucket_start >= bucket_start(date_from, 'day'))
+    if date_to:
+        day_rollups = day_rollups.filter(WebhookRollup.bucket_start <= date_to)
+    return day_rollups
+
+
+def get_rollup_stats(days: int = 7, sources: Optional[List[str]] = None, date_from: Optional[datetime] = None,
+                     date_to: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Get webhook statistics from the day rollups
+
+    Args:
+        days (int): Number of days before today covered by the daily breakdown
+        sources (list, optional): Only count these sources
+        date_from (datetime, optional): Only count days on or after this day
+        date_to (datetime, optional): Only count days up to this time
+
+    Returns:
+        dict: total, by_source, by_subtype, by_status and daily counts
+    """
+    day_rollups = _day_rollups(sources, date_from, date_to)
+    total_count = func.sum(WebhookRollup.event_count)
+
+    # One grouped scan of the covering index yields every breakdown
+    breakdown = day_rollups.with_entities(
+        WebhookRollup.source, WebhookRollup.source_subtype, WebhookRollup.status, total_count
+    ).group_by(WebhookRollup.source, WebhookRollup.source_subtype, WebhookRollup.status).all()
+
+    stats = {'total': 0, 'by_source': Counter(), 'by_subtype': {}, 'by_status': Counter()}
+    for source, subtype, status, count in breakdown:
+        count = int(count)
+        stats['total'] += count
+        stats['by_source'][source] += count
+        if subtype:
+            subtypes = stats['by_subtype'].setdefault(source, {})
+            subtypes[subtype] = subtypes.get(subtype, 0) + count
+        stats['by_status'][status or None] += count
+    stats['by_source'] = dict(stats['by_source'])
+    stats['by_status'] = dict(stats['by_status'])
+
+    since = bucket_start(datetime.now(), 'day') - timedelta(days=days)
+    daily_counts = day_rollups.with_entities(WebhookRollup.bucket_start, total_count).filter(
+        WebhookRollup.bucket_start >= since
+    ).group_by(WebhookRollup.bucket_start).all()
+    stats['daily'] = {bucket.date().isoformat(): int(count) for bucket, count in daily_counts}
+
+    return stats
+
+
+def get_daily_source_counts(since: datetime, sources: Optional[List[str]] = None,
+                            date_from: Optional[datetime] = None,
+                            date_to: Optional[datetime] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Get per-source daily counts from the day rollups
+
+    Every source seen in the date range (by default, ever) is included, most
+    recently active first, with counts only for the days on or after `since`.
+
+    Args:
+        since (datetime): Start of the first day to count
+        sources (list, optional): Only count these sources
+        date_from (datetime, optional): Only count days on or after this day
+        date_to (datetime, optional): Only count days up to this time
+
+    Returns:
+        dict: Source -> {YYYY-MM-DD: count}
+    """
+    day_rollups = _day_rollups(sources, date_from, date_to)
+
+    latest = day_rollups.with_entities(
+        WebhookRollup.source, func.max(WebhookRollup.bucket_start)
+    ).group_by(WebhookRollup.source).all()
+    latest.sort(key=lambda item: (-item[1].timestamp(), item[0]))
+    source_counts = {source: {} for source, _ in latest}
+
+    daily_counts = day_rollups.with_entities(
+        WebhookRollup.source, WebhookRollup.bucket_start, func.sum(WebhookRollup.event_count)
+    ).filter(WebhookRollup.bucket_start >= since).group_by(
+        WebhookRollup.source, WebhookRollup.bucket_start
+    ).all()
+    for source, bucket, count in daily_counts:
+        source_counts.setdefault(source, {})[bucket.date().isoformat()] = int(count)
+
+    return source_counts
+
+
+register_insert_hook(WebhookData, apply_rollups)
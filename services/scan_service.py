@@ -0,0 +1,157 @@
+"""
+Scan service
+
+This module indexes processed scans in the scan_records table, so the scan
+history is a paginated query and a scan is found by its ID without opening
+every processed scan file. The full results (text, pages, thumbnail) stay in
+their JSON files under the processed scans folder; each record points at its
+file.
+"""
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app import db
+from models import ScanRecord
+from scanner.scan_processor import PROCESSED_FOLDER
+
+logger = logging.getLogger(__name__)
+
+# Scans per page of the scan history
+SCAN_HISTORY_PAGE_SIZE = int(os.environ.get('SCAN_HISTORY_PAGE_SIZE', 50))
+MAX_SCAN_HISTORY_PAGE_SIZE = 500
+
+
+def _scan_record(result: Dict[str, Any], result_path: str) -> ScanRecord:
+    timestamp = result.get('timestamp')
+    return ScanRecord(
+        scan_id=result['scan_id'],
+        timestamp=datetime.fromisoformat(timestamp) if timestamp else datetime.now(),
+        type=result.get('type') or 'unknown',
+        file_name=result.get('file_name'),
+        file_size=result.get('file_size'),
+        page_count=result.get('page_count'),
+        result_path=result_path
+    )
+
+
+def record_scan(result: Dict[str, Any], result_path: str) -> bool:
+    """
+    Index a processed scan
+
+    Args:
+        result (dict): The scan result
+        result_path (str): Path of the JSON file the result was saved to
+
+    Returns:
+        bool: True if the scan was recorded
+    """
+    try:
+        db.session.merge(_scan_record(result, result_path))
+        db.session.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error recording scan {result.get('scan_id')}: {str(e)}")
+        db.session.rollback()
+        return False
+
+
+def get_scan_history(page: int = 1, per_page: int = SCAN_HISTORY_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Get a page of the scan history, newest first
+
+    Only the indexed fields are returned; the text and thumbnail are not read.
+
+    Args:
+        page (int): Page number, starting at 1
+        per_page (int): Scans per page
+
+    Returns:
+        dict: scans, page, per_page, total and pages
+    """
+    per_page = max(1, min(per_page, MAX_SCAN_HISTORY_PAGE_SIZE))
+    page = max(1, page)
+    try:
+        total = db.session.query(ScanRecord.scan_id).count()
+        records = ScanRecord.query.order_by(
+            ScanRecord.timestamp.desc(), ScanRecord.scan_id.desc()
+        ).offset((page - 1) * per_page).limit(per_page).all()
+        scans = [record.to_dict() for record in records]
+    except Exception as e:
+        logger.error(f"Error retrieving scan history: {str(e)}")
+        total, scans = 0, []
+
+    return {
+        'scans': scans,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page
+    }
+
+
+def get_scan(scan_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the full result of a scan
+
+    Args:
+        scan_id (str): The scan ID
+
+    Returns:
+        dict: The scan result, or None if there is no such scan
+    """
+    record = db.session.get(ScanRecord, scan_id)
+    if record is None:
+        return None
+    try:
+        with open(record.result_path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error reading scan {scan_id} from {record.result_path}: {str(e)}")
+        return None
+
+
+def backfill_scan_records(folder: str = PROCESSED_FOLDER) -> int:
+    """
+    Index the processed scan files that are not recorded yet
+
+    Must be called inside an application context.
+
+    Returns:
+        int: Number of scans recorded
+    """
+    if not os.path.isdir(folder):
+        return 0
+
+    known = {scan_id for scan_id, in db.session.query(ScanRecord.scan_id)}
+    recorded = 0
+    for filename in os.listdir(folder):
+        if not filename.endswith('.json'):
+            continue
+        file_path = os.path.join(folder, filename)
+        try:
+            with open(file_path) as f:
+                result = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading {file_path}: {str(e)}")
+            continue
+        if not isinstance(result, dict) or not result.get('scan_id') or result['scan_id'] in known:
+            continue
+        try:
+            db.session.add(_scan_record(result, file_path))
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error indexing {file_path}: {str(e)}")
+            continue
+        known.add(result['scan_id'])
+        recorded += 1
+
+    db.session.commit()
+    logger.info(f"Backfilled {recorded} scan records from {folder}")
+    return recorded
+
+
+def scan_records_empty() -> bool:
+    """Check whether the scan_records table has no rows yet"""
+    return db.session.query(ScanRecord.scan_id).first() is None
@@ -0,0 +1,409 @@
+"""
+Segment sink service
+
+This module implements the 'segments' layout of file external storage:
+replicated webhooks are appended as compact NDJSON lines to segment files
+instead of being written as one pretty-printed JSON file each. A segment
+covers one hour or one day (SEGMENT_ROTATION) and is rotated early once it
+reaches its size cap. Rotated segments can be compressed with gzip or zstd.
+Next to each segment, a small .idx file maps every webhook ID to the offset
+and length of its line in the uncompressed segment, so one webhook can be
+found without parsing every segment.
+
+Appends are flushed after every batch, and fsynced at most once per
+fsync interval (0 fsyncs every batch, a negative interval never fsyncs).
+Every server process keeps its own writer, and the replication lease moves
+between them, so appends and rotations hold a lock file in the directory,
+and a writer whose segment was rotated away by another process reopens the
+current one before writing.
+Replication is at-least-once: a batch retried after a crash may repeat
+webhooks already in the segment, and lookups return the last copy.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Defaults for file storages using the 'segments' layout; each can be overridden in the storage's config
+SEGMENT_ROTATION = os.environ.get('SEGMENT_ROTATION', 'hourly')
+SEGMENT_MAX_MB = float(os.environ.get('SEGMENT_MAX_MB', 64))
+SEGMENT_COMPRESSION = os.environ.get('SEGMENT_COMPRESSION', 'none')
+SEGMENT_FSYNC_INTERVAL = float(os.environ.get('SEGMENT_FSYNC_INTERVAL', 0))
+
+ROTATIONS = {'hourly': '%Y%m%d%H', 'daily': '%Y%m%d'}
+COMPRESSIONS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+_SEGMENT_PATTERN = re.compile(r'^segment-(\d{8,10})-(\d{5})\.ndjson(\.gz|\.zst)?$')
+
+
+def segment_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Get the segment settings of a file storage, filling in the defaults
+
+    Args:
+        config (dict): The storage's config
+
+    Raises:
+        ValueError: If the rotation or compression is not supported
+
+    Returns:
+        dict: directory, rotation, max_bytes, compression and fsync_interval
+    """
+    rotation = config.get('rotation') or SEGMENT_ROTATION
+    compression = config.get('compression') or SEGMENT_COMPRESSION
+    if rotation not in ROTATIONS:
+        raise ValueError(f"Unsupported segment rotation: {rotation}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported segment compression: {compression}")
+    if compression == 'zstd' and not ZSTD_AVAILABLE:
+        raise ValueError("zstd segment compression requires the zstandard package")
+
+    fsync_interval = config.get('fsync_interval_seconds')
+    return {
+        'directory': config.get('directory'),
+        'rotation': rotation,
+        'max_bytes': int(float(config.get('max_segment_mb') or SEGMENT_MAX_MB) * 1024 * 1024),
+        'compression': compression,
+        'fsync_interval': SEGMENT_FSYNC_INTERVAL if fsync_interval is None else float(fsync_interval),
+    }
+
+
+class SegmentWriter:
+    """
+    SegmentWriter appends NDJSON lines to the current segment of one directory
+    """
+
+    def __init__(self, directory: str, rotation: str, max_bytes: int, compression: str, fsync_interval: float):
+        """Initialize the writer; the segment is opened on the first append"""
+        self.directory = directory
+        self.rotation = rotation
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.fsync_interval = fsync_interval
+        # Reentrant: rotating closes the segment while an append holds the lock
+        self._lock = threading.RLock()
+        self._period = None
+        self._number = 0
+        self._data = None
+        self._index = None
+        self._size = 0
+        self._last_fsync = 0.0
+
+    @property
+    def path(self) -> Optional[str]:
+        """Path of the open segment"""
+        return self._data.name if self._data is not None else None
+
+    def append(self, webhooks: List[Dict[str, Any]]):
+        """
+        Append webhooks to the current segment, rotating it as needed
+
+        Args:
+            webhooks (list): Webhook data dictionaries
+        """
+        with self._lock, _directory_lock(self.directory):
+            if self._data is not None and self._superseded():
+                # Rotated (and maybe compressed) by another process's writer; find the current segment
+                self._discard()
+            if self._data is not None:
+                # Another process may have appended since the last batch, before this one took
+                # over the storage's lease, so offsets are taken from the file rather than a count
+                self._size = self._data.seek(0, os.SEEK_END)
+            for webhook in webhooks:
+                line = json.dumps(webhook, separators=(',', ':'), default=str).encode('utf-8')
+                self._ensure_segment(len(line) + 1)
+                self._data.write(line + b'\n')
+                self._index.write(f"{webhook['id']}\t{self._size}\t{len(line)}\n".encode('utf-8'))
+                self._size += len(line) + 1
+
+            if self._data is not None:
+                self._data.flush()
+                self._index.flush()
+                if self.fsync_interval >= 0 and time.monotonic() - self._last_fsync >= self.fsync_interval:
+                    os.fsync(self._data.fileno())
+                    os.fsync(self._index.fileno())
+                    self._last_fsync = time.monotonic()
+
+    def _superseded(self) -> bool:
+        """Check whether another writer has rotated the open segment (directory lock held)"""
+        if os.fstat(self._data.fileno()).st_nlink == 0 or not os.path.exists(self._data.name):
+            return True
+        # Rotated uncompressed: the next segment of the period has been started
+        next_name = f"segment-{self._period}-{self._number + 1:05d}.ndjson"
+        return any(os.path.exists(os.path.join(self.directory, next_name + suffix))
+                   for suffix in COMPRESSIONS.values())
+
+    def _discard(self):
+        """Close the handles of a segment another writer has taken over, without rotating it"""
+        # A compressed segment's index was renamed under the open handle; nothing is buffered in either
+        for f in (self._data, self._index):
+            f.close()
+        self._data = None
+        self._index = None
+
+    def _ensure_segment(self, line_size: int):
+        """Open the segment the next line belongs in"""
+        period = datetime.utcnow().strftime(ROTATIONS[self.rotation])
+        if self._data is not None and period == self._period and (
+                self._size == 0 or self._size + line_size <= self.max_bytes):
+            return
+
+        if self._data is not None:
+            self._rotate()
+            number = self._number + 1 if period == self._period else 0
+        else:
+            number = self._resume(period)
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"segment-{period}-{number:05d}.ndjson")
+        self._data = open(path, 'ab')
+        self._index = open(path + '.idx', 'ab')
+        self._size = self._data.tell()
+        self._period = period
+        self._number = number
+
+    def _resume(self, period: str) -> int:
+        """
+        Find the segment to continue after a restart, repairing a torn tail
+
+        Returns:
+            int: Number of the segment to append to in this period
+        """
+        matches = [match for match in map(_SEGMENT_PATTERN.match, _list_files(self.directory)) if match]
+        if self.compression != 'none':
+            # Segments of earlier periods left open by a previous process
+            for match in matches:
+                if match.group(1) != period and not match.group(3):
+                    path = os.path.join(self.directory, match.group(0))
+                    _repair(path)
+                    compress_segment(path, self.compression)
+
+        numbers = [int(match.group(2)) for match in matches if match.group(1) == period]
+        if not numbers:
+            return 0
+
+        number = max(numbers)
+        path = os.path.join(self.directory, f"segment-{period}-{number:05d}.ndjson")
+        if not os.path.exists(path):
+            # Already rotated and compressed
+            return number + 1
+        _repair(path)
+        return number
+
+    def _rotate(self):
+        """Close the open segment and compress it if configured"""
+        path = self._data.name
+        self.close()
+        if self.compression != 'none':
+            try:
+                compress_segment(path, self.compression)
+            except Exception as e:
+                logger.error(f"Error compressing segment {path}: {str(e)}")
+
+    def close(self):
+        """Flush, fsync and close the open segment"""
+        with self._lock:
+            for f in (self._data, self._index):
+                if f is None:
+                    continue
+                f.flush()
+                if self.fsync_interval >= 0:
+                    os.fsync(f.fileno())
+                f.close()
+            self._data = None
+            self._index = None
+
+
+@contextmanager
+def _directory_lock(directory: str):
+    """Hold a segment directory's lock file, across processes where supported"""
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _list_files(directory: str) -> List[str]:
+    try:
+        return os.listdir(directory)
+    except FileNotFoundError:
+        return []
+
+
+def _read_index(index_path: str) -> List[Tuple[str, int, int]]:
+    """Read the (webhook ID, offset, length) entries of a segment index"""
+    entries = []
+    try:
+        with open(index_path, 'rb') as f:
+            for line in f:
+                parts = line.rstrip(b'\n').split(b'\t')
+                if len(parts) == 3 and line.endswith(b'\n'):
+                    entries.append((parts[0].decode('utf-8'), int(parts[1]), int(parts[2])))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _repair(path: str):
+    """Drop a partially written tail from a segment and its index after a crash"""
+    size = os.path.getsize(path)
+    entries = [entry for entry in _read_index(path + '.idx') if entry[1] + entry[2] + 1 <= size]
+    end = entries[-1][1] + entries[-1][2] + 1 if entries else 0
+    if end < size:
+        logger.warning(f"Truncating {size - end} unindexed bytes from segment {path}")
+        with open(path, 'r+b') as f:
+            f.truncate(end)
+    with open(path + '.idx', 'wb') as f:
+        f.writelines(f"{webhook_id}\t{offset}\t{length}\n".encode('utf-8') for webhook_id, offset, length in entries)
+
+
+def compress_segment(path: str, compression: str) -> str:
+    """
+    Compress a closed segment, replacing the uncompressed file
+
+    The index keeps pointing at offsets in the uncompressed data.
+
+    Returns:
+        str: Path of the compressed segment
+    """
+    target = path + COMPRESSIONS[compression]
+    tmp_path = target + '.tmp'
+    with open(path, 'rb') as source:
+        if compression == 'gzip':
+            with gzip.open(tmp_path, 'wb') as destination:
+                shutil.copyfileobj(source, destination)
+        else:
+            with open(tmp_path, 'wb') as raw:
+                with zstandard.ZstdCompressor().stream_writer(raw) as destination:
+                    shutil.copyfileobj(source, destination)
+    os.replace(tmp_path, target)
+    os.replace(path + '.idx', target + '.idx')
+    os.remove(path)
+    return target
+
+
+def _open_segment(path: str):
+    """Open a segment for reading, decompressing it on the fly"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("Reading zstd segments requires the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+def list_segments(directory: str) -> List[str]:
+    """Get the paths of the segments in a directory, oldest first"""
+    names = [name for name in _list_files(directory) if _SEGMENT_PATTERN.match(name)]
+    names.sort(key=lambda name: _SEGMENT_PATTERN.match(name).group(1, 2))
+    return [os.path.join(directory, name) for name in names]
+
+
+def iter_segment(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the webhooks of a segment in the order they were appended"""
+    with _open_segment(path) as f:
+        for line in f:
+            if line.endswith(b'\n'):
+                yield json.loads(line)
+
+
+def find_webhook(directory: str, webhook_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Find the last copy of a webhook in a segment directory using the segment indexes
+
+    Args:
+        directory (str): The storage's directory
+        webhook_id (str): The webhook ID
+
+    Returns:
+        dict: The webhook data, or None if it is not in any segment
+    """
+    for path in reversed(list_segments(directory)):
+        matches = [entry for entry in _read_index(path + '.idx') if entry[0] == webhook_id]
+        if not matches:
+            continue
+        with _open_segment(path) as f:
+            for _, offset, length in reversed(matches):
+                f.seek(offset)
+                line = f.read(length)
+                # Entries past the end of the data point at lines that were never written here
+                if len(line) < length:
+                    continue
+                try:
+                    return json.loads(line)
+                except ValueError:
+                    continue
+    return None
+
+
+def _fingerprint(settings: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+_writers: Dict[int, Tuple[str, SegmentWriter]] = {}
+_writers_lock = threading.Lock()
+
+
+def append_to_segments(storage, webhooks: List[Dict[str, Any]]):
+    """
+    Append webhooks to a file storage using the 'segments' layout
+
+    Args:
+        storage (StorageConfig): The external storage configuration
+        webhooks (list): Webhook data dictionaries
+
+    Raises:
+        ValueError: If the storage has no directory or unsupported settings
+    """
+    settings = segment_settings(storage.config or {})
+    if not settings['directory']:
+        raise ValueError(f"No directory specified for file storage {storage.name}")
+
+    fingerprint = _fingerprint(settings)
+    with _writers_lock:
+        entry = _writers.get(storage.id)
+        if entry is None or entry[0] != fingerprint:
+            if entry is not None:
+                entry[1].close()
+            entry = (fingerprint, SegmentWriter(**settings))
+            _writers[storage.id] = entry
+    entry[1].append(webhooks)
+
+
+def close_segment_writer(storage_id: Optional[int] = None):
+    """Close the open segment of a storage whose configuration changed (or of every storage)"""
+    with _writers_lock:
+        ids = list(_writers) if storage_id is None else [storage_id]
+        for key in ids:
+            entry = _writers.pop(key, None)
+            if entry is not None:
+                entry[1].close()
@@ -0,0 +1,240 @@
+"""
+Shape service
+
+This module learns the tabular schema of webhook payloads. The key structure
+("shape") of every inserted payload is recorded per source and subtype in the
+same transaction as the insert, so CSV and Excel exports can derive their
+columns from the distinct shapes instead of scanning every matching row
+before the first one is written.
+
+Each shape keeps the earliest and latest webhook timestamps it was seen with,
+so an export only takes the shapes seen in its date range. At most
+SHAPE_MAX_PER_SUBTYPE shapes are kept per source and subtype; payloads with
+further shapes are counted on an overflow row instead, and exports that cover
+one get a `data` column holding the whole payload as JSON.
+"""
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import case, delete, func, or_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import WebhookData, WebhookShape
+from services.data_service import normalize_filter_values, parse_date_filter
+from services.rollup_service import coerce_timestamp
+from services.write_batcher import register_insert_hook
+from utils.payload_flattener import payload_shape, shape_hash
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CHUNK_SIZE = int(os.environ.get('SHAPE_BACKFILL_CHUNK_SIZE', 5000))
+# Shapes kept per source and subtype before payloads fall back to the JSON data column
+SHAPE_MAX_PER_SUBTYPE = int(os.environ.get('SHAPE_MAX_PER_SUBTYPE', 200))
+# Rows inserted per statement, kept well below SQLite's bound parameter limit
+SHAPE_INSERT_CHUNK = 200
+
+# shape_hash of the row standing in for the shapes beyond the cap
+OVERFLOW_HASH = 'overflow'
+
+_INSERT_DIALECTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+_KEY_COLUMNS = ['source', 'source_subtype', 'shape_hash']
+
+
+def _merge_seen(shapes: Dict[tuple, Dict[str, Any]], key: tuple, shape: Dict[str, Any], first_seen, last_seen):
+    entry = shapes.get(key)
+    if entry is None:
+        shapes[key] = {'shape': shape, 'first_seen': first_seen, 'last_seen': last_seen}
+    else:
+        entry['first_seen'] = min(entry['first_seen'], first_seen)
+        entry['last_seen'] = max(entry['last_seen'], last_seen)
+
+
+def collect_shapes(rows: Iterable[Dict[str, Any]], shapes: Dict[tuple, Dict[str, Any]] = None) -> Dict[tuple, Dict[str, Any]]:
+    """
+    Collect the distinct payload shapes of webhook rows
+
+    Args:
+        rows (iterable): Dicts with timestamp, source, source_subtype and payload
+        shapes (dict, optional): Existing shapes to add to
+
+    Returns:
+        dict: (source, subtype, shape hash) -> shape, first_seen and last_seen
+    """
+    shapes = shapes if shapes is not None else {}
+    for row in rows:
+        shape = payload_shape(row.get('payload'))
+        timestamp = coerce_timestamp(row.get('timestamp'))
+        key = (row.get('source') or 'other', row.get('source_subtype') or '', shape_hash(shape))
+        _merge_seen(shapes, key, shape, timestamp, timestamp)
+    return shapes
+
+
+def _apply_cap(shapes: Dict[tuple, Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+    """
+    Move shapes beyond SHAPE_MAX_PER_SUBTYPE onto their overflow row
+
+    Shapes already recorded are always kept so their seen range is updated.
+    Concurrent writers can each take the last free slots, so the cap is soft.
+    """
+    groups = defaultdict(list)
+    for key in shapes:
+        groups[key[:2]].append(key)
+
+    capped = {}
+    for (source, subtype), keys in groups.items():
+        group = WebhookShape.query.filter_by(source=source, source_subtype=subtype)
+        hashes = [key[2] for key in keys if key[2] != OVERFLOW_HASH]
+        recorded = set()
+        for start in range(0, len(hashes), SHAPE_INSERT_CHUNK):
+            recorded.update(hash_ for hash_, in group.with_entities(WebhookShape.shape_hash).filter(
+                WebhookShape.shape_hash.in_(hashes[start:start + SHAPE_INSERT_CHUNK])))
+        room = SHAPE_MAX_PER_SUBTYPE - group.filter(WebhookShape.shape_hash != OVERFLOW_HASH).count()
+
+        for key in keys:
+            entry = shapes[key]
+            if key[2] == OVERFLOW_HASH or key[2] in recorded or room > 0:
+                if key[2] != OVERFLOW_HASH and key[2] not in recorded:
+                    room -= 1
+                _merge_seen(capped, key, entry['shape'], entry['first_seen'], entry['last_seen'])
+            else:
+                _merge_seen(capped, (source, subtype, OVERFLOW_HASH), {}, entry['first_seen'], entry['last_seen'])
+    return capped
+
+
+def insert_shapes(shapes: Dict[tuple, Dict[str, Any]]):
+    """
+    Add shapes that are not recorded yet and widen the seen range of the rest,
+    in the current transaction
+
+    Uses INSERT ... ON CONFLICT DO UPDATE where the dialect supports it and a
+    lookup before each insert elsewhere. The caller commits.
+    """
+    if not shapes:
+        return
+
+    values = [dict(zip(_KEY_COLUMNS, key), **entry) for key, entry in _apply_cap(shapes).items()]
+
+    dialect = db.session.get_bind().dialect.name
+    insert_fn = _INSERT_DIALECTS.get(dialect)
+    if insert_fn is None:
+        for value in values:
+            shape = WebhookShape.query.filter_by(**{column: value[column] for column in _KEY_COLUMNS}).first()
+            if shape is None:
+                db.session.add(WebhookShape(**value))
+            else:
+                shape.first_seen = min(shape.first_seen or value['first_seen'], value['first_seen'])
+                shape.last_seen = max(shape.last_seen or value['last_seen'], value['last_seen'])
+        db.session.flush()
+        return
+
+    for start in range(0, len(values), SHAPE_INSERT_CHUNK):
+        stmt = insert_fn(WebhookShape).values(values[start:start + SHAPE_INSERT_CHUNK])
+        first_seen = func.coalesce(WebhookShape.first_seen, stmt.excluded.first_seen)
+        last_seen = func.coalesce(WebhookShape.last_seen, stmt.excluded.last_seen)
+        # Only rows whose range actually widens are rewritten
+        stmt = stmt.on_conflict_do_update(
+            index_elements=_KEY_COLUMNS,
+            set_={
+                'first_seen': case((stmt.excluded.first_seen < first_seen, stmt.excluded.first_seen), else_=first_seen),
+                'last_seen': case((stmt.excluded.last_seen > last_seen, stmt.excluded.last_seen), else_=last_seen),
+            },
+            where=or_(stmt.excluded.first_seen < first_seen, stmt.excluded.last_seen > last_seen,
+                      WebhookShape.last_seen.is_(None))
+        )
+        db.session.execute(stmt)
+
+
+def record_shapes(rows: List[Dict[str, Any]]):
+    """Insert hook recording the payload shapes of newly inserted webhook rows"""
+    insert_shapes(collect_shapes(rows))
+
+
+def get_shapes(source_filter=None, subtype_filter=None, date_from=None, date_to=None) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Get the recorded payload shapes, optionally for some sources, subtypes and a date range
+
+    Args:
+        source_filter (str or list, optional): Filter by one or more sources
+        subtype_filter (str or list, optional): Filter by one or more source subtypes
+        date_from (str, optional): ISO format date string for start date
+        date_to (str, optional): ISO format date string for end date
+
+    Returns:
+        tuple: (shapes, overflowed)
+            - shapes: payload shapes seen in the date range
+            - overflowed: whether payloads beyond the shape cap were seen in the range
+    """
+    query = db.session.query(WebhookShape.shape_hash, WebhookShape.shape)
+    sources = normalize_filter_values(source_filter)
+    if sources:
+        query = query.filter(WebhookShape.source.in_(sources))
+    subtypes = normalize_filter_values(subtype_filter)
+    if subtypes:
+        query = query.filter(WebhookShape.source_subtype.in_(subtypes))
+
+    # Shapes recorded before their seen range was tracked match any range
+    date_from = parse_date_filter(date_from, 'date_from')
+    if date_from:
+        query = query.filter(or_(WebhookShape.last_seen >= date_from, WebhookShape.last_seen.is_(None)))
+    date_to = parse_date_filter(date_to, 'date_to')
+    if date_to:
+        query = query.filter(or_(WebhookShape.first_seen <= date_to, WebhookShape.first_seen.is_(None)))
+
+    shapes = []
+    overflowed = False
+    for hash_, shape in query:
+        if hash_ == OVERFLOW_HASH:
+            overflowed = True
+        else:
+            shapes.append(shape)
+    return shapes, overflowed
+
+
+def backfill_shapes(chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+    """
+    Rebuild the shape table from the existing webhook data
+
+    Payloads are streamed in chunks and the distinct shapes of each chunk are
+    recorded before the next is read. Must be called inside an application
+    context.
+
+    Returns:
+        int: Number of webhook rows scanned
+    """
+    db.session.execute(delete(WebhookShape))
+
+    query = db.session.query(
+        WebhookData.timestamp,
+        WebhookData.source,
+        WebhookData.source_subtype,
+        WebhookData.payload
+    ).execution_options(yield_per=chunk_size)
+
+    total = 0
+    shapes = {}
+    for row in query:
+        collect_shapes([row._asdict()], shapes)
+        total += 1
+        if total % chunk_size == 0:
+            insert_shapes(shapes)
+            shapes.clear()
+    insert_shapes(shapes)
+
+    db.session.commit()
+    count = db.session.query(WebhookShape.id).count()
+    logger.info(f"Backfilled {count} payload shapes from {total} rows")
+    return total
+
+
+def shapes_empty() -> bool:
+    """Check whether the shape table has no rows yet"""
+    return db.session.query(WebhookShape.id).first() is None
+
+
+register_insert_hook(WebhookData, record_shapes)
@@ -0,0 +1,239 @@
+"""
+Source classifier
+
+This module compiles the webhook source detection rules once into a key index
+and a single keyword regex. Classifying a payload costs one dictionary pass
+over its top-level keys plus, only when a keyword rule is reached, one regex
+scan over the serialized payload. The result is cached for the duration of
+process_webhook so the source processors can reuse the keyword matches
+instead of re-stringifying the payload.
+"""
+import re
+from contextvars import ContextVar
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# Keyword groups matched against the lower-cased, stringified payload
+KEYWORD_GROUPS = {
+    'newsletter': ['newsletter', 'subscribe', 'mailing list'],
+    'collection': ['collection', 'product_id', 'category', 'product collection'],
+    'salesforce': ['salesforce', 'sf_', 'sfdc'],
+    'hubspot': ['hubspot', 'hs_'],
+    'zoho': ['zoho', 'zcrm'],
+    'pipedrive': ['pipedrive', 'pd_deal'],
+    'dynamics': ['dynamics', 'ms_crm', 'mscrm'],
+}
+
+# CRM systems in detection priority order
+CRM_SYSTEMS = ['salesforce', 'hubspot', 'zoho', 'pipedrive', 'dynamics']
+
+
+def _first_entry_change(data: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Get the first entry and its first change from a Meta (WhatsApp/Facebook) style payload"""
+    entry = data.get('entry')
+    if not isinstance(entry, list) or not entry or not isinstance(entry[0], dict):
+        return None
+    first_entry = entry[0]
+    if 'changes' not in first_entry:
+        return None
+    changes = first_entry['changes']
+    first_change = changes[0] if isinstance(changes, list) and changes and isinstance(changes[0], dict) else {}
+    return first_entry, first_change
+
+
+def _is_stripe_event(data: Dict[str, Any]) -> bool:
+    return 'type' in data and data.get('object') == 'event' and 'api_version' in data
+
+
+def _is_paypal_sale(data: Dict[str, Any]) -> bool:
+    return 'event_type' in data and data.get('resource_type') == 'sale'
+
+
+def _is_whatsapp_change(data: Dict[str, Any]) -> bool:
+    found = _first_entry_change(data)
+    return found is not None and 'messaging_product' in found[1]
+
+
+def _is_facebook_change(data: Dict[str, Any]) -> bool:
+    found = _first_entry_change(data)
+    return found is not None and 'id' in found[0]
+
+
+# Source rules in priority order: (source, kind, argument)
+#   predicate - argument is a callable taking the payload
+#   keys      - argument is a list of top-level keys, any of which must be present
+#   keywords  - argument is a KEYWORD_GROUPS name, any of whose keywords must appear in the payload
+SOURCE_RULES = [
+    ('stripe', 'predicate', _is_stripe_event),
+    ('paypal', 'predicate', _is_paypal_sale),
+    ('google', 'keys', ['tracking_id', 'client_id', 'page_view', 'event_action']),
+    ('whatsapp', 'predicate', _is_whatsapp_change),
+    ('facebook', 'predicate', _is_facebook_change),
+    # Checked before form to avoid misclassifying newsletters as forms
+    ('newsletter', 'keywords', 'newsletter'),
+    ('form', 'keys', ['name', 'email', 'message', 'phone']),
+    ('crm', 'keys', ['customer', 'lead', 'opportunity', 'contact']),
+    ('cart', 'keys', ['cart', 'product', 'order', 'checkout']),
+    ('scanner', 'keys', ['scan_id', 'extracted_text', 'scan_type', 'scan_data']),
+]
+
+DEFAULT_SOURCE = 'other'
+
+
+class Classification:
+    """
+    The classification of a single webhook payload
+
+    Keyword matches are computed lazily on first use and then shared by
+    everything that asks about the same payload.
+    """
+
+    __slots__ = ('source', '_data', '_keywords', '_classifier')
+
+    def __init__(self, classifier: 'SourceClassifier', data: Dict[str, Any]):
+        self._classifier = classifier
+        self._data = data
+        self._keywords = None
+        self.source = DEFAULT_SOURCE
+
+    @property
+    def keywords(self) -> frozenset:
+        """All keywords that appear in the stringified payload"""
+        if self._keywords is None:
+            self._keywords = self._classifier.scan_keywords(self._data)
+        return self._keywords
+
+    def has_keyword(self, group: str) -> bool:
+        """Check if any keyword of a KEYWORD_GROUPS group appears in the payload"""
+        return not self.keywords.isdisjoint(self._classifier.keyword_groups[group])
+
+    def first_group(self, groups: Iterable[str]) -> Optional[str]:
+        """Get the first of the given keyword groups that matches the payload"""
+        for group in groups:
+            if self.has_keyword(group):
+                return group
+        return None
+
+
+class SourceClassifier:
+    """
+    SourceClassifier compiles source rules and keyword groups for fast classification
+    """
+
+    def __init__(self, rules: List[Tuple[str, str, Any]] = SOURCE_RULES,
+                 keyword_groups: Dict[str, List[str]] = KEYWORD_GROUPS):
+        """Compile the rule set"""
+        self.rules = rules
+        self.keyword_groups = {group: frozenset(keywords) for group, keywords in keyword_groups.items()}
+
+        # Map each key to the highest priority 'keys' rule that mentions it
+        self._key_index = {}
+        for rank, (_, kind, argument) in enumerate(rules):
+            if kind == 'keys':
+                for key in argument:
+                    self._key_index.setdefault(key, rank)
+
+        # One alternation over every keyword, longest first so the longest
+        # keyword wins when several start at the same position
+        keywords = sorted({kw for kws in keyword_groups.values() for kw in kws}, key=len, reverse=True)
+        self._keyword_pattern = re.compile('|'.join(re.escape(kw) for kw in keywords))
+        self._all_keywords = frozenset(keywords)
+
+        # Keywords implied by a match because they are substrings of it
+        self._implied = {kw: frozenset(other for other in keywords if other in kw) for kw in keywords}
+
+    def scan_keywords(self, data: Any) -> frozenset:
+        """
+        Find every keyword that appears in the lower-cased, stringified payload
+
+        The payload is serialized once and scanned in a single left-to-right
+        pass; the scan stops early once every keyword has been seen.
+        """
+        text = str(data).lower()
+        found = set()
+        search = self._keyword_pattern.search
+        pos = 0
+        while True:
+            match = search(text, pos)
+            if match is None:
+                break
+            found.update(self._implied[match.group()])
+            if len(found) == len(self._all_keywords):
+                break
+            # Resume one character in so overlapping keywords are still seen
+            pos = match.start() + 1
+        return frozenset(found)
+
+    def classify(self, data: Dict[str, Any]) -> Classification:
+        """
+        Classify a webhook payload
+
+        Args:
+            data (dict): The raw webhook data
+
+        Returns:
+            Classification: The detected source and lazily computed keyword matches
+        """
+        result = Classification(self, data)
+
+        # First check if the source is explicitly set
+        if 'source' in data:
+            result.source = data['source']
+            return result
+
+        # Find the highest priority 'keys' rule with a matching key
+        no_match = len(self.rules)
+        key_rank = no_match
+        index = self._key_index
+        if len(data) <= len(index):
+            for key in data:
+                rank = index.get(key, no_match)
+                if rank < key_rank:
+                    key_rank = rank
+        else:
+            for key, rank in index.items():
+                if rank < key_rank and key in data:
+                    key_rank = rank
+
+        for rank, (source, kind, argument) in enumerate(self.rules):
+            if kind == 'keys':
+                matched = key_rank == rank
+            elif kind == 'predicate':
+                matched = argument(data)
+            else:
+                matched = result.has_keyword(argument)
+
+            if matched:
+                result.source = source
+                return result
+
+        return result
+
+
+_classifier = SourceClassifier()
+_current = ContextVar('source_classification', default=None)
+
+
+def classify(data: Dict[str, Any]) -> Classification:
+    """
+    Classify a webhook payload, reusing the active classification for the same payload
+
+    Args:
+        data (dict): The raw webhook data
+
+    Returns:
+        Classification: The payload classification
+    """
+    current = _current.get()
+    if current is not None and current._data is data:
+        return current
+    return _classifier.classify(data)
+
+
+def activate(classification: Classification):
+    """Make a classification reusable by classify() until reset() is called with the returned token"""
+    return _current.set(classification)
+
+
+def reset(token):
+    """Deactivate a classification activated with activate()"""
+    _current.reset(token)
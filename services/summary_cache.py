@@ -0,0 +1,252 @@
+"""
+Summary cache service
+
+This module caches the assembled /api/dashboard/summary response so that any
+number of polling dashboards cost one computation per TTL. Entries are tagged
+with an ingest version that is bumped when new webhooks have been ingested,
+so new data invalidates the cache without waiting for the TTL. Invalidations
+mark the cache dirty and the version is bumped at most once every
+SUMMARY_CACHE_MIN_STALENESS seconds, either by the invalidation itself or by
+the next read once the interval has passed, so a steady stream of webhooks
+costs one recomputation per interval rather than one per webhook.
+
+The cache is process-local by default. When SUMMARY_CACHE_REDIS_URL is set and
+the redis package is installed, entries, the ingest version and the dirty flag
+are shared through Redis, and the bump interval is guarded by a key set with
+NX and a PX expiry, so every worker sees the same cache and invalidations.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+SUMMARY_CACHE_TTL = float(os.environ.get('SUMMARY_CACHE_TTL', 30))
+# Shortest time a summary is served after new data before it is recomputed
+SUMMARY_CACHE_MIN_STALENESS = float(os.environ.get('SUMMARY_CACHE_MIN_STALENESS', 2))
+SUMMARY_CACHE_REDIS_URL = os.environ.get('SUMMARY_CACHE_REDIS_URL')
+SUMMARY_CACHE_PREFIX = os.environ.get('SUMMARY_CACHE_PREFIX', 'abex:summary')
+
+
+class SummaryCache:
+    """
+    SummaryCache stores serialized responses keyed by name and ingest version
+    """
+
+    def __init__(self, ttl: float = SUMMARY_CACHE_TTL, redis_url: Optional[str] = SUMMARY_CACHE_REDIS_URL,
+                 prefix: str = SUMMARY_CACHE_PREFIX, min_staleness: float = SUMMARY_CACHE_MIN_STALENESS):
+        """Initialize the cache, connecting to Redis if configured"""
+        self.ttl = ttl
+        self.prefix = prefix
+        self.min_staleness = min_staleness
+        self._entries = {}
+        self._version = 0
+        # Set by invalidate(), cleared when the version is bumped
+        self._dirty = False
+        self._bumped_at = float('-inf')
+        self._lock = threading.Lock()
+        # One lock per key so concurrent misses compute the value only once
+        self._compute_locks = {}
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'invalidations': 0, 'version_bumps': 0, 'errors': 0}
+
+        self._redis = None
+        if redis_url:
+            if redis is None:
+                logger.warning("SUMMARY_CACHE_REDIS_URL is set but the redis package is not installed; "
+                               "using the process-local summary cache")
+            else:
+                self._redis = redis.Redis.from_url(redis_url)
+
+    @property
+    def backend(self) -> str:
+        return 'redis' if self._redis is not None else 'local'
+
+    def version(self) -> int:
+        """Get the current ingest version"""
+        if self._redis is not None:
+            try:
+                return int(self._redis.get(f"{self.prefix}:version") or 0)
+            except Exception as e:
+                self._count('errors')
+                logger.warning(f"Summary cache version lookup failed: {str(e)}")
+        return self._version
+
+    def invalidate(self):
+        """Mark the cache dirty and bump the ingest version if the minimum staleness has passed"""
+        with self._lock:
+            self._dirty = True
+            self._stats['invalidations'] += 1
+
+        if self._redis is not None:
+            try:
+                self._redis.set(f"{self.prefix}:dirty", 1)
+            except Exception as e:
+                self._count('errors')
+                logger.warning(f"Summary cache invalidation failed: {str(e)}")
+
+        self._bump_if_dirty()
+
+    def _bump_if_dirty(self):
+        """Bump the ingest version for pending invalidations, at most once per minimum staleness"""
+        if self._redis is not None:
+            try:
+                self._bump_shared()
+                return
+            except Exception as e:
+                self._count('errors')
+                logger.warning(f"Summary cache invalidation failed: {str(e)}")
+
+        with self._lock:
+            if not self._dirty or time.monotonic() - self._bumped_at < self.min_staleness:
+                return
+            self._dirty = False
+            self._bumped_at = time.monotonic()
+            self._version += 1
+            self._entries.clear()
+            self._stats['version_bumps'] += 1
+
+    def _bump_shared(self):
+        """Bump the Redis ingest version if any worker marked it dirty and no worker bumped it recently"""
+        dirty_key = f"{self.prefix}:dirty"
+        if not self._redis.exists(dirty_key):
+            return
+        # Only one worker per interval gets the guard key; the rest leave the flag for later
+        if not self._redis.set(f"{self.prefix}:bumped", 1, nx=True, px=max(1, int(self.min_staleness * 1000))):
+            return
+        # Clear the flag before bumping so an invalidation racing with the bump is kept
+        self._redis.delete(dirty_key)
+        self._redis.incr(f"{self.prefix}:version")
+        with self._lock:
+            self._dirty = False
+            self._stats['version_bumps'] += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], Tuple[Any, bool]]) -> Tuple[bytes, str]:
+        """
+        Get a cached response body, computing and storing it on a miss
+
+        Args:
+            key (str): Cache key
+            compute (callable): Returns (payload, cacheable); the payload is
+                serialized to JSON and only stored when cacheable is true
+
+        Returns:
+            tuple: (JSON body bytes, ETag)
+        """
+        self._bump_if_dirty()
+        version = self.version()
+        entry = self._get(key, version)
+        if entry is not None:
+            self._count('hits')
+            return entry
+
+        with self._lock:
+            compute_lock = self._compute_locks.setdefault(key, threading.Lock())
+
+        with compute_lock:
+            # Another request may have filled the entry while we waited
+            entry = self._get(key, version)
+            if entry is not None:
+                self._count('hits')
+                return entry
+
+            self._count('misses')
+            payload, cacheable = compute()
+            body = json.dumps(payload, default=str).encode('utf-8')
+            entry = (body, hashlib.sha1(body).hexdigest())
+            if cacheable:
+                self._set(key, version, entry)
+            return entry
+
+    def record_not_modified(self):
+        """Count a request answered with 304 Not Modified"""
+        self._count('not_modified')
+
+    def _get(self, key: str, version: int) -> Optional[Tuple[bytes, str]]:
+        if self._redis is not None:
+            try:
+                cached = self._redis.get(f"{self.prefix}:{key}:{version}")
+                if cached is not None:
+                    etag, _, body = cached.partition(b'\n')
+                    return body, etag.decode('ascii')
+                return None
+            except Exception as e:
+                self._count('errors')
+                logger.warning(f"Summary cache read failed: {str(e)}")
+
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is None:
+            return None
+        cached_version, expires_at, entry = cached
+        if cached_version != version or expires_at < time.monotonic():
+            return None
+        return entry
+
+    def _set(self, key: str, version: int, entry: Tuple[bytes, str]):
+        body, etag = entry
+        if self._redis is not None:
+            try:
+                self._redis.set(f"{self.prefix}:{key}:{version}", etag.encode('ascii') + b'\n' + body,
+                                ex=max(1, int(self.ttl)))
+                return
+            except Exception as e:
+                self._count('errors')
+                logger.warning(f"Summary cache write failed: {str(e)}")
+
+        with self._lock:
+            # Entries computed against an older version are already stale
+            if version == self._version or self._redis is not None:
+                self._entries[key] = (version, time.monotonic() + self.ttl, entry)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and cache configuration"""
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        return {
+            'backend': self.backend,
+            'ttl': self.ttl,
+            'min_staleness': self.min_staleness,
+            'version': self.version(),
+            'entries': entries,
+            'hit_ratio': round(stats['hits'] / lookups, 4) if lookups else 0,
+            **stats
+        }
+
+
+_cache = SummaryCache()
+
+
+def get_cached(key: str, compute: Callable[[], Tuple[Any, bool]]) -> Tuple[bytes, str]:
+    """Get a cached JSON response body and its ETag, computing it on a miss"""
+    return _cache.get_or_compute(key, compute)
+
+
+def invalidate_summary_cache():
+    """Invalidate cached summaries after new data has been ingested"""
+    _cache.invalidate()
+
+
+def record_not_modified():
+    """Count a conditional request answered with 304 Not Modified"""
+    _cache.record_not_modified()
+
+
+def get_summary_cache_stats() -> Dict[str, Any]:
+    """Get statistics for the summary cache"""
+    return _cache.get_stats()
@@ -15,6 +15,12 @@ import uuid
 from functools import wraps
 from typing import Dict, Any, Callable, List
 from services.notification_service import notify_processing_error
+from services.source_classifier import (
+    CRM_SYSTEMS,
+    classify,
+    activate as activate_classification,
+    reset as reset_classification
+)
 
 logger = logging.getLogger(__name__)
 
@@ -53,9 +59,15 @@ def process_webhook(data: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         dict: Processed webhook data
     """
+    # Classify once; the processors reuse the result through classify()
+    classification = None
+    token = None
     try:
+        classification = classify(data)
+        token = activate_classification(classification)
+        
         # Determine the source type of the webhook
-        source_type = determine_source(data)
+        source_type = classification.source
         
         # Find the registered processor for this source type
         processor = _PROCESSOR_REGISTRY.get(source_type)
@@ -91,9 +103,9 @@ def process_webhook(data: Dict[str, Any]) -> Dict[str, Any]:
         logger.error(f"Unexpected error in webhook processing: {str(e)}")
         
         # Determine source type safely
-        try:
-            source_type = determine_source(data)
-        except:
+        if classification is not None:
+            source_type = classification.source
+        else:
             source_type = 'unknown'
         
         # Generate webhook_id
@@ -110,63 +122,25 @@ def process_webhook(data: Dict[str, Any]) -> Dict[str, Any]:
             'error': str(e),
             'original_data': data
         }
+    
+    finally:
+        if token is not None:
+            reset_classification(token)
 
 def determine_source(data: Dict[str, Any]) -> str:
     """
     Determine the source of a webhook based on its content
     
+    The detection rules live in services.source_classifier, which compiles
+    them once into a key index and a single keyword scan.
+    
     Args:
         data (dict): The webhook data
     
     Returns:
         str: The determined source type
     """
-    # First check if the source is explicitly set
-    if 'source' in data:
-        return data['source']
-    
-    # Check for Stripe-specific fields
-    if 'type' in data and data.get('object') == 'event' and 'api_version' in data:
-        return 'stripe'
-    
-    # Check for PayPal-specific fields
-    if 'event_type' in data and 'resource_type' in data and data.get('resource_type') == 'sale':
-        return 'paypal'
-    
-    # Check for Google Analytics webhooks
-    if any(field in data for field in ['tracking_id', 'client_id', 'page_view', 'event_action']):
-        return 'google'
-    
-    # Check for WhatsApp Business API webhooks
-    if 'entry' in data and 'changes' in data.get('entry', [{}])[0] and 'messaging_product' in data.get('entry', [{}])[0].get('changes', [{}])[0]:
-        return 'whatsapp'
-    
-    # Check for Facebook webhooks
-    if 'entry' in data and 'changes' in data.get('entry', [{}])[0] and 'id' in data.get('entry', [{}])[0]:
-        return 'facebook'
-    
-    # Check for Newsletter webhooks - check first to avoid misclassifying as form
-    if any(keyword in str(data).lower() for keyword in ['newsletter', 'subscribe', 'mailing list']):
-        return 'newsletter'
-    
-    # Check for form submission patterns
-    if any(field in data for field in ['name', 'email', 'message', 'phone']):
-        return 'form'
-    
-    # Check for CRM webhooks
-    if any(field in data for field in ['customer', 'lead', 'opportunity', 'contact']):
-        return 'crm'
-    
-    # Check for Shopping Cart webhooks
-    if any(field in data for field in ['cart', 'product', 'order', 'checkout']):
-        return 'cart'
-    
-    # Check for Scanner webhooks
-    if any(field in data for field in ['scan_id', 'extracted_text', 'scan_type', 'scan_data']):
-        return 'scanner'
-    
-    # Default source type
-    return 'other'
+    return classify(data).source
 
 def validate_webhook_signature(request, secret: str) -> bool:
     """
@@ -287,9 +261,12 @@ def process_form_webhook(data: Dict[str, Any]) -> Dict[str, Any]:
             'original_data': data
         }
         
+        # Keyword matches are shared with determine_source for this payload
+        classification = classify(data)
+        
         # Detect newsletter forms based on common patterns
         is_newsletter = False
-        if any(keyword in str(data).lower() for keyword in ['newsletter', 'subscribe', 'mailing list']):
+        if classification.has_keyword('newsletter'):
             processed_data['form_type'] = 'newsletter'
             is_newsletter = True
         
@@ -299,7 +276,7 @@ def process_form_webhook(data: Dict[str, Any]) -> Dict[str, Any]:
             is_newsletter = True
             
         # Detect collection forms based on common patterns
-        if any(keyword in str(data).lower() for keyword in ['collection', 'product_id', 'category', 'product collection']):
+        if classification.has_keyword('collection'):
             processed_data['form_type'] = 'collection_form'
         
         # Check for specific collection form fields
@@ -407,21 +384,11 @@ def process_crm_webhook(data: Dict[str, Any]) -> Dict[str, Any]:
         else:
             processed_data['source_subtype'] = 'unknown'
             
-        # Look for specific CRM systems in the data
-        crm_systems = {
-            'salesforce': ['salesforce', 'sf_', 'sfdc'],
-            'hubspot': ['hubspot', 'hs_'],
-            'zoho': ['zoho', 'zcrm'],
-            'pipedrive': ['pipedrive', 'pd_deal'],
-            'dynamics': ['dynamics', 'ms_crm', 'mscrm']
-        }
-        
-        data_str = str(data).lower()
-        for system, keywords in crm_systems.items():
-            if any(keyword in data_str for keyword in keywords):
-                processed_data['crm_type'] = system
-                processed_data['source_subtype'] = system
-                break
+        # Look for specific CRM systems in the data (keywords in source_classifier.KEYWORD_GROUPS)
+        system = classify(data).first_group(CRM_SYSTEMS)
+        if system:
+            processed_data['crm_type'] = system
+            processed_data['source_subtype'] = system
         
         return processed_data
     
@@ -0,0 +1,245 @@
+"""
+Write batcher service
+
+This module provides a write-behind batcher that group-commits rows from
+concurrent callers. Rows are collected from a queue and flushed in one
+multi-row INSERT per model and a single transaction, either when the batch
+reaches WRITE_BATCH_MAX_ROWS rows or WRITE_BATCH_MAX_DELAY_MS after the first
+row arrived, whichever comes first. Every submitted row gets a Future that
+resolves once its transaction has committed.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from typing import Callable, Dict, Any, List, Tuple
+
+from sqlalchemy import insert
+
+from app import app, db
+
+logger = logging.getLogger(__name__)
+
+# Batching configuration
+WRITE_BATCH_ENABLED = os.environ.get('WRITE_BATCH_ENABLED', 'true').lower() == 'true'
+WRITE_BATCH_MAX_ROWS = int(os.environ.get('WRITE_BATCH_MAX_ROWS', 500))
+WRITE_BATCH_MAX_DELAY_MS = float(os.environ.get('WRITE_BATCH_MAX_DELAY_MS', 10))
+# Submitting blocks once this many rows are waiting, so a stalled database applies backpressure
+WRITE_BATCH_QUEUE_SIZE = int(os.environ.get('WRITE_BATCH_QUEUE_SIZE', 10000))
+# How long callers wait for their row to be committed
+WRITE_BATCH_ACK_TIMEOUT = float(os.environ.get('WRITE_BATCH_ACK_TIMEOUT', 30))
+
+
+class WriteBatcher:
+    """
+    WriteBatcher collects model rows from concurrent callers and commits them in batches
+    """
+
+    def __init__(self, max_rows: int = WRITE_BATCH_MAX_ROWS, max_delay_ms: float = WRITE_BATCH_MAX_DELAY_MS,
+                 queue_size: int = WRITE_BATCH_QUEUE_SIZE):
+        """Initialize the batcher"""
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000.0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'flushes': 0, 'rows': 0, 'failed_rows': 0, 'max_batch': 0, 'total_flush_ms': 0.0}
+
+    def submit(self, model, row: Dict[str, Any]) -> Future:
+        """
+        Queue a row for insertion
+
+        Args:
+            model: The SQLAlchemy model class to insert into
+            row (dict): Column values for the new row
+
+        Returns:
+            Future: Resolves to True once the row is committed
+        """
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((model, row, future))
+        return future
+
+    def _ensure_thread(self):
+        """Start the flusher thread for this process if it isn't running yet"""
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="write-batcher", daemon=True)
+            self._thread.start()
+            self._thread_pid = os.getpid()
+
+    def _run(self):
+        """Collect rows into batches and flush them"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Rows given up on by their callers are dropped; the rest can no longer be cancelled
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                self._flush(batch)
+            except Exception as e:
+                logger.error(f"Write batcher flush failed: {str(e)}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _flush(self, batch: List[Tuple]):
+        """Write a batch in a single transaction, falling back to row-by-row on failure"""
+        start = time.perf_counter()
+
+        with app.app_context():
+            try:
+                _insert_rows(batch)
+                db.session.commit()
+                for _, _, future in batch:
+                    future.set_result(True)
+
+            except Exception as e:
+                db.session.rollback()
+                if len(batch) == 1:
+                    raise
+
+                # Isolate the bad rows so they don't fail the whole batch
+                logger.warning(f"Batch insert of {len(batch)} rows failed, retrying individually: {str(e)}")
+                for item in batch:
+                    try:
+                        _insert_rows([item])
+                        db.session.commit()
+                        item[2].set_result(True)
+                    except Exception as row_error:
+                        db.session.rollback()
+                        item[2].set_exception(row_error)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        failed = sum(1 for _, _, future in batch if future.exception() is not None)
+        with self._stats_lock:
+            self._stats['flushes'] += 1
+            self._stats['rows'] += len(batch)
+            self._stats['failed_rows'] += failed
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+            self._stats['total_flush_ms'] += elapsed_ms
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get flush counters and batch size statistics"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        flushes = stats.pop('flushes')
+        total_flush_ms = stats.pop('total_flush_ms')
+        return {
+            'enabled': WRITE_BATCH_ENABLED,
+            'max_rows': self.max_rows,
+            'max_delay_ms': self.max_delay * 1000,
+            'queued': self._queue.qsize(),
+            'flushes': flushes,
+            'avg_batch': round(stats['rows'] / flushes, 2) if flushes else 0,
+            'avg_flush_ms': round(total_flush_ms / flushes, 3) if flushes else 0,
+            **stats
+        }
+
+
+_insert_hooks = {}
+
+
+def register_insert_hook(model, hook: Callable[[List[Dict[str, Any]]], None]):
+    """
+    Run hook(rows) inside the inserting transaction whenever rows of a model are written
+
+    Used to keep derived tables (such as rollups) consistent with the rows they summarize.
+    """
+    _insert_hooks.setdefault(model, []).append(hook)
+
+
+def run_insert_hooks(model, rows: List[Dict[str, Any]]):
+    """Run the insert hooks of a model for rows written outside the batcher (the caller commits)"""
+    for hook in _insert_hooks.get(model, []):
+        hook(rows)
+
+
+def _insert_rows(batch: List[Tuple]):
+    """Issue one multi-row INSERT per model, keeping the models in first-seen order"""
+    rows_by_model = {}
+    for model, row, _ in batch:
+        rows_by_model.setdefault(model, []).append(row)
+
+    # Dict insertion order keeps parents (webhook_data) ahead of children (notifications)
+    for model, rows in rows_by_model.items():
+        db.session.execute(insert(model), rows)
+        run_insert_hooks(model, rows)
+
+
+_batcher = WriteBatcher()
+
+
+def submit_row(model, row: Dict[str, Any]) -> Future:
+    """
+    Queue a row for a group-committed insert
+
+    When batching is disabled the row is inserted and committed immediately in
+    the caller's session and an already completed Future is returned.
+
+    Args:
+        model: The SQLAlchemy model class to insert into
+        row (dict): Column values for the new row
+
+    Returns:
+        Future: Resolves to True once the row is committed
+    """
+    if WRITE_BATCH_ENABLED:
+        return _batcher.submit(model, row)
+
+    future = Future()
+    try:
+        _insert_rows([(model, row, future)])
+        db.session.commit()
+        future.set_result(True)
+    except Exception as e:
+        db.session.rollback()
+        future.set_exception(e)
+    return future
+
+
+def write_row(model, row: Dict[str, Any]) -> bool:
+    """
+    Insert a row and wait until it has been committed
+
+    Raises the insert error if the row could not be written, or TimeoutError
+    if it was not written within WRITE_BATCH_ACK_TIMEOUT. A row that times out
+    while it is still queued is withdrawn, so it will never be written; one
+    that is already being flushed is waited for, so the caller never falls
+    back to writing a row that may still be committed.
+    """
+    future = submit_row(model, row)
+    try:
+        return future.result(timeout=WRITE_BATCH_ACK_TIMEOUT)
+    except TimeoutError:
+        if future.cancel():
+            raise
+        logger.warning(f"{model.__tablename__} row is still being flushed after {WRITE_BATCH_ACK_TIMEOUT}s, waiting for it")
+        return future.result()
+
+
+def get_batcher_stats() -> Dict[str, Any]:
+    """Get statistics for the write batcher"""
+    return _batcher.get_stats()
@@ -4,6 +4,10 @@
  * This script manages data loading, filtering, and display for the dashboard page.
  */
 
+// The unfiltered summary currently displayed; live deltas are applied to it.
+// Null while filters are applied, so live updates don't mix into filtered views.
+let dashboardState = null;
+
 document.addEventListener('DOMContentLoaded', function() {
     // Load dashboard data initially
     loadDashboardData();
@@ -11,8 +15,10 @@ document.addEventListener('DOMContentLoaded', function() {
     // Set up event listeners
     setupEventListeners();
     
-    // Refresh data automatically every 60 seconds
-    setInterval(loadDashboardData, 60000);
+    // Receive new webhooks as live deltas; the full summary is only refetched
+    // occasionally as a safety net, or every 60 seconds without EventSource
+    const liveUpdates = connectEventStream();
+    setInterval(loadDashboardData, liveUpdates ? 300000 : 60000);
 });
 
 /**
@@ -20,10 +26,9 @@ document.addEventListener('DOMContentLoaded', function() {
  */
 function loadDashboardData() {
     try {
-        // Add a timestamp parameter to avoid caching issues
-        const timestamp = new Date().getTime();
-        
-        fetch(`/api/dashboard/summary?_=${timestamp}`)
+        // Revalidate with the server's ETag on every poll; an unchanged
+        // summary comes back as 304 and is served from the browser cache
+        fetch('/api/dashboard/summary', { cache: 'no-cache' })
             .then(response => {
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
@@ -48,6 +53,7 @@ function loadDashboardData() {
                 
                 // Process data
                 const dashboardData = data.data;
+                dashboardState = dashboardData;
                 
                 // Update components with data
                 updateStats(dashboardData);
@@ -101,6 +107,103 @@ function loadDashboardData() {
     }
 }
 
+/**
+ * Subscribe to live dashboard events
+ *
+ * Returns false when the browser has no EventSource support.
+ */
+function connectEventStream() {
+    if (!window.EventSource) {
+        return false;
+    }
+    
+    // EventSource reconnects by itself and resumes from the last event ID
+    const source = new EventSource('/api/stream/events');
+    
+    source.addEventListener('webhook', function(event) {
+        try {
+            applyWebhookDelta(JSON.parse(event.data));
+        } catch (error) {
+            console.error('Error applying live update:', error);
+        }
+    });
+    
+    // Sent when events were missed, e.g. after a server restart
+    source.addEventListener('resync', function() {
+        if (dashboardState) {
+            loadDashboardData();
+        }
+    });
+    
+    source.onerror = function() {
+        console.warn('Live update stream interrupted, reconnecting');
+    };
+    
+    return true;
+}
+
+/**
+ * Apply a live 'webhook' delta to the displayed summary
+ */
+function applyWebhookDelta(delta) {
+    if (!dashboardState || !delta) {
+        return;
+    }
+    
+    // Counters
+    const counts = delta.counts || {};
+    dashboardState.source_counts = dashboardState.source_counts || {};
+    for (const source in counts) {
+        if (Object.prototype.hasOwnProperty.call(counts, source)) {
+            dashboardState.source_counts[source] = (dashboardState.source_counts[source] || 0) + counts[source];
+            dashboardState.total_webhooks = (dashboardState.total_webhooks || 0) + counts[source];
+        }
+    }
+    
+    // Chart: bump the new record's day for its source
+    const record = delta.record;
+    const chartData = dashboardState.chart_data;
+    if (record && chartData && Array.isArray(chartData.labels)) {
+        const day = String(record.timestamp || '').substring(0, 10);
+        const dayIndex = chartData.labels.indexOf(day);
+        if (dayIndex !== -1) {
+            const source = record.source || 'other';
+            const label = source.charAt(0).toUpperCase() + source.slice(1);
+            let dataset = chartData.datasets.find(item => item.label === label);
+            if (!dataset) {
+                dataset = {
+                    label: label,
+                    data: chartData.labels.map(() => 0),
+                    backgroundColor: getSourceColor(source),
+                    borderColor: getSourceColor(source),
+                    fill: false
+                };
+                chartData.datasets.push(dataset);
+            }
+            dataset.data[dayIndex] = (Number(dataset.data[dayIndex]) || 0) + 1;
+        }
+    }
+    
+    // Latest records
+    if (record) {
+        dashboardState.latest_records = [record].concat(dashboardState.latest_records || []).slice(0, 5);
+    }
+    
+    // Notifications
+    if (delta.notification) {
+        dashboardState.notifications = [delta.notification].concat(dashboardState.notifications || []).slice(0, 5);
+        if (typeof updateNotificationBadge === 'function') {
+            const badge = document.querySelector('.notification-badge');
+            const shown = badge && badge.style.display !== 'none' ? Number(badge.textContent) || 0 : 0;
+            updateNotificationBadge(shown + 1);
+        }
+    }
+    
+    updateStats(dashboardState);
+    updateCharts(chartData || { labels: [], datasets: [] });
+    updateRecentData(dashboardState.latest_records);
+}
+
 /**
  * Update dashboard statistics
  */
@@ -385,52 +488,32 @@ function applyFilters() {
         if (dateFrom) params.append('from', dateFrom + 'T00:00:00');
         if (dateTo) params.append('to', dateTo + 'T23:59:59');
         
-        // Fetch filtered data with a timeout
-        const fetchTimeout = setTimeout(() => {
-            showFilterError('Request timed out. Please try again.');
-        }, 15000); // 15 second timeout
+        // Source filtering happens on the server
+        if (selectedSources.length > 0) params.append('source', selectedSources.join(','));
         
-        fetch(`/api/webhook/data?${params.toString()}`)
-            .then(response => {
+        // Fetch filtered data with a timeout; aborting stops the requests too
+        const controller = new AbortController();
+        const fetchTimeout = setTimeout(() => controller.abort(), 15000); // 15 second timeout
+        
+        fetchFilteredDashboard(params, controller.signal)
+            .then(data => {
                 clearTimeout(fetchTimeout);
                 
-                if (!response.ok) {
-                    throw new Error(`HTTP error! Status: ${response.status}`);
-                }
-                return response.json();
-            })
-            .then(data => {
                 // Hide loading state
                 showFilterLoading(false);
                 
-                // Check for valid response structure
-                if (!data || data.status !== 'success' || !Array.isArray(data.data)) {
-                    throw new Error('Invalid data format received from API');
-                }
-                
-                // Filter by selected sources client-side
-                let filteredData = data.data;
-                if (selectedSources.length > 0) {
-                    filteredData = data.data.filter(item => 
-                        item && item.source && selectedSources.includes(item.source)
-                    );
-                }
+                // Pause live updates until the filters are reset
+                dashboardState = null;
                 
-                // Create chart data
-                const chartData = transformDataForCharts(filteredData);
-                
-                // Update UI with filtered data
-                updateStats({
-                    total_webhooks: filteredData.length,
-                    source_counts: countBySource(filteredData)
-                });
-                updateCharts(chartData);
-                updateRecentData(filteredData.slice(0, 5));
+                // Totals and chart series are aggregated on the server
+                updateStats(data.stats);
+                updateCharts(data.stats.chart_data);
+                updateRecentData(data.latest);
                 
                 // Update filter success message
                 const filterMessageEl = document.getElementById('filter-message');
                 if (filterMessageEl) {
-                    if (filteredData.length === 0) {
+                    if (data.stats.total_webhooks === 0) {
                         filterMessageEl.className = 'alert alert-info mt-3';
                         filterMessageEl.textContent = 'No data found for the selected filters';
                         filterMessageEl.style.display = 'block';
@@ -445,7 +528,11 @@ function applyFilters() {
                 
                 // Hide loading, show error
                 showFilterLoading(false);
-                showFilterError('Failed to apply filters: ' + error.message);
+                if (error.name === 'AbortError') {
+                    showFilterError('Request timed out. Please try again.');
+                } else {
+                    showFilterError('Failed to apply filters: ' + error.message);
+                }
                 
                 console.error('Error applying filters:', error);
                 
@@ -461,6 +548,39 @@ function applyFilters() {
     }
 }
 
+/**
+ * Fetch the dashboard stats and latest records for the given filter parameters
+ *
+ * Totals, per-source counts and chart series come from the server-side
+ * aggregate; only the first page of records is fetched, for the latest
+ * records table.
+ */
+function fetchFilteredDashboard(params, signal) {
+    function fetchJson(url) {
+        return fetch(url, { signal })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! Status: ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(result => {
+                if (!result || result.status !== 'success' || !result.data) {
+                    throw new Error('Invalid data format received from API');
+                }
+                return result.data;
+            });
+    }
+    
+    const pageParams = new URLSearchParams(params);
+    pageParams.set('page_size', '5');
+    
+    return Promise.all([
+        fetchJson(`/api/dashboard/stats?${params.toString()}`),
+        fetchJson(`/api/webhook/data?${pageParams.toString()}`)
+    ]).then(([stats, latest]) => ({ stats, latest }));
+}
+
 /**
  * Show or hide the filter loading state
  */
@@ -563,83 +683,6 @@ function getDateRangeFromOption(option) {
     };
 }
 
-/**
- * Transform data for charts
- */
-function transformDataForCharts(data) {
-    // Get the dates for the last 7 days
-    const today = new Date();
-    const dates = [];
-    
-    for (let i = 6; i >= 0; i--) {
-        const date = new Date(today);
-        date.setDate(date.getDate() - i);
-        dates.push(date.toISOString().split('T')[0]);
-    }
-    
-    // Initialize source data
-    const sources = {};
-    
-    // Count data by date and source
-    data.forEach(item => {
-        // Extract timestamp and convert to date
-        let timestamp;
-        try {
-            timestamp = new Date(item.timestamp).toISOString().split('T')[0];
-        } catch (e) {
-            return;
-        }
-        
-        const source = item.source || 'other';
-        
-        // Initialize source if not exists
-        if (!sources[source]) {
-            sources[source] = {};
-            dates.forEach(date => {
-                sources[source][date] = 0;
-            });
-        }
-        
-        // Increment count if timestamp is in the last 7 days
-        if (dates.includes(timestamp)) {
-            sources[source][timestamp]++;
-        }
-    });
-    
-    // Format for Chart.js
-    const chartData = {
-        labels: dates,
-        datasets: []
-    };
-    
-    // Create datasets for each source
-    for (const source in sources) {
-        chartData.datasets.push({
-            label: source.charAt(0).toUpperCase() + source.slice(1),
-            data: dates.map(date => sources[source][date]),
-            backgroundColor: getSourceColor(source),
-            borderColor: getSourceColor(source),
-            fill: false
-        });
-    }
-    
-    return chartData;
-}
-
-/**
- * Count data by source
- */
-function countBySource(data) {
-    const counts = {};
-    
-    data.forEach(item => {
-        const source = item.source || 'other';
-        counts[source] = (counts[source] || 0) + 1;
-    });
-    
-    return counts;
-}
-
 /**
  * Get color for a specific source
  */
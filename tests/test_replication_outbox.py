@@ -0,0 +1,98 @@
+"""
+Tests for the replication outbox cursor
+
+Outbox rows inserted by concurrent transactions can commit out of sequence
+order. These tests insert outbox rows with explicit sequence numbers to
+reproduce that, and check that a late row is still shipped and is not
+pruned before it is.
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+WORK_DIR = tempfile.mkdtemp(prefix='test_replication_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORK_DIR, 'test.db')}"
+os.environ['INGEST_QUEUE_PATH'] = os.path.join(WORK_DIR, 'ingest_queue.db')
+os.environ['CONFIG_VERSION_PATH'] = os.path.join(WORK_DIR, 'config_version')
+os.environ['REPLICATION_ENABLED'] = 'false'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db  # noqa: E402
+from models import ExternalStorage, ReplicationCursor, ReplicationOutbox, WebhookData  # noqa: E402
+from services import replication_service  # noqa: E402
+from services.config_cache import invalidate_config_cache  # noqa: E402
+
+
+@pytest.fixture
+def storage_dir():
+    directory = tempfile.mkdtemp(dir=WORK_DIR)
+    with app.app_context():
+        db.session.execute(db.delete(ReplicationOutbox))
+        db.session.execute(db.delete(ReplicationCursor))
+        db.session.execute(db.delete(ExternalStorage))
+        db.session.execute(db.delete(WebhookData))
+        db.session.add(ExternalStorage('file', 'test files', enabled=True, config={'directory': directory}))
+        db.session.commit()
+        invalidate_config_cache()
+        yield directory
+
+
+def add_webhook(seq):
+    """Commit a webhook and its outbox row with a chosen sequence number"""
+    webhook_id = f"00000000-0000-0000-0000-{seq:012d}"
+    db.session.add(WebhookData(webhook_id, datetime.utcnow(), 'test', {'seq': seq}))
+    db.session.add(ReplicationOutbox(seq=seq, webhook_id=webhook_id, created_at=datetime.utcnow()))
+    db.session.commit()
+    return webhook_id
+
+
+def shipped_ids(directory):
+    return {name.rsplit('_', 1)[1][:-len('.json')] for name in os.listdir(directory)}
+
+
+def cursor():
+    db.session.expire_all()
+    return db.session.query(ReplicationCursor).one()
+
+
+def test_late_commit_is_shipped_and_not_pruned(storage_dir):
+    worker = replication_service.ReplicationWorker()
+    first = add_webhook(1)
+    worker.run_once()
+
+    # Sequence number 2 is taken by a transaction that commits after 3
+    third = add_webhook(3)
+    worker.run_once()
+    assert shipped_ids(storage_dir) == {first, third}
+    assert cursor().last_seq == 1
+    assert cursor().max_seq == 3
+    assert set(cursor().gaps) == {'2'}
+
+    second = add_webhook(2)
+    assert db.session.get(ReplicationOutbox, 2) is not None
+    worker.run_once()
+    assert shipped_ids(storage_dir) == {first, second, third}
+    assert cursor().last_seq == 3
+    assert not cursor().gaps
+    assert db.session.query(ReplicationOutbox).count() == 0
+
+
+def test_gap_is_given_up_after_timeout(storage_dir):
+    worker = replication_service.ReplicationWorker()
+    add_webhook(1)
+    worker.run_once()
+    add_webhook(3)
+    worker.run_once()
+    assert cursor().last_seq == 1
+
+    # Sequence number 2 was rolled back and never appears
+    stale = (datetime.utcnow() - timedelta(seconds=replication_service.REPLICATION_GAP_TIMEOUT + 1)).isoformat()
+    cursor().gaps = {'2': stale}
+    db.session.commit()
+    worker.run_once()
+    assert not cursor().gaps
+    assert cursor().last_seq == 3
+    assert db.session.query(ReplicationOutbox).count() == 0
@@ -3,14 +3,67 @@ from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# Default colors for sources
+CHART_COLORS = {
+    'crm': '#4CAF50',
+    'form': '#2196F3',
+    'email': '#F44336',
+    'stripe': '#6772E5', 
+    'paypal': '#003087',
+    'cart': '#FF9800',
+    'google': '#EA4335',
+    'whatsapp': '#25D366',
+    'facebook': '#1877F2',
+    'other': '#9C27B0'
+}
+
+def chart_dates(days=7):
+    """
+    Get the chart labels: the last `days` dates as YYYY-MM-DD, oldest first
+    """
+    today = datetime.now().date()
+    return [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days - 1, -1, -1)]
+
+def format_chart_data(dates, source_counts):
+    """
+    Format per-source daily counts for Chart.js
+    
+    Args:
+        dates (list): Chart labels as YYYY-MM-DD strings
+        source_counts (dict): Source -> {date: count}; every source gets a
+            dataset, with zero for dates it has no counts for
+    
+    Returns:
+        dict: Chart.js labels and datasets
+    """
+    chart_data = {
+        'labels': dates,
+        'datasets': []
+    }
+    
+    # Create datasets for each source
+    for source, date_counts in source_counts.items():
+        dataset = {
+            'label': source.capitalize(),
+            'data': [date_counts.get(date, 0) for date in dates],
+            'backgroundColor': CHART_COLORS.get(source, '#888888'),
+            'borderColor': CHART_COLORS.get(source, '#888888'),
+            'fill': False
+        }
+        chart_data['datasets'].append(dataset)
+    
+    return chart_data
+
 def transform_for_charts(data):
     """
     Transform webhook data for chart visualization
+    
+    Counts rows in Python; the dashboard uses the rollup-backed
+    get_webhook_chart_data() instead of loading every row.
     """
     try:
         # Get the dates for the last 7 days
-        today = datetime.now().date()
-        dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(6, -1, -1)]
+        dates = chart_dates(7)
         
         # Initialize source data
         sources = {}
@@ -39,37 +92,7 @@ def transform_for_charts(data):
                 sources[source][timestamp] += 1
         
         # Format for Chart.js
-        chart_data = {
-            'labels': dates,
-            'datasets': []
-        }
-        
-        # Default colors for sources
-        colors = {
-            'crm': '#4CAF50',
-            'form': '#2196F3',
-            'email': '#F44336',
-            'stripe': '#6772E5', 
-            'paypal': '#003087',
-            'cart': '#FF9800',
-            'google': '#EA4335',
-            'whatsapp': '#25D366',
-            'facebook': '#1877F2',
-            'other': '#9C27B0'
-        }
-        
-        # Create datasets for each source
-        for source, date_counts in sources.items():
-            dataset = {
-                'label': source.capitalize(),
-                'data': [date_counts[date] for date in dates],
-                'backgroundColor': colors.get(source, '#888888'),
-                'borderColor': colors.get(source, '#888888'),
-                'fill': False
-            }
-            chart_data['datasets'].append(dataset)
-        
-        return chart_data
+        return format_chart_data(dates, sources)
     
     except Exception as e:
         logger.error(f"Error transforming data for charts: {str(e)}")
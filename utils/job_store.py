@@ -0,0 +1,245 @@
+"""
+Job store
+
+File-backed state for background jobs run in a process pool. Each job is a
+JSON file replaced atomically on every update, so any server process (and the
+pool workers themselves) can create, update and report on any job without
+shared memory. Read-modify-write updates hold a lock file in the store's
+directory, so updates from the server and from pool workers don't overwrite
+each other.
+"""
+import importlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def new_job_id() -> str:
+    """Generate a job ID"""
+    return uuid.uuid4().hex
+
+
+def pid_alive(pid: Optional[int]) -> bool:
+    """Check whether a process is still running"""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    """
+    JobStore keeps one JSON state file per job in a directory
+    """
+
+    def __init__(self, directory: str, name: str = 'job'):
+        """
+        Initialize the store
+
+        Args:
+            directory (str): Directory for the state files (created on first write)
+            name (str): Job kind, used in error messages
+        """
+        self.directory = directory
+        self.name = name
+        self._lock = threading.Lock()
+
+    def path(self, job_id: str, suffix: str = '.json') -> str:
+        """Get the path of a file belonging to a job"""
+        return os.path.join(self.directory, f"{job_id}{suffix}")
+
+    @contextmanager
+    def _locked(self):
+        """Hold the store's lock across threads and, where supported, across processes"""
+        with self._lock:
+            if not FCNTL_AVAILABLE:
+                yield
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self, job_id: str) -> Dict[str, Any]:
+        with open(self.path(job_id)) as f:
+            return json.load(f)
+
+    def save(self, job: Dict[str, Any]):
+        """Atomically write a job's state file"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(job['id'])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the state of a job
+
+        Running jobs whose worker process has died, and queued jobs whose
+        submitting server process has died (taking the queued work with it),
+        are reported as failed.
+
+        Returns:
+            dict: The job state, or None if there is no such job
+        """
+        if not _JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        try:
+            job = self._load(job_id)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if self._orphaned(job):
+            with self._locked():
+                # Checked again under the lock, in case a worker has just picked the job up
+                job = self._load(job_id)
+                if self._orphaned(job):
+                    error = (f"{self.name.capitalize()} worker exited unexpectedly" if job['status'] == 'running'
+                             else f"Server process exited before the {self.name} started")
+                    job.update(status='failed', error=error, finished_at=datetime.now().isoformat())
+                    self.save(job)
+        return job
+
+    @staticmethod
+    def _orphaned(job: Dict[str, Any]) -> bool:
+        """Check whether the process responsible for an unfinished job has died"""
+        if job.get('status') == 'running':
+            return not pid_alive(job.get('pid'))
+        # Jobs saved before submitter_pid was recorded can't be checked
+        return job.get('status') == 'queued' and bool(job.get('submitter_pid')) and not pid_alive(job['submitter_pid'])
+
+    def update(self, job_id: str, **changes) -> Dict[str, Any]:
+        """Apply changes to a job's state and return the new state"""
+        with self._locked():
+            job = self._load(job_id)
+            job.update(changes)
+            self.save(job)
+        return job
+
+    def start(self, job_id: str, **changes) -> Optional[Dict[str, Any]]:
+        """
+        Mark a queued job running in the calling worker process
+
+        Returns:
+            dict: The new state, or None if the job is no longer queued
+                (for example because it was failed as orphaned)
+        """
+        with self._locked():
+            job = self._load(job_id)
+            if job.get('status') != 'queued':
+                return None
+            job.update(status='running', pid=os.getpid(), started_at=datetime.now().isoformat(), **changes)
+            self.save(job)
+        return job
+
+    def finish(self, job_id: str, status: str, **changes) -> Dict[str, Any]:
+        """Mark a job completed or failed"""
+        return self.update(job_id, status=status, finished_at=datetime.now().isoformat(), **changes)
+
+    def cleanup(self, retention_hours: float, suffixes=('.json',)) -> int:
+        """
+        Remove finished jobs older than the retention period
+
+        Args:
+            retention_hours (float): Hours a finished job is kept
+            suffixes (tuple): Files of each job to remove; '.json' should come last
+
+        Returns:
+            int: Number of jobs removed
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+
+        cutoff = (datetime.now() - timedelta(hours=retention_hours)).isoformat()
+        removed = 0
+        for name in os.listdir(self.directory):
+            job_id, _, suffix = name.partition('.')
+            if suffix != 'json' or not _JOB_ID_PATTERN.match(job_id):
+                continue
+            job = self.get(job_id)
+            # Records without a status (such as job groups) expire from their creation
+            finished_at = job.get('finished_at') or job.get('created_at') if job else None
+            if job is None or job.get('status') in ACTIVE_STATUSES or (finished_at or '') > cutoff:
+                continue
+            for path_suffix in suffixes:
+                try:
+                    os.remove(self.path(job_id, path_suffix))
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        return removed
+
+
+class WorkerPool:
+    """
+    WorkerPool lazily creates a process pool per server process
+
+    Workers are spawned rather than forked: by the time the pool is created the
+    server process is running background threads, and a forked child can
+    inherit a lock one of them was holding and deadlock. Spawned workers import
+    the application afresh, which leaves the background workers to the server.
+    """
+
+    def __init__(self, workers: int, initializer: Optional[Callable[[], None]] = None, preload: Tuple[str, ...] = ()):
+        """
+        Initialize the pool settings; no processes are started yet
+
+        Args:
+            workers (int): Worker processes
+            initializer (callable, optional): Called in each worker once it has started
+            preload (tuple): Modules each worker imports first, in the order the server
+                imports them, before any job function is unpickled
+        """
+        self.workers = workers
+        self.initializer = initializer
+        self.preload = preload
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        """Submit a call to the pool, creating the pool in this process on first use"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=_init_pool_worker,
+                                                     initargs=(self.preload, self.initializer))
+                self._pid = os.getpid()
+            executor = self._executor
+        return executor.submit(fn, *args, **kwargs)
+
+
+def _init_pool_worker(preload: Tuple[str, ...], initializer: Optional[Callable[[], None]]):
+    """Import the preloaded modules in a new worker, then run the pool's initializer"""
+    for module in preload:
+        importlib.import_module(module)
+    if initializer is not None:
+        initializer()
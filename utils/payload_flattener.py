@@ -0,0 +1,237 @@
+"""
+Payload flattener
+
+Schema-driven flattening of webhook payloads into tabular rows. The key
+structure ("shape") of a payload is recorded once; an export then derives its
+columns from the shapes it may encounter and compiles them into a key lookup
+table, so each row is flattened with dictionary lookups straight into a list in
+column order instead of building prefixed key strings for every value.
+
+Columns follow flatten_webhook_item() in services.export_service: top-level
+payload fields become `data_<key>`, and the `contact_info`, `entity_data` and
+`submission_data` structures the processors emit become `contact_<key>`,
+`entity_<key>` and `submission_<key>`. With a depth above 1, nested objects are
+expanded into dotted paths (`data_metadata.ip`) down to that depth. A `data`
+column holds the whole payload as JSON, for payloads whose shapes were not
+recorded.
+"""
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Deepest nesting recorded in a shape and accepted as a flatten depth
+FLATTEN_MAX_DEPTH = 4
+
+BASE_COLUMNS = ('id', 'timestamp', 'source')
+# Column holding the whole payload as JSON
+PAYLOAD_COLUMN = 'data'
+
+# Payload key -> (column prefix, whether nested objects and lists are kept as strings)
+SECTIONS = {
+    'contact_info': ('contact_', True),
+    'entity_data': ('entity_', False),
+    'submission_data': ('submission_', False),
+}
+DATA_PREFIX = 'data_'
+# Top-level payload keys never exported as columns
+SKIPPED_KEYS = ('original_data',)
+
+# Shape leaf markers; expanded objects are stored as nested dicts
+SCALAR = 0
+CONTAINER = 1
+
+
+def _shape(value: Dict[str, Any], levels: int) -> Dict[str, Any]:
+    shape = {}
+    for key, item in value.items():
+        if isinstance(item, dict) and levels > 1:
+            shape[key] = _shape(item, levels - 1)
+        elif isinstance(item, (dict, list)):
+            shape[key] = CONTAINER
+        else:
+            shape[key] = SCALAR
+    return shape
+
+
+def payload_shape(payload: Any) -> Dict[str, Any]:
+    """
+    Get the key structure of a webhook payload
+
+    Args:
+        payload: The webhook payload
+
+    Returns:
+        dict: Key -> SCALAR, CONTAINER or the nested shape of an object,
+            recorded FLATTEN_MAX_DEPTH levels below the payload and each section
+    """
+    if not isinstance(payload, dict):
+        return {}
+    # One extra level so section fields are recorded as deep as top-level fields
+    return _shape({key: value for key, value in payload.items() if key not in SKIPPED_KEYS},
+                  FLATTEN_MAX_DEPTH + 1)
+
+
+def shape_hash(shape: Dict[str, Any]) -> str:
+    """Get a stable hash identifying a shape"""
+    return hashlib.sha1(json.dumps(shape, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def _sections(shape: Dict[str, Any]):
+    """Split a payload shape into (section key, prefix, stringify, fields); None is the top level"""
+    data = {key: sub for key, sub in shape.items()
+            if key not in SKIPPED_KEYS and not (key in SECTIONS and isinstance(sub, dict))}
+    yield None, DATA_PREFIX, False, data
+    for key, (prefix, stringify) in SECTIONS.items():
+        if isinstance(shape.get(key), dict):
+            yield key, prefix, stringify, shape[key]
+
+
+def _fields(shape: Dict[str, Any], depth: int, stringify: bool, prefix: str, path: Tuple[str, ...] = ()):
+    """Yield (key path, column name) for every exported field of a section shape"""
+    for key, sub in shape.items():
+        name = prefix + key
+        if isinstance(sub, dict) and depth > 1:
+            yield from _fields(sub, depth - 1, stringify, name + '.', path + (key,))
+        elif sub == SCALAR or stringify:
+            yield path + (key,), name
+
+
+def shape_columns(shapes: Iterable[Dict[str, Any]], depth: int = 1) -> List[str]:
+    """
+    Get the sorted union of the columns produced by a set of payload shapes
+
+    Args:
+        shapes (iterable): Payload shapes from payload_shape()
+        depth (int): Levels of nested objects to expand into dotted columns
+
+    Returns:
+        list: Sorted column names, empty if there are no shapes
+    """
+    columns = set()
+    for shape in shapes:
+        columns.update(BASE_COLUMNS)
+        for _, prefix, stringify, fields in _sections(shape):
+            columns.update(name for _, name in _fields(fields, depth, stringify, prefix))
+    return sorted(columns)
+
+
+class PayloadFlattener:
+    """
+    PayloadFlattener turns webhook data dictionaries into rows for a fixed list of columns
+
+    The lookup tables are compiled once from the payload shapes, so flattening
+    a row costs one dictionary lookup per payload field. Fields that belong to
+    none of the columns are skipped.
+    """
+
+    def __init__(self, columns: List[str], shapes: Iterable[Dict[str, Any]], depth: int = 1):
+        """
+        Compile the lookup tables
+
+        Args:
+            columns (list): Output columns, in order
+            shapes (iterable): Payload shapes the rows may have
+            depth (int): Levels of nested objects to expand into dotted columns
+        """
+        self.columns = list(columns)
+        self.depth = depth
+        index = {column: i for i, column in enumerate(self.columns)}
+        self._base = [(column, index[column]) for column in BASE_COLUMNS if column in index]
+        self._payload_index = index.get(PAYLOAD_COLUMN)
+
+        # Section key -> (trie, stringify); a trie maps key -> [column index, child trie]
+        tries = {}
+        for shape in shapes:
+            for section, prefix, stringify, fields in _sections(shape):
+                trie = tries.setdefault(section, ({}, stringify))[0]
+                for path, name in _fields(fields, depth, stringify, prefix):
+                    column_index = index.get(name)
+                    if column_index is None:
+                        continue
+                    node = trie
+                    for key in path[:-1]:
+                        node = node.setdefault(key, [None, None])
+                        if node[1] is None:
+                            node[1] = {}
+                        node = node[1]
+                    node.setdefault(path[-1], [None, None])[0] = column_index
+
+        # Tables without nested objects are flattened to key -> column index
+        self._data = _compact(tries.get(None, ({}, False))[0])
+        self._sections = [(section, _compact(trie), stringify) for section, (trie, stringify) in tries.items()
+                          if section is not None]
+
+    def row(self, item: Dict[str, Any]) -> List[Any]:
+        """
+        Flatten a webhook data dictionary
+
+        Args:
+            item (dict): Webhook data dictionary (as from WebhookData.to_dict())
+
+        Returns:
+            list: Values in column order; missing fields are empty strings
+        """
+        row = [''] * len(self.columns)
+        for column, column_index in self._base:
+            row[column_index] = item.get(column, '')
+
+        payload = item.get('data')
+        if self._payload_index is not None and payload is not None:
+            row[self._payload_index] = json.dumps(payload, default=str)
+        if isinstance(payload, dict):
+            if self._data:
+                _fill(payload, self._data, False, row)
+            for section, trie, stringify in self._sections:
+                values = payload.get(section)
+                if isinstance(values, dict):
+                    _fill(values, trie, stringify, row)
+        return row
+
+
+def _compact(trie: Dict[str, list]):
+    """Get a flat key -> column index table when no node has children, else the trie itself"""
+    if any(children is not None for _, children in trie.values()):
+        return trie
+    return _FlatTable({key: column_index for key, (column_index, _) in trie.items() if column_index is not None})
+
+
+class _FlatTable(dict):
+    """Key -> column index table of a section without nested objects"""
+
+
+def _fill(values: Dict[str, Any], trie, stringify: bool, row: List[Any]):
+    if type(trie) is _FlatTable:
+        get = trie.get
+        for key, value in values.items():
+            column_index = get(key)
+            if column_index is not None and (stringify or not isinstance(value, (dict, list))):
+                row[column_index] = str(value) if value is not None else ''
+        return
+
+    for key, value in values.items():
+        node = trie.get(key)
+        if node is None:
+            continue
+        column_index, children = node
+        if children is not None and isinstance(value, dict):
+            _fill(value, children, stringify, row)
+        elif column_index is not None and (stringify or not isinstance(value, (dict, list))):
+            row[column_index] = str(value) if value is not None else ''
+
+
+def parse_flatten_depth(value: Optional[Any], default: int = 1) -> int:
+    """
+    Parse a requested flatten depth
+
+    Raises:
+        ValueError: If the depth is not an integer between 1 and FLATTEN_MAX_DEPTH
+    """
+    if value is None or value == '':
+        return default
+    try:
+        depth = int(value)
+    except (TypeError, ValueError):
+        depth = 0
+    if not 1 <= depth <= FLATTEN_MAX_DEPTH:
+        raise ValueError(f"depth must be an integer between 1 and {FLATTEN_MAX_DEPTH}")
+    return depth
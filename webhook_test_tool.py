@@ -31,7 +31,7 @@ class WebhookTester:
         
         response = requests.post(url, headers=self.headers, json=data)
         
-        if response.status_code in (200, 201):
+        if response.status_code in (200, 201, 202):
             return response.json()
         else:
             print(f"Error: {response.status_code}")